@@ -8,9 +8,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from config import Config
+from app.utils.db_routing import RoutingSession
 
 # Initialize extensions (but don't attach to app yet)
-db = SQLAlchemy()  # Database
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Database (reads can go to replicas)
 jwt = JWTManager()  # JWT authentication
 
 def create_app():
@@ -25,11 +26,42 @@ def create_app():
     # Load configuration from config.py
     app.config.from_object(Config)
 
+    # Compact, unsorted JSON (orjson when installed) for every jsonify()
+    from app.utils.fast_json import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    # SQLite: connection pool sized here, WAL/pragmas/checkpoints once the engine exists
+    from app.utils.sqlite_mode import configure_engine_options, register_sqlite_mode
+    configure_engine_options(app)
+
     # Initialize extensions with app
     db.init_app(app)
     jwt.init_app(app)
     CORS(app)  # Enable CORS for React Native to connect
 
+    with app.app_context():
+        register_sqlite_mode(app, db.engine)  # Creating the engine doesn't connect
+
+    # Heart rate shards (HR_SHARD_URLS) get the same SQLite setup
+    from app.utils.hr_shards import register_hr_shards
+    register_hr_shards(app)
+
+    # Send GET requests of opted-in blueprints to DATABASE_REPLICA_URLS
+    from app.utils.db_routing import register_read_replicas
+    register_read_replicas(app, db)
+
+    # Per-endpoint latency, status and SQL metrics at /metrics
+    from app.utils.metrics import register_metrics
+    register_metrics(app)
+
+    # N+1 / query budget checks (only when QUERY_BUDGET_CHECKS is on)
+    from app.utils.query_budget import register_query_budgets
+    register_query_budgets(app)
+
+    # Resolve JWT identities to (cached) users for `current_user`
+    from app.utils.user_cache import register_user_loader
+    register_user_loader(jwt)
+
     # Register blueprints (routes)
     from app.routes import auth, spotify, workouts, profiles, social
     app.register_blueprint(auth.bp)
@@ -38,16 +70,13 @@ def create_app():
     app.register_blueprint(profiles.bp)
     app.register_blueprint(social.bp)
 
-    # Create database tables
-    with app.app_context():
-        # Import models so they're registered with SQLAlchemy
-        from app.models import user, workout, song, workout_profile, friendship
-
-        db.create_all()
+    # Register CLI maintenance commands (flask <command>)
+    from app.commands import register_commands
+    register_commands(app)
 
-        # Create preset workout profiles
-        from app.models.workout_profile import create_preset_profiles
-        create_preset_profiles()
+    # No database I/O here: every gunicorn worker and test fixture goes through
+    # this function. Tables and presets are created once by `flask init-db`,
+    # and the in-memory song indexes load lazily on first use.
 
     # Health check endpoint
     @app.route('/health')
@@ -63,6 +92,7 @@ def create_app():
             'description': 'Smart workout music matching based on your heart rate! 🎵❤️',
             'endpoints': {
                 'health': '/health',
+                'metrics': '/metrics',
                 'auth': '/api/auth/*',
                 'workouts': '/api/workouts/*',
                 'spotify': '/api/spotify/*'
@@ -0,0 +1,334 @@
+"""
+CLI Commands - Maintenance jobs run with `flask <command>`
+Registered on the app in create_app()
+"""
+
+import os
+import time
+
+import click
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+
+
+def register_commands(app):
+    """Attach all maintenance commands to the Flask CLI"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(recategorize_songs)
+    app.cli.add_command(rebuild_top_songs)
+    app.cli.add_command(build_song_neighbors_command)
+    app.cli.add_command(import_workouts_command)
+    app.cli.add_command(archive_heart_rate)
+    app.cli.add_command(rebuild_hr_aggregates)
+    app.cli.add_command(sqlite_checkpoint)
+    app.cli.add_command(sync_sqlite_replicas)
+
+
+def init_db():
+    """
+    Create missing tables (heart rate shards included) and bootstrap preset profiles
+    Safe to run on every deploy - both steps skip work that's already done
+    """
+    # Import models so they're registered with SQLAlchemy
+    from app.models import user, workout, song, workout_profile, friendship, system_setting
+    from app.models.workout_profile import create_preset_profiles
+    from app.utils.hr_shards import create_shard_tables, shard_count
+
+    if shard_count():
+        # heart_rate_data lives on the shards only
+        db.metadata.create_all(db.engine, tables=[
+            table for table in db.metadata.sorted_tables if table is not workout.HeartRateData.__table__
+        ])
+    else:
+        db.create_all()
+    create_shard_tables()
+    create_preset_profiles()
+
+
+@click.command('init-db')
+def init_db_command():
+    """Create database tables and preset workout profiles"""
+    started = time.perf_counter()
+    init_db()
+    click.echo(f'Database ready ({time.perf_counter() - started:.2f}s)')
+
+
+def _checkpoint_path():
+    """Where the last processed song id is remembered between runs"""
+    return os.path.join(current_app.instance_path, 'recategorize_songs.checkpoint')
+
+
+def _read_checkpoint():
+    try:
+        with open(_checkpoint_path()) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_checkpoint(last_id):
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    with open(_checkpoint_path(), 'w') as f:
+        f.write(str(last_id))
+
+
+@click.command('recategorize-songs')
+@click.option('--chunk-size', default=10000, show_default=True,
+              help='Songs read and written per batch')
+@click.option('--after-id', type=int, default=None,
+              help='Only process songs with an id greater than this')
+@click.option('--resume', is_flag=True,
+              help='Continue from the last checkpoint of an interrupted run')
+def recategorize_songs(chunk_size, after_id, resume):
+    """
+    Recompute hype_score and auto_category_zone for the whole catalog
+
+    Rows are streamed in primary-key order (keyset pagination, so every chunk
+    is an index range scan), scored from plain column tuples and written back
+    with one bulk UPDATE per chunk. Only rows whose values changed are written.
+    """
+    from app.models.song import Song, compute_hype_score, zone_for_hype_score
+
+    if after_id is None:
+        after_id = _read_checkpoint() if resume else 0
+
+    total = db.session.scalar(select(db.func.count(Song.id)).where(Song.id > after_id))
+    click.echo(f'Recategorizing {total} songs (after id {after_id}, chunk size {chunk_size})')
+
+    processed = 0
+    updated = 0
+    started = time.perf_counter()
+    last_id = after_id
+
+    while True:
+        chunk_started = time.perf_counter()
+
+        rows = db.session.execute(
+            select(Song.id, Song.energy, Song.tempo, Song.valence,
+                   Song.hype_score, Song.auto_category_zone)
+            .where(Song.id > last_id)
+            .order_by(Song.id)
+            .limit(chunk_size)
+        ).all()
+
+        if not rows:
+            break
+
+        changes = []
+        for song_id, energy, tempo, valence, old_hype, old_zone in rows:
+            hype = compute_hype_score(energy, tempo, valence)
+            zone = zone_for_hype_score(hype)
+            if hype != old_hype or zone != old_zone:
+                changes.append({'id': song_id, 'hype_score': hype, 'auto_category_zone': zone})
+
+        if changes:
+            db.session.execute(update(Song), changes)
+        db.session.commit()
+
+        last_id = rows[-1][0]
+        _write_checkpoint(last_id)
+
+        processed += len(rows)
+        updated += len(changes)
+        click.echo(
+            f'  {processed}/{total} songs | {len(changes)} updated | '
+            f'last id {last_id} | {time.perf_counter() - chunk_started:.2f}s'
+        )
+
+    # A finished run starts from scratch next time
+    _write_checkpoint(0)
+
+    click.echo(
+        f'Done: {processed} songs checked, {updated} updated '
+        f'in {time.perf_counter() - started:.1f}s'
+    )
+
+
+@click.command('rebuild-top-songs')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+def rebuild_top_songs(user_id):
+    """Recompute the materialized top hype/cooldown rankings from SongStats"""
+    from app.models import SongStats
+    from app.utils.workout_analysis import rebuild_top_song_ranking, RANKING_SCORE_INDEX
+
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [uid for (uid,) in db.session.query(SongStats.user_id).distinct()]
+
+    for uid in user_ids:
+        for song_type in RANKING_SCORE_INDEX:
+            rebuild_top_song_ranking(uid, song_type)
+        db.session.commit()
+
+    click.echo(f'Rebuilt top songs rankings for {len(user_ids)} users')
+
+
+@click.command('build-song-neighbors')
+@click.option('--full', is_flag=True, help='Recompute every song instead of only changed ones')
+def build_song_neighbors_command(full):
+    """Rebuild item-item song similarity used for collaborative recommendations"""
+    from app.utils.collaborative import build_song_neighbors
+
+    started = time.perf_counter()
+    result = build_song_neighbors(full=full)
+
+    click.echo(
+        f"{'Incremental' if result['incremental'] else 'Full'} build: "
+        f"{result['songs_rebuilt']} of {result['songs']} songs rebuilt from "
+        f"{result['users']} users, {result['neighbor_rows']} neighbour rows "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+@click.command('import-workouts')
+@click.option('--user-id', type=int, required=True, help='User the workouts belong to')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+def import_workouts_command(user_id, paths):
+    """
+    Import .tcx/.gpx/.csv(.gz) watch exports - files or whole directories
+    """
+    from app.utils.wearable_import import import_file, detect_format, ImportFormatError
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if detect_format(name))
+        else:
+            files.append(path)
+
+    workouts = samples = skipped = failed = 0
+    started = time.perf_counter()
+
+    for path in files:
+        try:
+            with open(path, 'rb') as f:
+                result = import_file(user_id, path, f)
+        except ImportFormatError as e:
+            failed += 1
+            click.echo(f'  {e}', err=True)
+            continue
+        workouts += result['workouts']
+        samples += result['samples']
+        skipped += result['skipped']
+
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f'Imported {workouts} workouts, {samples} HR samples from {len(files)} files '
+        f'({skipped} already there, {failed} failed) in {elapsed:.1f}s '
+        f'- {samples / elapsed if elapsed else 0:,.0f} samples/s'
+    )
+
+
+@click.command('archive-heart-rate')
+@click.option('--days', type=int, default=None,
+              help='Keep raw samples this many days (default: HR_RAW_RETENTION_DAYS)')
+@click.option('--limit', type=int, default=None, help='Archive at most this many workouts')
+@click.option('--dry-run', is_flag=True, help='Only count the workouts that would be archived')
+def archive_heart_rate(days, limit, dry_run):
+    """
+    Roll up old workouts' heart rate into 10s/1min buckets and move the raw
+    samples to gzip CSV files under HR_ARCHIVE_DIR
+    """
+    from app.utils.heart_rate_store import workouts_to_archive, archive_workout, archive_dir, finish_pending_deletes
+
+    days = days if days is not None else current_app.config['HR_RAW_RETENTION_DAYS']
+    workouts = workouts_to_archive(days, limit)
+
+    if dry_run:
+        click.echo(f'{len(workouts)} workouts older than {days} days would be archived')
+        return
+
+    leftover = finish_pending_deletes()
+    if leftover:
+        click.echo(f'Deleted the raw samples an interrupted run left for {leftover} archived workouts')
+
+    click.echo(f'Archiving {len(workouts)} workouts older than {days} days to {archive_dir()}')
+    started = time.perf_counter()
+    samples = 0
+
+    for count, (workout_id, user_id) in enumerate(workouts, 1):
+        samples += archive_workout(workout_id, user_id)
+        if count % 100 == 0:
+            click.echo(f'  {count}/{len(workouts)} workouts | {samples} samples archived')
+
+    click.echo(f'Done: {len(workouts)} workouts, {samples} raw samples archived '
+               f'in {time.perf_counter() - started:.1f}s')
+
+
+@click.command('rebuild-hr-aggregates')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+def rebuild_hr_aggregates(user_id):
+    """Recompute the hourly heart rate aggregates behind the dashboard and trends"""
+    from app.models import WorkoutSession
+    from app.utils.hr_aggregates import rebuild_user_aggregates
+
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [uid for (uid,) in db.session.query(WorkoutSession.user_id).distinct()]
+
+    started = time.perf_counter()
+    workouts = sum(rebuild_user_aggregates(uid) for uid in user_ids)
+
+    click.echo(f'Rebuilt heart rate aggregates for {len(user_ids)} users '
+               f'({workouts} workouts) in {time.perf_counter() - started:.1f}s')
+
+
+@click.command('sqlite-checkpoint')
+@click.option('--mode', type=click.Choice(['passive', 'full', 'restart', 'truncate']), default='truncate',
+              show_default=True, help='TRUNCATE waits for readers and shrinks the WAL file to zero')
+def sqlite_checkpoint(mode):
+    """Copy the SQLite WALs back into the databases (e.g. before a backup)"""
+    from app.utils.sqlite_mode import checkpoint, is_sqlite_file, sqlite_stats, wal_path
+
+    # The main database and any heart rate shards running in WAL mode
+    engines = dict(sqlite_stats.engines)
+    if not engines and is_sqlite_file(current_app.config['SQLALCHEMY_DATABASE_URI']):
+        engines['primary'] = db.engine
+    if not engines:
+        raise click.ClickException('Not a SQLite database file')
+
+    for name, engine in engines.items():
+        started = time.perf_counter()
+        busy, wal_pages, checkpointed = checkpoint(engine, mode.upper())
+        size = os.path.getsize(wal_path(engine)) if os.path.exists(wal_path(engine)) else 0
+        click.echo(f'{name}: {mode.upper()} checkpoint, {checkpointed}/{wal_pages} WAL pages copied'
+                   f'{" (blocked by readers)" if busy else ""}, WAL now {size / 1024 / 1024:.1f} MB '
+                   f'({time.perf_counter() - started:.2f}s)')
+
+
+@click.command('sync-sqlite-replicas')
+@click.option('--every', type=float, default=None, help='Keep copying every N seconds until interrupted')
+def sync_sqlite_replicas(every):
+    """
+    Copy the SQLite database onto each SQLite DATABASE_REPLICA_URLS file -
+    a stand-in for real replication when trying replica reads locally
+    """
+    import sqlite3
+    from app.utils.db_routing import REPLICA_BIND_PREFIX
+
+    replicas = [engine for key, engine in db.engines.items()
+                if key and key.startswith(REPLICA_BIND_PREFIX) and engine.dialect.name == 'sqlite']
+    if db.engine.dialect.name != 'sqlite' or not replicas:
+        raise click.ClickException('Needs a SQLite database and SQLite DATABASE_REPLICA_URLS')
+
+    while True:
+        started = time.perf_counter()
+        source = sqlite3.connect(db.engine.url.database)
+        try:
+            for engine in replicas:
+                target = sqlite3.connect(engine.url.database, timeout=30)
+                try:
+                    source.backup(target)  # Online backup - consistent even while the app writes
+                finally:
+                    target.close()
+        finally:
+            source.close()
+        click.echo(f'Copied to {len(replicas)} replica(s) in {time.perf_counter() - started:.2f}s')
+        if not every:
+            break
+        time.sleep(every)
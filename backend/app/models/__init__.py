@@ -1,7 +1,8 @@
 # Models package - Database models
 from app.models.user import User
-from app.models.workout import WorkoutSession, HeartRateData, SongPlay
-from app.models.song import Song, SongStats
+from app.models.workout import WorkoutSession, HeartRateData, HeartRateRollup, HeartRateArchive, HeartRateAggregate, WorkoutAnalysis, SongPlay
+from app.models.song import Song, SongStats, UserTopSongs, SongNeighbor
 from app.models.friendship import Friendship
+from app.models.system_setting import SystemSetting
 
-__all__ = ['User', 'WorkoutSession', 'HeartRateData', 'SongPlay', 'Song', 'SongStats', 'Friendship']
+__all__ = ['User', 'WorkoutSession', 'HeartRateData', 'HeartRateRollup', 'HeartRateArchive', 'HeartRateAggregate', 'WorkoutAnalysis', 'SongPlay', 'Song', 'SongStats', 'UserTopSongs', 'SongNeighbor', 'Friendship', 'SystemSetting']
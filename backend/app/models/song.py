@@ -6,6 +6,45 @@ from app import db
 from datetime import datetime
 import json
 
+def compute_hype_score(energy, tempo, valence):
+    """
+    Hype score (0-100) from raw audio features
+    Kept outside the model so bulk jobs can score plain column tuples
+    """
+    if not (energy and tempo and valence):
+        return None
+
+    # Energy contributes 50%
+    energy_component = energy * 50
+
+    # Tempo contributes 30% (normalized to 200 BPM max)
+    tempo_component = min(tempo / 200, 1.0) * 30
+
+    # Valence contributes 20% (happy songs = more hype)
+    valence_component = valence * 20
+
+    return round(energy_component + tempo_component + valence_component, 2)
+
+
+def zone_for_hype_score(hype):
+    """
+    Map a hype score to its workout zone
+    """
+    if not hype:
+        return None
+
+    if hype >= 80:
+        return "Zone 5"  # Maximum Effort
+    elif hype >= 65:
+        return "Zone 4"  # High Intensity
+    elif hype >= 50:
+        return "Zone 3"  # Moderate
+    elif hype >= 35:
+        return "Zone 2"  # Warmup
+    else:
+        return "Zone 1"  # Cooldown
+
+
 class Song(db.Model):
     """
     Song table - stores songs from Spotify/Apple Music with their audio features
@@ -56,38 +95,13 @@ class Song(db.Model):
         Calculate hype score (0-100) based on audio features
         Formula: (energy * 50) + (tempo/200 * 30) + (valence * 20)
         """
-        if not (self.energy and self.tempo and self.valence):
-            return None
-
-        # Energy contributes 50%
-        energy_component = self.energy * 50
-
-        # Tempo contributes 30% (normalized to 200 BPM max)
-        tempo_component = min(self.tempo / 200, 1.0) * 30
-
-        # Valence contributes 20% (happy songs = more hype)
-        valence_component = self.valence * 20
-
-        return round(energy_component + tempo_component + valence_component, 2)
+        return compute_hype_score(self.energy, self.tempo, self.valence)
 
     def categorize_zone(self):
         """
         Auto-categorize song into workout zone based on hype score
         """
-        hype = self.calculate_hype_score()
-        if not hype:
-            return None
-
-        if hype >= 80:
-            return "Zone 5"  # Maximum Effort
-        elif hype >= 65:
-            return "Zone 4"  # High Intensity
-        elif hype >= 50:
-            return "Zone 3"  # Moderate
-        elif hype >= 35:
-            return "Zone 2"  # Warmup
-        else:
-            return "Zone 1"  # Cooldown
+        return zone_for_hype_score(self.calculate_hype_score())
 
     def update_categorization(self):
         """
@@ -169,3 +183,53 @@ class SongStats(db.Model):
             'personal_cooldown_score': self.personal_cooldown_score,
             'last_played_at': self.last_played_at.isoformat() if self.last_played_at else None
         }
+
+
+class UserTopSongs(db.Model):
+    """
+    User Top Songs table - materialized top-K hype/cooldown ranking per user
+    Kept in step with SongStats by the workout analysis, so the top songs
+    endpoint reads one row instead of sorting all of a user's stats
+    """
+    __tablename__ = 'user_top_songs'
+
+    # Composite Primary Key: one ranking per user per type
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    ranking_type = db.Column(db.String(20), primary_key=True)  # 'hype' or 'cooldown'
+
+    # JSON list of compact rows, best first:
+    # [stats_id, song_id, times_played, avg_bpm_response, personal_hype_score,
+    #  personal_cooldown_score, last_played_at]
+    entries = db.Column(db.Text, nullable=False, default='[]')
+
+    # Metadata
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserTopSongs user={self.user_id} {self.ranking_type}>'
+
+    def get_entries(self):
+        return json.loads(self.entries) if self.entries else []
+
+    def set_entries(self, entries):
+        self.entries = json.dumps(entries, separators=(',', ':'))
+
+
+class SongNeighbor(db.Model):
+    """
+    Song Neighbor table - item-item similarity between songs, from how users
+    respond to them (SongStats.personal_hype_score)
+    Each song keeps only its strongest neighbours, built by `flask build-song-neighbors`
+    """
+    __tablename__ = 'song_neighbors'
+
+    # Composite Primary Key
+    song_id = db.Column(db.Integer, db.ForeignKey('songs.id'), primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('songs.id'), primary_key=True)
+
+    # Cosine similarity of the two songs' hype responses, shrunk for low support
+    similarity = db.Column(db.Float, nullable=False)
+    support = db.Column(db.Integer, nullable=False)  # Users who responded to both
+
+    def __repr__(self):
+        return f'<SongNeighbor {self.song_id} ~ {self.neighbor_id} ({self.similarity:.2f})>'
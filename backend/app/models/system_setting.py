@@ -0,0 +1,37 @@
+"""
+System Setting Model - Small key/value store for app-wide state
+Used for things like batch job watermarks
+"""
+
+from app import db
+from datetime import datetime
+
+class SystemSetting(db.Model):
+    """
+    System Settings table - one row per setting key
+    """
+    __tablename__ = 'system_settings'
+
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text)
+
+    # Metadata
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SystemSetting {self.key}={self.value}>'
+
+    @staticmethod
+    def get_value(key, default=None):
+        setting = db.session.get(SystemSetting, key)
+        return setting.value if setting else default
+
+    @staticmethod
+    def set_value(key, value):
+        """Set a setting (caller commits)"""
+        setting = db.session.get(SystemSetting, key)
+        if not setting:
+            setting = SystemSetting(key=key)
+            db.session.add(setting)
+        setting.value = value
+        return setting
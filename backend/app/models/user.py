@@ -4,7 +4,10 @@ User Model - Stores user account information
 
 from app import db
 from datetime import datetime
-import bcrypt
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.utils.passwords import hash_password, verify_password, needs_rehash
+from app.utils.user_cache import user_cache
 
 class User(db.Model):
     """
@@ -42,21 +45,27 @@ class User(db.Model):
 
     def set_password(self, password):
         """
-        Hash the password using bcrypt
+        Hash the password using bcrypt (on the bcrypt worker pool)
         NEVER store plain text passwords!
         """
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """
         Verify password against the stored hash
         Returns True if password matches, False otherwise
         """
-        password_bytes = password.encode('utf-8')
-        hash_bytes = self.password_hash.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hash_bytes)
+        return verify_password(password, self.password_hash)
+
+    def rehash_password_if_needed(self, password):
+        """
+        Re-hash with the current cost factor if BCRYPT_LOG_ROUNDS changed
+        Call after a successful check_password; returns True if the hash changed
+        """
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
 
     def calculate_max_heart_rate(self):
         """
@@ -84,3 +93,21 @@ class User(db.Model):
             'has_apple_music_connected': bool(self.apple_music_token),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(_mapper, _connection, target):
+    """
+    Drop the cached JWT user whenever the row changes (tokens, is_active, profile)
+    Only noted at flush - evicted once the change is committed, so another
+    request can't re-cache the old row in between
+    """
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def evict_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
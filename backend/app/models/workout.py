@@ -4,6 +4,8 @@ Workout Models - Stores workout sessions and heart rate data
 
 from app import db
 from datetime import datetime
+from sqlalchemy import event
+import json
 
 class WorkoutSession(db.Model):
     """
@@ -36,7 +38,8 @@ class WorkoutSession(db.Model):
     analyzed_at = db.Column(db.DateTime)  # When we finished analyzing song correlations
 
     # Relationships
-    heart_rate_data = db.relationship('HeartRateData', backref='workout', lazy=True, cascade='all, delete-orphan')
+    # (no heart_rate_data relationship - samples may live on a shard, see
+    # app/utils/hr_shards.py; read them with heart_rate_samples())
     song_plays = db.relationship('SongPlay', backref='workout', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
@@ -101,6 +104,112 @@ class HeartRateData(db.Model):
         }
 
 
+class HeartRateRollup(db.Model):
+    """
+    Heart Rate Rollup table - per-bucket summaries of a workout's heart rate
+    Written when the retention job archives a workout's raw samples, at
+    10 second and 1 minute resolution
+    """
+    __tablename__ = 'heart_rate_rollups'
+
+    # Composite Primary Key: one row per workout per resolution per bucket
+    workout_session_id = db.Column(db.Integer, db.ForeignKey('workout_sessions.id'), primary_key=True)
+    resolution = db.Column(db.Integer, primary_key=True)  # Bucket size in seconds (10 or 60)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+
+    # Summary of the readings in the bucket
+    min_bpm = db.Column(db.Integer, nullable=False)
+    max_bpm = db.Column(db.Integer, nullable=False)
+    mean_bpm = db.Column(db.Float, nullable=False)
+    sample_count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<HeartRateRollup workout={self.workout_session_id} {self.resolution}s at {self.bucket_start}>'
+
+
+class HeartRateArchive(db.Model):
+    """
+    Heart Rate Archive table - workouts whose raw samples moved to an archive file
+    """
+    __tablename__ = 'heart_rate_archives'
+
+    workout_session_id = db.Column(db.Integer, db.ForeignKey('workout_sessions.id'), primary_key=True)
+    path = db.Column(db.String(500), nullable=False)  # gzip CSV, relative to HR_ARCHIVE_DIR
+    sample_count = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HeartRateArchive workout={self.workout_session_id} {self.path}>'
+
+
+class HeartRateAggregate(db.Model):
+    """
+    Heart Rate Aggregate table - one user's heart rate per hour across all workouts
+    Added to when a workout completes, so dashboards and trends never touch
+    raw samples. Time in zone uses % of the user's max HR (Zone 1 < 60% ... Zone 5 >= 90%)
+    """
+    __tablename__ = 'heart_rate_aggregates'
+
+    # Composite Primary Key: one row per user per hour
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # Start of the hour (UTC)
+
+    # Readings in the bucket (mean = bpm_sum / sample_count)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    bpm_sum = db.Column(db.Integer, nullable=False, default=0)
+    min_bpm = db.Column(db.Integer)
+    max_bpm = db.Column(db.Integer)
+
+    # Seconds spent in each heart rate zone
+    zone1_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone2_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone3_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone4_seconds = db.Column(db.Integer, nullable=False, default=0)
+    zone5_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<HeartRateAggregate user={self.user_id} {self.bucket_start}>'
+
+
+class WorkoutAnalysis(db.Model):
+    """
+    Workout Analysis table - the stored result of analyzing a workout
+    Repeat /analyze calls return it as is. `contributions` remembers what the
+    analysis added to SongStats, so re-analyzing with a new algorithm version
+    can swap exactly that for the new numbers
+    """
+    __tablename__ = 'workout_analyses'
+
+    # Composite Primary Key: one result per workout per algorithm version
+    workout_session_id = db.Column(db.Integer, db.ForeignKey('workout_sessions.id'), primary_key=True)
+    algorithm_version = db.Column(db.Integer, primary_key=True)
+
+    # JSON of the /analyze response
+    result = db.Column(db.Text, nullable=False)
+
+    # JSON list of compact rows, one per analyzed song play:
+    # [song_id, avg_bpm, hype_score, cooldown_score]
+    contributions = db.Column(db.Text, nullable=False, default='[]')
+
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WorkoutAnalysis workout={self.workout_session_id} v{self.algorithm_version}>'
+
+    def get_result(self):
+        return json.loads(self.result)
+
+    def set_result(self, result):
+        self.result = json.dumps(result, separators=(',', ':'))
+
+    def get_contributions(self):
+        return json.loads(self.contributions) if self.contributions else []
+
+    def set_contributions(self, contributions):
+        self.contributions = json.dumps(contributions, separators=(',', ':'))
+
+
 class SongPlay(db.Model):
     """
     Song Play table - stores which songs played during workout and heart rate correlation
@@ -148,3 +257,13 @@ class SongPlay(db.Model):
             'bpm_change': self.bpm_change,
             'song_position_in_workout': self.song_position_in_workout
         }
+
+
+@event.listens_for(WorkoutSession, 'before_delete')
+def delete_heart_rate_data(_mapper, _connection, target):
+    """Delete a workout's heart rate samples with it, on whichever database holds them"""
+    from app.utils.hr_shards import hr_connection
+
+    hr_connection(target.user_id).execute(
+        db.delete(HeartRateData).where(HeartRateData.workout_session_id == target.id)
+    )
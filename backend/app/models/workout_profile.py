@@ -51,6 +51,44 @@ class WorkoutProfile(db.Model):
         return f'<WorkoutProfile {self.name}>'
 
 
+# Bump when PRESET_PROFILES changes so the next boot inserts the new presets
+PRESET_PROFILES_VERSION = 1
+PRESET_PROFILES_VERSION_KEY = 'preset_profiles_version'
+
+# Default workout profiles (see create_preset_profiles)
+PRESET_PROFILES = [
+    # High Intensity
+    {'name': 'HIIT', 'description': 'High-intensity interval training', 'profile_type': 'HIIT', 'target_zone_min': 80, 'target_zone_max': 95, 'icon': '🔥'},
+    {'name': 'Sprint Training', 'description': 'Maximum effort sprints', 'profile_type': 'Sprint', 'target_zone_min': 85, 'target_zone_max': 100, 'icon': '💨'},
+    {'name': 'CrossFit', 'description': 'High-intensity functional fitness', 'profile_type': 'CrossFit', 'target_zone_min': 75, 'target_zone_max': 90, 'icon': '⚡'},
+    {'name': 'Kickboxing', 'description': 'Martial arts cardio', 'profile_type': 'Kickboxing', 'target_zone_min': 75, 'target_zone_max': 90, 'icon': '🥊'},
+
+    # Cardio
+    {'name': 'Running', 'description': 'Outdoor or treadmill running', 'profile_type': 'Running', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🏃'},
+    {'name': 'Cycling', 'description': 'Indoor or outdoor cycling', 'profile_type': 'Cycling', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🚴'},
+    {'name': 'Rowing', 'description': 'Full-body rowing workout', 'profile_type': 'Rowing', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🚣'},
+    {'name': 'Swimming', 'description': 'Pool or open water swimming', 'profile_type': 'Swimming', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '🏊'},
+    {'name': 'Elliptical', 'description': 'Low-impact cardio', 'profile_type': 'Elliptical', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '⚙️'},
+    {'name': 'Stair Climbing', 'description': 'Stair stepper workout', 'profile_type': 'Stairs', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🪜'},
+    {'name': 'Dance', 'description': 'Energetic dance cardio', 'profile_type': 'Dance', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '💃'},
+
+    # Strength & Conditioning
+    {'name': 'Strength Training', 'description': 'Weight lifting and resistance', 'profile_type': 'Strength', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '🏋️'},
+    {'name': 'Functional Strength', 'description': 'Bodyweight movements', 'profile_type': 'Functional', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '💪'},
+    {'name': 'Core Training', 'description': 'Focused abs and core', 'profile_type': 'Core', 'target_zone_min': 55, 'target_zone_max': 70, 'icon': '🎯'},
+
+    # Mind & Body
+    {'name': 'Yoga', 'description': 'Flexibility and mindfulness', 'profile_type': 'Yoga', 'target_zone_min': 50, 'target_zone_max': 65, 'icon': '🧘'},
+    {'name': 'Pilates', 'description': 'Core-focused exercise', 'profile_type': 'Pilates', 'target_zone_min': 50, 'target_zone_max': 65, 'icon': '🤸'},
+    {'name': 'Stretching', 'description': 'Recovery and flexibility', 'profile_type': 'Stretching', 'target_zone_min': 50, 'target_zone_max': 60, 'icon': '🙆'},
+    {'name': 'Cooldown', 'description': 'Post-workout recovery', 'profile_type': 'Cooldown', 'target_zone_min': 50, 'target_zone_max': 60, 'icon': '🧊'},
+
+    # Outdoor & Activities
+    {'name': 'Hiking', 'description': 'Outdoor trail hiking', 'profile_type': 'Hiking', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '🥾'},
+    {'name': 'Walking', 'description': 'Brisk or power walking', 'profile_type': 'Walking', 'target_zone_min': 55, 'target_zone_max': 70, 'icon': '🚶'},
+]
+
+
 def create_preset_profiles():
     """
     Create default workout profiles based on research
@@ -60,59 +98,32 @@ def create_preset_profiles():
     - Zone 3 (70-80%): Cardio/Aerobic
     - Zone 4 (80-90%): Anaerobic/Threshold
     - Zone 5 (90-100%): Max Effort
+
+    Runs one existence query and one bulk insert, then records
+    PRESET_PROFILES_VERSION so later boots skip it after a single lookup.
     """
+    from app.models.system_setting import SystemSetting
+
+    if SystemSetting.get_value(PRESET_PROFILES_VERSION_KEY) == str(PRESET_PROFILES_VERSION):
+        return []
 
-    presets = [
-        # High Intensity
-        {'name': 'HIIT', 'description': 'High-intensity interval training', 'profile_type': 'HIIT', 'target_zone_min': 80, 'target_zone_max': 95, 'icon': '🔥'},
-        {'name': 'Sprint Training', 'description': 'Maximum effort sprints', 'profile_type': 'Sprint', 'target_zone_min': 85, 'target_zone_max': 100, 'icon': '💨'},
-        {'name': 'CrossFit', 'description': 'High-intensity functional fitness', 'profile_type': 'CrossFit', 'target_zone_min': 75, 'target_zone_max': 90, 'icon': '⚡'},
-        {'name': 'Kickboxing', 'description': 'Martial arts cardio', 'profile_type': 'Kickboxing', 'target_zone_min': 75, 'target_zone_max': 90, 'icon': '🥊'},
-
-        # Cardio
-        {'name': 'Running', 'description': 'Outdoor or treadmill running', 'profile_type': 'Running', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🏃'},
-        {'name': 'Cycling', 'description': 'Indoor or outdoor cycling', 'profile_type': 'Cycling', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🚴'},
-        {'name': 'Rowing', 'description': 'Full-body rowing workout', 'profile_type': 'Rowing', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🚣'},
-        {'name': 'Swimming', 'description': 'Pool or open water swimming', 'profile_type': 'Swimming', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '🏊'},
-        {'name': 'Elliptical', 'description': 'Low-impact cardio', 'profile_type': 'Elliptical', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '⚙️'},
-        {'name': 'Stair Climbing', 'description': 'Stair stepper workout', 'profile_type': 'Stairs', 'target_zone_min': 70, 'target_zone_max': 85, 'icon': '🪜'},
-        {'name': 'Dance', 'description': 'Energetic dance cardio', 'profile_type': 'Dance', 'target_zone_min': 65, 'target_zone_max': 80, 'icon': '💃'},
-
-        # Strength & Conditioning
-        {'name': 'Strength Training', 'description': 'Weight lifting and resistance', 'profile_type': 'Strength', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '🏋️'},
-        {'name': 'Functional Strength', 'description': 'Bodyweight movements', 'profile_type': 'Functional', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '💪'},
-        {'name': 'Core Training', 'description': 'Focused abs and core', 'profile_type': 'Core', 'target_zone_min': 55, 'target_zone_max': 70, 'icon': '🎯'},
-
-        # Mind & Body
-        {'name': 'Yoga', 'description': 'Flexibility and mindfulness', 'profile_type': 'Yoga', 'target_zone_min': 50, 'target_zone_max': 65, 'icon': '🧘'},
-        {'name': 'Pilates', 'description': 'Core-focused exercise', 'profile_type': 'Pilates', 'target_zone_min': 50, 'target_zone_max': 65, 'icon': '🤸'},
-        {'name': 'Stretching', 'description': 'Recovery and flexibility', 'profile_type': 'Stretching', 'target_zone_min': 50, 'target_zone_max': 60, 'icon': '🙆'},
-        {'name': 'Cooldown', 'description': 'Post-workout recovery', 'profile_type': 'Cooldown', 'target_zone_min': 50, 'target_zone_max': 60, 'icon': '🧊'},
-
-        # Outdoor & Activities
-        {'name': 'Hiking', 'description': 'Outdoor trail hiking', 'profile_type': 'Hiking', 'target_zone_min': 60, 'target_zone_max': 75, 'icon': '🥾'},
-        {'name': 'Walking', 'description': 'Brisk or power walking', 'profile_type': 'Walking', 'target_zone_min': 55, 'target_zone_max': 70, 'icon': '🚶'},
+    existing = {
+        name for (name,) in db.session.query(WorkoutProfile.name).filter_by(is_preset=True)
+    }
+
+    created_profiles = [
+        {**preset_data, 'is_preset': True, 'user_id': None}
+        for preset_data in PRESET_PROFILES
+        if preset_data['name'] not in existing
     ]
 
-    created_profiles = []
-    for preset_data in presets:
-        # Check if preset already exists
-        existing = WorkoutProfile.query.filter_by(
-            name=preset_data['name'],
-            is_preset=True
-        ).first()
-
-        if not existing:
-            profile = WorkoutProfile(
-                **preset_data,
-                is_preset=True,
-                user_id=None
-            )
-            db.session.add(profile)
-            created_profiles.append(profile)
+    if created_profiles:
+        db.session.execute(db.insert(WorkoutProfile), created_profiles)
+
+    SystemSetting.set_value(PRESET_PROFILES_VERSION_KEY, str(PRESET_PROFILES_VERSION))
+    db.session.commit()
 
     if created_profiles:
-        db.session.commit()
         print(f"Created {len(created_profiles)} preset workout profiles")
 
     return created_profiles
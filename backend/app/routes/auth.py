@@ -3,9 +3,11 @@ Authentication Routes - User registration and login
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, current_user
 from app import db
 from app.models import User
+from app.utils.passwords import PasswordHasherBusy
+from app.utils.query_budget import query_budget
 
 # Create a Blueprint for authentication routes
 # All routes in this file will start with /api/auth
@@ -45,7 +47,10 @@ def register():
     )
 
     # Hash and set password (NEVER store plain text!)
-    new_user.set_password(data['password'])
+    try:
+        new_user.set_password(data['password'])
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Too many sign-ups right now, please try again'}), 503
 
     # Save to database
     try:
@@ -90,13 +95,23 @@ def login():
     user = User.query.filter_by(email=data['email'].lower()).first()
 
     # Check if user exists and password is correct
-    if not user or not user.check_password(data['password']):
-        return jsonify({'error': 'Invalid email or password'}), 401
+    try:
+        if not user or not user.check_password(data['password']):
+            return jsonify({'error': 'Invalid email or password'}), 401
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Too many logins right now, please try again'}), 503
 
     # Check if user account is active
     if not user.is_active:
         return jsonify({'error': 'Account is inactive'}), 403
 
+    # Upgrade the hash if the bcrypt cost factor changed since it was made
+    try:
+        if user.rehash_password_if_needed(data['password']):
+            db.session.commit()
+    except PasswordHasherBusy:
+        pass  # Try again on the next login
+
     # Create JWT tokens
     access_token = create_access_token(identity=str(user.id))
     refresh_token = create_refresh_token(identity=str(user.id))
@@ -110,6 +125,7 @@ def login():
 
 
 @bp.route('/me', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_current_user():
     """
@@ -118,17 +134,9 @@ def get_current_user():
 
     Header: Authorization: Bearer <your_token_here>
     """
-    # Get user ID from JWT token
-    user_id = int(get_jwt_identity())
-
-    # Find user in database
-    user = User.query.get(user_id)
-
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
+    # User loaded (and cached) from the JWT by the user lookup loader
     return jsonify({
-        'user': user.to_dict()
+        'user': current_user.to_dict()
     }), 200
 
 
@@ -3,15 +3,29 @@ Workout Profile Routes
 Manage workout profiles (presets and custom)
 """
 
-from flask import Blueprint, request, jsonify
+import hashlib
+
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
-from app.models.workout_profile import WorkoutProfile
+from app.models.system_setting import SystemSetting
+from app.models.workout_profile import WorkoutProfile, PRESET_PROFILES_VERSION_KEY
+from app.utils.playlist_generator import generate_playlist
+from app.utils.query_budget import query_budget
+from app.utils.db_routing import read_from_replicas, primary_only, use_primary
+
+bp = read_from_replicas(Blueprint('profiles', __name__, url_prefix='/api/profiles'))
 
-bp = Blueprint('profiles', __name__, url_prefix='/api/profiles')
+# Rendered /presets response: (preset version, body bytes, etag). Presets
+# can't be edited or deleted through the API and only change when the
+# bootstrap installs a new PRESET_PROFILES_VERSION, so the payload is rebuilt
+# only when the version stored in the database moves.
+_presets_cache = None
 
 
 @bp.route('/', methods=['GET'])
+@query_budget(2)
+@primary_only
 @jwt_required()
 def get_profiles():
     """
@@ -33,18 +47,46 @@ def get_profiles():
 
 
 @bp.route('/presets', methods=['GET'])
+@query_budget(2)
 def get_presets():
     """
     Get all preset workout profiles (no auth required)
+    Served from an in-process cache (one settings lookup per request) with a
+    strong ETag, so clients that send If-None-Match get a 304 without a body
     """
-    presets = WorkoutProfile.query.filter_by(is_preset=True).all()
+    body, etag = _presets_payload()
 
-    return jsonify({
-        'presets': [p.to_dict() for p in presets]
-    }), 200
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
+
+
+def _presets_payload():
+    """
+    Render the presets response once per installed preset version and keep it
+    Read from the primary - a lagging replica could hand back none or old ones
+    """
+    global _presets_cache
+    with use_primary():
+        version = SystemSetting.get_value(PRESET_PROFILES_VERSION_KEY)
+        if _presets_cache is not None and _presets_cache[0] == version:
+            return _presets_cache[1:]
+
+        presets = WorkoutProfile.query.filter_by(is_preset=True).order_by(WorkoutProfile.id).all()
+
+    body = current_app.json.dumps({'presets': [p.to_dict() for p in presets]}).encode('utf-8')
+    etag = f'{version}-{hashlib.sha256(body).hexdigest()[:32]}'
+    if presets:
+        # Not before init-db has run - the next request looks again
+        _presets_cache = (version, body, etag)
+    return body, etag
 
 
 @bp.route('/custom', methods=['GET'])
+@query_budget(2)
+@primary_only
 @jwt_required()
 def get_custom_profiles():
     """
@@ -63,6 +105,7 @@ def get_custom_profiles():
 
 
 @bp.route('/', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def create_profile():
     """
@@ -113,6 +156,8 @@ def create_profile():
 
 
 @bp.route('/<int:profile_id>', methods=['GET'])
+@query_budget(2)
+@primary_only
 @jwt_required()
 def get_profile(profile_id):
     """
@@ -133,6 +178,7 @@ def get_profile(profile_id):
 
 
 @bp.route('/<int:profile_id>', methods=['PUT'])
+@query_budget(4)
 @jwt_required()
 def update_profile(profile_id):
     """
@@ -189,6 +235,7 @@ def update_profile(profile_id):
 
 
 @bp.route('/<int:profile_id>', methods=['DELETE'])
+@query_budget(3)
 @jwt_required()
 def delete_profile(profile_id):
     """
@@ -213,3 +260,48 @@ def delete_profile(profile_id):
     db.session.commit()
 
     return jsonify({'message': 'Profile deleted successfully'}), 200
+
+
+@bp.route('/<int:profile_id>/playlist', methods=['POST'])
+@query_budget(6)
+@jwt_required()
+def generate_profile_playlist(profile_id):
+    """
+    Generate a warmup -> peak -> cooldown playlist for a workout profile
+
+    Expected JSON body:
+    {
+        "duration_minutes": 45,
+        "curve": [[0, 60], [0.2, 80], [0.8, 85], [1, 55]]  # optional, (fraction of workout, % max HR)
+    }
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    profile = WorkoutProfile.query.get(profile_id)
+
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    if not profile.is_preset and profile.user_id != user_id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    duration = data.get('duration_minutes', 45)
+    if not isinstance(duration, (int, float)) or isinstance(duration, bool) or not 1 <= duration <= 300:
+        return jsonify({'error': 'duration_minutes must be between 1 and 300'}), 400
+
+    curve = data.get('curve')
+    if curve is not None:
+        try:
+            curve = [(float(x), float(y)) for x, y in curve]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'curve must be a list of [fraction, percent_max_hr] pairs'}), 400
+        if len(curve) < 2 or any(not 0 <= x <= 1 or not 0 < y <= 100 for x, y in curve):
+            return jsonify({'error': 'curve needs 2+ points with fraction 0-1 and percent 1-100'}), 400
+
+    playlist = generate_playlist(user_id, profile, duration, curve)
+
+    if not playlist['songs']:
+        return jsonify({'error': 'No songs with audio features in the library'}), 400
+
+    return jsonify(playlist), 200
@@ -8,13 +8,33 @@ from app import db
 from app.models.user import User
 from app.models.friendship import Friendship
 from app.models.workout import WorkoutSession
-from sqlalchemy import or_, and_
+from app.utils.query_budget import query_budget
+from app.utils.db_routing import read_from_replicas, primary_only
+from sqlalchemy import or_, and_, case
 from datetime import datetime, timedelta
 
-bp = Blueprint('social', __name__, url_prefix='/api/social')
+bp = read_from_replicas(Blueprint('social', __name__, url_prefix='/api/social'))
+
+
+def _accepted_friendships(user_id):
+    """Filter for the user's accepted friendships (in either direction)"""
+    return and_(
+        or_(
+            Friendship.user_id == user_id,
+            Friendship.friend_id == user_id
+        ),
+        Friendship.status == 'accepted'
+    )
+
+
+def _other_user(user_id):
+    """SQL expression for the friend's id in a friendship row"""
+    return case((Friendship.user_id == user_id, Friendship.friend_id), else_=Friendship.user_id)
 
 
 @bp.route('/friends', methods=['GET'])
+@query_budget(2)
+@primary_only
 @jwt_required()
 def get_friends():
     """
@@ -23,35 +43,29 @@ def get_friends():
     """
     user_id = int(get_jwt_identity())
 
-    # Get all accepted friendships where user is either user_id or friend_id
-    friendships = Friendship.query.filter(
-        and_(
-            or_(
-                Friendship.user_id == user_id,
-                Friendship.friend_id == user_id
-            ),
-            Friendship.status == 'accepted'
-        )
-    ).all()
-
-    friends = []
-    for friendship in friendships:
-        # Determine which user is the friend
-        friend_id = friendship.friend_id if friendship.user_id == user_id else friendship.user_id
-        friend = User.query.get(friend_id)
-
-        if friend:
-            friends.append({
-                'id': friend.id,
-                'name': friend.name,
-                'email': friend.email,
-                'friend_since': friendship.accepted_at.isoformat() if friendship.accepted_at else None,
-            })
+    # Accepted friendships joined to the other user - one query for the whole list
+    rows = db.session.query(Friendship.accepted_at, User.id, User.name, User.email)\
+        .join(User, User.id == _other_user(user_id))\
+        .filter(_accepted_friendships(user_id))\
+        .order_by(Friendship.id)\
+        .all()
+
+    friends = [
+        {
+            'id': friend_id,
+            'name': name,
+            'email': email,
+            'friend_since': accepted_at.isoformat() if accepted_at else None,
+        }
+        for accepted_at, friend_id, name, email in rows
+    ]
 
     return jsonify({'friends': friends}), 200
 
 
 @bp.route('/friends/requests', methods=['GET'])
+@query_budget(2)
+@primary_only
 @jwt_required()
 def get_friend_requests():
     """
@@ -59,30 +73,31 @@ def get_friend_requests():
     """
     user_id = int(get_jwt_identity())
 
-    # Get pending requests where user is the friend_id (recipient)
-    requests = Friendship.query.filter_by(
-        friend_id=user_id,
-        status='pending'
-    ).all()
-
-    friend_requests = []
-    for req in requests:
-        sender = User.query.get(req.user_id)
-        if sender:
-            friend_requests.append({
-                'id': req.id,
-                'from_user': {
-                    'id': sender.id,
-                    'name': sender.name,
-                    'email': sender.email,
-                },
-                'created_at': req.created_at.isoformat() if req.created_at else None,
-            })
+    # Pending requests where user is the friend_id (recipient), with the sender joined in
+    rows = db.session.query(Friendship.id, Friendship.created_at, User.id, User.name, User.email)\
+        .join(User, User.id == Friendship.user_id)\
+        .filter(Friendship.friend_id == user_id, Friendship.status == 'pending')\
+        .order_by(Friendship.id)\
+        .all()
+
+    friend_requests = [
+        {
+            'id': request_id,
+            'from_user': {
+                'id': sender_id,
+                'name': name,
+                'email': email,
+            },
+            'created_at': created_at.isoformat() if created_at else None,
+        }
+        for request_id, created_at, sender_id, name, email in rows
+    ]
 
     return jsonify({'requests': friend_requests}), 200
 
 
 @bp.route('/friends/add', methods=['POST'])
+@query_budget(5)
 @jwt_required()
 def send_friend_request():
     """
@@ -136,6 +151,7 @@ def send_friend_request():
 
 
 @bp.route('/friends/accept/<int:request_id>', methods=['POST'])
+@query_budget(5)
 @jwt_required()
 def accept_friend_request(request_id):
     """
@@ -169,6 +185,7 @@ def accept_friend_request(request_id):
 
 
 @bp.route('/friends/reject/<int:request_id>', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def reject_friend_request(request_id):
     """
@@ -192,6 +209,7 @@ def reject_friend_request(request_id):
 
 
 @bp.route('/friends/remove/<int:friend_id>', methods=['DELETE'])
+@query_budget(3)
 @jwt_required()
 def remove_friend(friend_id):
     """
@@ -217,6 +235,7 @@ def remove_friend(friend_id):
 
 
 @bp.route('/activity/feed', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_activity_feed():
     """
@@ -224,60 +243,52 @@ def get_activity_feed():
     """
     user_id = int(get_jwt_identity())
 
-    # Get list of friend IDs
-    friendships = Friendship.query.filter(
-        and_(
-            or_(
-                Friendship.user_id == user_id,
-                Friendship.friend_id == user_id
-            ),
-            Friendship.status == 'accepted'
-        )
-    ).all()
-
-    friend_ids = []
-    for friendship in friendships:
-        friend_id = friendship.friend_id if friendship.user_id == user_id else friendship.user_id
-        friend_ids.append(friend_id)
-
-    if not friend_ids:
-        return jsonify({'activities': []}), 200
+    # Friend ids as a subquery, so the feed is a single query
+    friend_ids = db.session.query(_other_user(user_id)).filter(_accepted_friendships(user_id))
 
     # Get recent workouts from friends (last 7 days)
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
 
-    workouts = WorkoutSession.query.filter(
-        and_(
-            WorkoutSession.user_id.in_(friend_ids),
+    rows = db.session.query(WorkoutSession, User.name)\
+        .join(User, User.id == WorkoutSession.user_id)\
+        .filter(
+            WorkoutSession.user_id.in_(friend_ids.scalar_subquery()),
             WorkoutSession.start_time >= seven_days_ago,
             WorkoutSession.end_time.isnot(None)  # Only completed workouts
-        )
-    ).order_by(WorkoutSession.start_time.desc()).limit(50).all()
-
-    activities = []
-    for workout in workouts:
-        user = User.query.get(workout.user_id)
-        if user:
-            activities.append({
-                'id': workout.id,
-                'user': {
-                    'id': user.id,
-                    'name': user.name,
-                },
-                'workout': {
-                    'profile_type': workout.profile_type,
-                    'duration': workout.duration,
-                    'avg_heart_rate': workout.avg_heart_rate,
-                    'max_heart_rate': workout.max_heart_rate,
-                    'calories': workout.calories_burned,
-                    'start_time': workout.start_time.isoformat() if workout.start_time else None,
-                },
-            })
+        )\
+        .order_by(WorkoutSession.start_time.desc())\
+        .limit(50)\
+        .all()
+
+    activities = [
+        {
+            'id': workout.id,
+            'user': {
+                'id': workout.user_id,
+                'name': name,
+            },
+            'workout': _share_fields(workout),
+        }
+        for workout, name in rows
+    ]
 
     return jsonify({'activities': activities}), 200
 
 
+def _share_fields(workout):
+    """Workout summary shown in the feed and share cards"""
+    return {
+        'profile_type': workout.workout_profile_name or workout.workout_type,
+        'duration': workout.duration_minutes(),
+        'avg_heart_rate': workout.avg_heart_rate,
+        'max_heart_rate': workout.max_heart_rate,
+        'calories': None,  # Not tracked yet
+        'start_time': workout.start_time.isoformat() if workout.start_time else None,
+    }
+
+
 @bp.route('/users/search', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def search_users():
     """
@@ -308,6 +319,7 @@ def search_users():
 
 
 @bp.route('/workouts/<int:workout_id>/share', methods=['POST'])
+@query_budget(2)
 @jwt_required()
 def share_workout(workout_id):
     """
@@ -326,13 +338,15 @@ def share_workout(workout_id):
 
     # For now, just return share link data
     # In the future, could integrate with social media APIs
+    summary = _share_fields(workout)
+    minutes = round(summary['duration'] or 0)
     share_data = {
         'workout_id': workout.id,
-        'profile_type': workout.profile_type,
-        'duration': workout.duration,
-        'avg_heart_rate': workout.avg_heart_rate,
-        'calories': workout.calories_burned,
-        'message': f"Just crushed a {workout.duration}-minute {workout.profile_type} workout! 💪",
+        'profile_type': summary['profile_type'],
+        'duration': summary['duration'],
+        'avg_heart_rate': summary['avg_heart_rate'],
+        'calories': summary['calories'],
+        'message': f"Just crushed a {minutes}-minute {summary['profile_type']} workout! 💪",
     }
 
     return jsonify({
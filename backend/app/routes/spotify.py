@@ -1,25 +1,91 @@
 """
 Spotify Integration Routes - OAuth and API interactions
+
+The views that call Spotify are async and use httpx. Served by asgi.py they
+wait for Spotify on the event loop instead of holding a worker, so one
+process can have thousands of Spotify calls in flight - as long as they don't
+hold a database connection meanwhile (release_db() before every await: the
+pool only has SQLITE_POOL_SIZE + SQLITE_MAX_OVERFLOW). Under gunicorn/WSGI
+Flask runs them to completion in the worker like any other view, on a fresh
+event loop each time - so there each request gets its own short-lived client.
 """
 
-from flask import Blueprint, request, jsonify, redirect
-from flask_jwt_extended import jwt_required, get_jwt_identity
-import requests
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+from flask import Blueprint, request, jsonify, redirect, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from urllib.parse import urlencode
 from app import db
 from app.models import User, Song
+from sqlalchemy.exc import IntegrityError
+from app.utils.song_index import song_index
+from app.utils.next_song import zone_song_index
+from app.utils.asgi import on_event_loop, on_shutdown
 from datetime import datetime
 import os
 
 # Create Blueprint
 bp = Blueprint('spotify', __name__, url_prefix='/api/spotify')
 
+# `httpx` is imported inside the handlers that call Spotify - it's one of the
+# slowest imports in the app and most workers never need it.
+
+# One pooled client per event loop (asgi.py runs a single loop per process)
+_http_clients = weakref.WeakKeyDictionary()
+
 # Spotify API URLs
 SPOTIFY_AUTH_URL = 'https://accounts.spotify.com/authorize'
 SPOTIFY_TOKEN_URL = 'https://accounts.spotify.com/api/token'
 SPOTIFY_API_BASE = 'https://api.spotify.com/v1'
 
 
+def _new_http_client():
+    import httpx
+
+    max_connections = current_app.config['SPOTIFY_MAX_CONNECTIONS']
+    return httpx.AsyncClient(
+        timeout=current_app.config['SPOTIFY_HTTP_TIMEOUT'],
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+
+
+@asynccontextmanager
+async def spotify_http():
+    """
+    httpx.AsyncClient to call Spotify with: the event loop's pooled client
+    under asgi.py, otherwise one closed again when the request is done
+    """
+    if not on_event_loop():
+        async with _new_http_client() as client:
+            yield client
+        return
+
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = _http_clients[loop] = _new_http_client()
+    yield client
+
+
+def release_db():
+    """
+    Hand the session's pooled connection back before awaiting Spotify
+    Loaded objects stay usable; the next query checks a connection out again
+    """
+    db.session.close()
+
+
+@on_shutdown
+async def close_http_clients():
+    """Close the pooled clients when the ASGI server stops"""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
 @bp.route('/connect', methods=['GET'])
 @jwt_required()
 def connect_spotify():
@@ -57,11 +123,13 @@ def connect_spotify():
 
 
 @bp.route('/callback', methods=['GET'])
-def spotify_callback():
+async def spotify_callback():
     """
     Step 2 of Spotify OAuth flow
     Spotify redirects here after user authorizes
     """
+    import httpx
+
     # Get authorization code and user_id from callback
     code = request.args.get('code')
     user_id = request.args.get('state')
@@ -82,8 +150,10 @@ def spotify_callback():
         'client_secret': os.environ.get('SPOTIFY_CLIENT_SECRET')
     }
 
+    release_db()
     try:
-        response = requests.post(SPOTIFY_TOKEN_URL, data=token_data)
+        async with spotify_http() as client:
+            response = await client.post(SPOTIFY_TOKEN_URL, data=token_data)
         response.raise_for_status()
         tokens = response.json()
 
@@ -102,30 +172,31 @@ def spotify_callback():
         else:
             return jsonify({'error': 'User not found'}), 404
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return jsonify({'error': f'Failed to get Spotify tokens: {str(e)}'}), 500
 
 
 @bp.route('/currently-playing', methods=['GET'])
 @jwt_required()
-def get_currently_playing():
+async def get_currently_playing():
     """
     Get the song currently playing on user's Spotify
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    import httpx
 
-    if not user or not user.spotify_access_token:
+    if not current_user.spotify_access_token:
         return jsonify({'error': 'Spotify not connected'}), 400
 
     # Call Spotify API
-    headers = {'Authorization': f'Bearer {user.spotify_access_token}'}
+    headers = {'Authorization': f'Bearer {current_user.spotify_access_token}'}
+    release_db()  # @jwt_required may have loaded the user
 
     try:
-        response = requests.get(
-            f'{SPOTIFY_API_BASE}/me/player/currently-playing',
-            headers=headers
-        )
+        async with spotify_http() as client:
+            response = await client.get(
+                f'{SPOTIFY_API_BASE}/me/player/currently-playing',
+                headers=headers
+            )
 
         if response.status_code == 204:
             return jsonify({'playing': False, 'message': 'No song currently playing'}), 200
@@ -151,45 +222,41 @@ def get_currently_playing():
             }
         }), 200
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return jsonify({'error': f'Failed to get currently playing: {str(e)}'}), 500
 
 
 @bp.route('/audio-features/<spotify_id>', methods=['GET'])
 @jwt_required()
-def get_audio_features(spotify_id):
+async def get_audio_features(spotify_id):
     """
     Get Spotify audio features (tempo, energy, valence) for a song
     This is the MAGIC data we use for categorization!
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    import httpx
 
-    if not user or not user.spotify_access_token:
+    if not current_user.spotify_access_token:
         return jsonify({'error': 'Spotify not connected'}), 400
 
-    headers = {'Authorization': f'Bearer {user.spotify_access_token}'}
+    headers = {'Authorization': f'Bearer {current_user.spotify_access_token}'}
 
-    try:
-        # Get audio features
-        response = requests.get(
-            f'{SPOTIFY_API_BASE}/audio-features/{spotify_id}',
-            headers=headers
-        )
-        response.raise_for_status()
-        features = response.json()
+    # Check if song exists in our database
+    song = Song.query.filter_by(spotify_id=spotify_id).first()
+    release_db()
 
-        # Check if song exists in our database
-        song = Song.query.filter_by(spotify_id=spotify_id).first()
+    try:
+        # Get audio features, and track info at the same time for a new song
+        async with spotify_http() as client:
+            calls = [client.get(f'{SPOTIFY_API_BASE}/audio-features/{spotify_id}', headers=headers)]
+            if not song:
+                calls.append(client.get(f'{SPOTIFY_API_BASE}/tracks/{spotify_id}', headers=headers))
+            responses = await asyncio.gather(*calls)
+        for response in responses:
+            response.raise_for_status()
+        features = responses[0].json()
 
         if not song:
-            # Get track info too
-            track_response = requests.get(
-                f'{SPOTIFY_API_BASE}/tracks/{spotify_id}',
-                headers=headers
-            )
-            track_response.raise_for_status()
-            track = track_response.json()
+            track = responses[1].json()
 
             # Create new song in database
             song = Song(
@@ -214,14 +281,27 @@ def get_audio_features(spotify_id):
             song.update_categorization()
 
             db.session.add(song)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another request added it while we waited on Spotify
+                db.session.rollback()
+                song = Song.query.filter_by(spotify_id=spotify_id).one()
+                return jsonify({
+                    'song': song.to_dict(),
+                    'message': 'Audio features fetched successfully!'
+                }), 200
+
+            # Make the new song searchable by similarity and pickable as a next song right away
+            song_index.add(song)
+            zone_song_index.add(song)
 
         return jsonify({
             'song': song.to_dict(),
             'message': 'Audio features fetched successfully!'
         }), 200
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return jsonify({'error': f'Failed to get audio features: {str(e)}'}), 500
 
 
@@ -231,8 +311,7 @@ def disconnect_spotify():
     """
     Disconnect user's Spotify account
     """
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
+    user = User.query.get(current_user.id)
 
     if user:
         user.spotify_access_token = None
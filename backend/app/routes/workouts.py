@@ -2,18 +2,34 @@
 Workout Tracking Routes - Start/stop workouts, log heart rate, track songs
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models import User, WorkoutSession, HeartRateData, SongPlay, Song
 from app.utils.workout_analysis import analyze_workout, get_user_top_songs
-from datetime import datetime
+from app.utils.song_index import song_index, normalize_features, FEATURES
+from app.utils.next_song import pick_next_song
+from app.utils.collaborative import recommend_songs
+from app.utils.fast_json import stream_json_response
+from app.utils.export import export_lines, gzip_chunks
+from app.utils.wearable_import import import_file, ImportFormatError
+from app.utils.heart_rate_store import rollup_samples, DETAIL_RESOLUTION
+from app.utils.hr_aggregates import record_workout, dashboard, trends, PERIODS
+from app.utils.hr_shards import hr_execute
+from app.utils.serializers import (
+    SONG_COLUMNS, WORKOUT_COLUMNS, HEART_RATE_COLUMNS, SONG_PLAY_COLUMNS,
+    song_row, workout_row, song_play_row, heart_rate_row, heart_rate_json
+)
+from app.utils.query_budget import query_budget
+from app.utils.db_routing import read_from_replicas, primary_only
+from datetime import datetime, timezone
 
 # Create Blueprint
-bp = Blueprint('workouts', __name__, url_prefix='/api/workouts')
+bp = read_from_replicas(Blueprint('workouts', __name__, url_prefix='/api/workouts'))
 
 
 @bp.route('/start', methods=['POST'])
+@query_budget(6)
 @jwt_required()
 def start_workout():
     """
@@ -59,6 +75,7 @@ def start_workout():
 
 
 @bp.route('/<int:workout_id>/transition', methods=['POST'])
+@query_budget(5)
 @jwt_required()
 def transition_workout(workout_id):
     """
@@ -108,6 +125,7 @@ def transition_workout(workout_id):
 
 
 @bp.route('/<int:workout_id>/heartrate', methods=['POST'])
+@query_budget(4)
 @jwt_required()
 def log_heart_rate(workout_id):
     """
@@ -145,22 +163,23 @@ def log_heart_rate(workout_id):
     else:
         timestamp = datetime.utcnow()
 
-    hr_data = HeartRateData(
-        workout_session_id=workout_id,
-        bpm=data['bpm'],
-        timestamp=timestamp
-    )
-
-    db.session.add(hr_data)
+    # Core insert so it runs on the user's heart rate shard
+    hr_data = hr_execute(user_id, db.insert(HeartRateData).returning(*HEART_RATE_COLUMNS), {
+        'workout_session_id': workout_id,
+        'bpm': data['bpm'],
+        'timestamp': timestamp,
+        'created_at': datetime.utcnow()
+    }).one()
     db.session.commit()
 
     return jsonify({
         'message': 'Heart rate logged',
-        'data': hr_data.to_dict()
+        'data': heart_rate_row(hr_data)
     }), 201
 
 
 @bp.route('/<int:workout_id>/song', methods=['POST'])
+@query_budget(6)
 @jwt_required()
 def log_song_play(workout_id):
     """
@@ -223,7 +242,38 @@ def log_song_play(workout_id):
     }), 201
 
 
+@bp.route('/<int:workout_id>/next-song', methods=['GET'])
+@query_budget(6)
+@primary_only
+@jwt_required()
+def get_next_song(workout_id):
+    """
+    Pick the next song for an active workout from the live heart rate
+    Uses the HR trend and the gap to the workout profile's target zone
+    """
+    user_id = int(get_jwt_identity())
+
+    workout = WorkoutSession.query.get(workout_id)
+
+    if not workout:
+        return jsonify({'error': 'Workout not found'}), 404
+
+    if workout.user_id != user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if workout.status != 'active':
+        return jsonify({'error': 'Workout is not active'}), 400
+
+    result = pick_next_song(workout)
+
+    if 'error' in result:
+        return jsonify(result), 400
+
+    return jsonify(result), 200
+
+
 @bp.route('/<int:workout_id>/end', methods=['POST'])
+@query_budget(10)
 @jwt_required()
 def end_workout(workout_id):
     """
@@ -248,14 +298,19 @@ def end_workout(workout_id):
     workout.status = 'completed'
 
     # Calculate heart rate statistics
-    hr_data = HeartRateData.query.filter_by(workout_session_id=workout_id).all()
+    readings = hr_execute(user_id, db.select(HeartRateData.timestamp, HeartRateData.bpm)
+                          .where(HeartRateData.workout_session_id == workout_id)
+                          .order_by(HeartRateData.timestamp)).all()
 
-    if hr_data:
-        bpms = [d.bpm for d in hr_data]
+    if readings:
+        bpms = [bpm for _, bpm in readings]
         workout.avg_heart_rate = sum(bpms) // len(bpms)
         workout.max_heart_rate = max(bpms)
         workout.min_heart_rate = min(bpms)
 
+    # Add it to the hourly dashboard totals
+    record_workout(workout_id, user_id, readings)
+
     db.session.commit()
 
     return jsonify({
@@ -265,6 +320,8 @@ def end_workout(workout_id):
 
 
 @bp.route('/active', methods=['GET'])
+@query_budget(3)
+@primary_only
 @jwt_required()
 def get_active_workout():
     """
@@ -287,6 +344,7 @@ def get_active_workout():
 
 
 @bp.route('/history', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_workout_history():
     """
@@ -294,17 +352,108 @@ def get_workout_history():
     """
     user_id = int(get_jwt_identity())
 
-    workouts = WorkoutSession.query.filter_by(user_id=user_id)\
+    # Song counts come from a subquery instead of loading every workout's plays
+    total_songs = db.select(db.func.count(SongPlay.id))\
+        .where(SongPlay.workout_session_id == WorkoutSession.id)\
+        .scalar_subquery()
+
+    rows = db.session.query(*WORKOUT_COLUMNS, total_songs)\
+        .filter(WorkoutSession.user_id == user_id)\
         .order_by(WorkoutSession.start_time.desc())\
         .limit(50)\
         .all()
 
     return jsonify({
-        'workouts': [w.to_dict() for w in workouts]
+        'workouts': [workout_row(row[:-1], row[-1]) for row in rows]
     }), 200
 
 
+@bp.route('/export', methods=['GET'])
+@query_budget(5)
+@primary_only
+@jwt_required()
+def export_workouts():
+    """
+    Download your whole workout archive as NDJSON - one workout per line,
+    same shape as GET /api/workouts/<id>
+    Read from the primary: the X-Export-Started-At watermark is primary time,
+    and workouts still replicating would be missed by this and the next backup
+
+    Query params:
+    - since: ISO timestamp - only workouts started, ended or analyzed after it
+    - gzip: 'true' for a gzip-compressed .ndjson.gz file
+
+    The X-Export-Started-At header is the `since` to use for the next backup
+    """
+    user_id = int(get_jwt_identity())
+    started_at = datetime.utcnow()
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since.replace('Z', '+00:00'))
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO timestamp'}), 400
+        if since.tzinfo is not None:
+            # Stored times are naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+
+    lines = export_lines(user_id, since)
+    if compress:
+        body, mimetype, filename = gzip_chunks(lines), 'application/gzip', 'workouts.ndjson.gz'
+    else:
+        body, mimetype, filename = (line.encode('utf-8') for line in lines), 'application/x-ndjson', 'workouts.ndjson'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Export-Started-At'] = started_at.isoformat()
+    return response
+
+
+@bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_workouts():
+    """
+    Import workout history from watch export files
+
+    multipart/form-data with one or more `file` fields:
+    .tcx, .gpx (with heart rate extensions) or .csv, optionally gzipped (.gz)
+
+    Each file is imported on its own - a broken file is reported in `errors`
+    without undoing the others. Workouts you already have are skipped.
+    """
+    user_id = int(get_jwt_identity())
+    files = request.files.getlist('file')
+
+    if not files:
+        return jsonify({'error': 'Upload at least one file in the `file` field'}), 400
+
+    totals = {'workouts': 0, 'samples': 0, 'skipped': 0, 'workout_ids': []}
+    errors = []
+
+    for upload in files:
+        try:
+            result = import_file(user_id, upload.filename, upload.stream)
+        except ImportFormatError as e:
+            errors.append({'file': upload.filename, 'error': str(e)})
+            continue
+        for key in totals:
+            totals[key] += result[key]
+
+    status = 201 if totals['workouts'] else (400 if errors else 200)
+
+    return jsonify({
+        'message': f"Imported {totals['workouts']} workouts ({totals['samples']} heart rate readings) 📥",
+        **totals,
+        'errors': errors
+    }), status
+
+
 @bp.route('/<int:workout_id>', methods=['GET'])
+@query_budget(5)
+@primary_only
 @jwt_required()
 def get_workout_details(workout_id):
     """
@@ -312,7 +461,7 @@ def get_workout_details(workout_id):
     """
     user_id = int(get_jwt_identity())
 
-    workout = WorkoutSession.query.get(workout_id)
+    workout = db.session.query(*WORKOUT_COLUMNS).filter(WorkoutSession.id == workout_id).first()
 
     if not workout:
         return jsonify({'error': 'Workout not found'}), 404
@@ -320,29 +469,55 @@ def get_workout_details(workout_id):
     if workout.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    # Get song plays with their songs in one query
+    song_plays = [
+        song_play_row(row) for row in db.session.query(*SONG_PLAY_COLUMNS, *SONG_COLUMNS)
+        .outerjoin(Song, Song.id == SongPlay.song_id)
+        .filter(SongPlay.workout_session_id == workout_id)
+        .order_by(SongPlay.start_time)
+    ]
+
     # Get heart rate data
-    hr_data = HeartRateData.query.filter_by(workout_session_id=workout_id)\
-        .order_by(HeartRateData.timestamp)\
-        .all()
+    hr_filter = HeartRateData.workout_session_id == workout_id
+    hr_query = db.select(*HEART_RATE_COLUMNS).where(hr_filter).order_by(HeartRateData.timestamp)
 
-    # Get song plays
-    song_plays = SongPlay.query.filter_by(workout_session_id=workout_id)\
-        .order_by(SongPlay.start_time)\
-        .all()
+    fields = {
+        'workout': workout_row(workout, len(song_plays)),
+        'song_plays': song_plays,
+        'heart_rate_resolution': 'raw'
+    }
+
+    hr_count = hr_execute(user_id, db.select(db.func.count()).where(hr_filter)).scalar()
+
+    # Long workouts (a 10s sampler makes 360 readings an hour, a 1s one 3600)
+    # are streamed instead of held in memory as one big list and string
+    if hr_count > current_app.config['JSON_STREAM_THRESHOLD']:
+        return stream_json_response(fields, 'heart_rate_data',
+                                    hr_execute(user_id, hr_query.execution_options(yield_per=2000)),
+                                    render=heart_rate_json)
+
+    if hr_count:
+        hr_rows = hr_execute(user_id, hr_query).all()
+    else:
+        # Old workout whose raw samples were archived - serve the rollups
+        hr_rows = rollup_samples(workout_id)
+        if hr_rows:
+            fields['heart_rate_resolution'] = f'{DETAIL_RESOLUTION}s'
 
     return jsonify({
-        'workout': workout.to_dict(),
-        'heart_rate_data': [hr.to_dict() for hr in hr_data],
-        'song_plays': [sp.to_dict() for sp in song_plays]
+        **fields,
+        'heart_rate_data': [heart_rate_row(row) for row in hr_rows]
     }), 200
 
 
 @bp.route('/<int:workout_id>/analyze', methods=['POST'])
+@query_budget(24)
 @jwt_required()
 def analyze_workout_endpoint(workout_id):
     """
     Analyze a completed workout to determine which songs pumped you up!
     This is THE MAGIC ALGORITHM!
+    Repeat calls return the stored result
     """
     user_id = int(get_jwt_identity())
 
@@ -364,6 +539,7 @@ def analyze_workout_endpoint(workout_id):
 
 
 @bp.route('/top-songs', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 def get_top_songs():
     """
@@ -382,7 +558,71 @@ def get_top_songs():
     }), 200
 
 
+@bp.route('/recommendations', methods=['GET'])
+@query_budget(6)
+@jwt_required()
+def get_recommendations():
+    """
+    Get hype songs you haven't played yet that athletes with similar
+    song responses get pumped up by
+
+    Query params:
+    - limit: Number of songs to return (default: 20, max: 100)
+    """
+    user_id = int(get_jwt_identity())
+    limit = min(request.args.get('limit', 20, type=int), 100)
+
+    songs = recommend_songs(user_id, limit)
+
+    return jsonify({
+        'songs': songs,
+        'count': len(songs)
+    }), 200
+
+
+@bp.route('/stats/dashboard', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+def get_dashboard():
+    """
+    Heart rate summary across all your workouts: average/max HR,
+    active minutes and time in each zone
+
+    Query params:
+    - days: How far back to look (default: 30, max: 366)
+    """
+    user_id = int(get_jwt_identity())
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+
+    return jsonify(dashboard(user_id, days)), 200
+
+
+@bp.route('/stats/trends', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_trends():
+    """
+    Heart rate summaries per day, week or month, oldest first
+
+    Query params:
+    - period: 'day', 'week' or 'month' (default: week)
+    - count: Number of periods (default: 12, max: 366)
+    """
+    user_id = int(get_jwt_identity())
+    period = request.args.get('period', 'week')
+    count = min(max(request.args.get('count', 12, type=int), 1), 366)
+
+    if period not in PERIODS:
+        return jsonify({'error': f'period must be one of: {", ".join(PERIODS)}'}), 400
+
+    return jsonify({
+        'period': period,
+        'trends': trends(user_id, period, count)
+    }), 200
+
+
 @bp.route('/songs/library', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_song_library():
     """
@@ -398,33 +638,46 @@ def get_song_library():
 
     if zone_filter:
         # Get songs for specific zone
-        query = Song.query.filter_by(auto_category_zone=zone_filter)
+        query = db.session.query(*SONG_COLUMNS).filter(Song.auto_category_zone == zone_filter)
         if limit:
             query = query.limit(limit)
-        songs = query.all()
+        songs = [song_row(row) for row in query]
 
         return jsonify({
             'zone': zone_filter,
-            'songs': [song.to_dict() for song in songs],
+            'songs': songs,
             'count': len(songs)
         }), 200
 
     else:
-        # Get all songs organized by zone
+        # Get all songs organized by zone - one query for every zone
         zones = ['Zone 5', 'Zone 4', 'Zone 3', 'Zone 2', 'Zone 1']
-        library = {}
-
-        for zone in zones:
-            query = Song.query.filter_by(auto_category_zone=zone).order_by(Song.hype_score.desc())
-            if limit:
-                query = query.limit(limit)
-            zone_songs = query.all()
-            library[zone] = {
+        by_zone = {zone: [] for zone in zones}
+
+        query = db.session.query(*SONG_COLUMNS).filter(Song.auto_category_zone.in_(zones))
+        if limit:
+            # Top `limit` per zone, ranked in SQL
+            rank = db.func.row_number().over(
+                partition_by=Song.auto_category_zone,
+                order_by=(Song.hype_score.desc(), Song.id)
+            ).label('zone_rank')
+            ranked = db.session.query(Song.id, rank)\
+                .filter(Song.auto_category_zone.in_(zones))\
+                .subquery()
+            query = query.join(ranked, ranked.c.id == Song.id).filter(ranked.c.zone_rank <= limit)
+
+        for row in query.order_by(Song.hype_score.desc(), Song.id):
+            by_zone[row.auto_category_zone].append(song_row(row))
+
+        library = {
+            zone: {
                 'zone_name': zone,
                 'description': get_zone_description(zone),
-                'songs': [song.to_dict() for song in zone_songs],
-                'count': len(zone_songs)
+                'songs': by_zone[zone],
+                'count': len(by_zone[zone])
             }
+            for zone in zones
+        }
 
         return jsonify({
             'library': library,
@@ -432,6 +685,96 @@ def get_song_library():
         }), 200
 
 
+@bp.route('/songs/<int:song_id>/similar', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+def get_similar_songs(song_id):
+    """
+    Get songs that sound like this one (closest audio features)
+
+    Query params:
+    - k: Number of songs to return (default: 10, max: 100)
+    """
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+
+    song_index.ensure_built()
+
+    if song_index.vector_for(song_id) is None:
+        return jsonify({'error': 'Song not found or has no audio features'}), 404
+
+    neighbours = song_index.similar_to(song_id, k=k)
+
+    return jsonify({
+        'song_id': song_id,
+        'songs': _songs_with_distance(neighbours),
+        'count': len(neighbours)
+    }), 200
+
+
+@bp.route('/songs/nearest', methods=['POST'])
+@query_budget(2)
+@jwt_required()
+def find_nearest_songs():
+    """
+    k-NN search over audio features
+
+    Expected JSON body:
+    {
+        "features": {"tempo": 150, "energy": 0.8, ...},  # all 8 audio features
+        "weights": {"tempo": 2.0, "speechiness": 0},     # optional, default 1.0 each
+        "k": 10                                          # optional
+    }
+    """
+    data = request.get_json()
+
+    if not isinstance(data, dict) or not data.get('features'):
+        return jsonify({'error': 'features are required'}), 400
+
+    features = data['features']
+    if not isinstance(features, dict) or not all(_is_number(v) for v in features.values() if v is not None):
+        return jsonify({'error': 'features must be an object of numbers'}), 400
+
+    vector = normalize_features(features)
+    if vector is None:
+        return jsonify({'error': f'features must include: {", ".join(FEATURES)}'}), 400
+
+    weights = data.get('weights') or {}
+    if not isinstance(weights, dict) or not all(_is_number(w) for w in weights.values()):
+        return jsonify({'error': 'weights must be numbers'}), 400
+    if any(w < 0 for w in weights.values()):
+        return jsonify({'error': 'weights must be non-negative'}), 400
+
+    try:
+        k = min(max(int(data.get('k', 10)), 1), 100)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k must be a number'}), 400
+
+    song_index.ensure_built()
+    neighbours = song_index.query(vector, k=k, weights=weights)
+
+    return jsonify({
+        'songs': _songs_with_distance(neighbours),
+        'count': len(neighbours)
+    }), 200
+
+
+def _is_number(value):
+    """int or float from a JSON body (JSON true/false parse as bools, which are ints)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _songs_with_distance(neighbours):
+    """Load (song_id, distance) pairs in one query, keeping the ranking order"""
+    songs = {s.id: s for s in Song.query.filter(Song.id.in_([sid for sid, _ in neighbours])).all()}
+
+    results = []
+    for song_id, distance in neighbours:
+        song = songs.get(song_id)
+        if song:
+            results.append({**song.to_dict(), 'distance': distance})
+    return results
+
+
 def get_zone_description(zone):
     """Get friendly description for each workout zone"""
     descriptions = {
@@ -0,0 +1,212 @@
+"""
+ASGI Adapter - Serves the Flask app from an event loop (see asgi.py)
+
+Flask's own async support runs an async view to completion inside the
+worker thread, so a view waiting on Spotify still ties up a whole worker.
+Here async views run as tasks on the server's event loop instead: the JWT
+check, before/after_request hooks, error handlers and teardown are Flask's
+own, only the view is awaited rather than run in a thread. Everything else
+goes through the normal WSGI app in a thread pool of ASGI_SYNC_THREADS.
+
+Keep the sync work inside async views short (a query or two) - it runs on
+the loop and holds up every other in-flight request while it does. And close
+the session before awaiting anything slow: a connection held across an await
+is one less in the pool, and once the pool is empty the next checkout blocks
+the loop itself. The request context (and the session) is torn down before
+the response is sent, so sending never holds one either.
+"""
+
+import asyncio
+import inspect
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from flask.signals import request_started
+from werkzeug.exceptions import HTTPException
+
+# Set while an async view is dispatched on the event loop
+_on_event_loop = ContextVar('on_event_loop', default=False)
+
+# Coroutine functions awaited on lifespan shutdown (e.g. closing HTTP clients)
+_shutdown_hooks = []
+
+
+def on_event_loop():
+    """True inside an async view FlaskASGI runs on the server's event loop"""
+    return _on_event_loop.get()
+
+
+def on_shutdown(hook):
+    """Await hook() when the ASGI server shuts down"""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope and its request body"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+
+    for name, value in scope['headers']:
+        name = name.decode('latin1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+    }
+
+
+class FlaskASGI:
+    """ASGI app running a Flask app's async views on the event loop"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(flask_app.config['ASGI_SYNC_THREADS'], thread_name_prefix='wsgi')
+        self._async_endpoints = {}
+
+        # Views call ensure_sync(view) - hand coroutine functions back as they
+        # are when we're on the loop, so dispatch_request() returns the coroutine
+        wrap = flask_app.ensure_sync
+
+        def ensure_sync(func):
+            if _on_event_loop.get() and inspect.iscoroutinefunction(func):
+                return func
+            return wrap(func)
+
+        flask_app.ensure_sync = ensure_sync
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        environ = build_environ(scope, bytes(body))
+        if self._is_async_view(environ):
+            await self._dispatch_async(environ, send)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._run_wsgi, environ, loop, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for hook in _shutdown_hooks:
+                    await hook()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _is_async_view(self, environ):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False  # 404/405/redirects - let Flask answer them
+        if endpoint not in self._async_endpoints:
+            view = inspect.unwrap(self.flask_app.view_functions[endpoint])
+            self._async_endpoints[endpoint] = inspect.iscoroutinefunction(view)
+        return self._async_endpoints[endpoint]
+
+    async def _dispatch_async(self, environ, send):
+        """Flask.wsgi_app() + full_dispatch_request(), awaiting the view"""
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        flag = _on_event_loop.set(True)
+        error = None
+        try:
+            try:
+                ctx.push()
+                app._got_first_request = True
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = app.dispatch_request()
+                        if inspect.isawaitable(rv):
+                            rv = await rv
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+
+            status, headers, body = response.status_code, list(response.headers.items()), response.get_data()
+            response.close()
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+            _on_event_loop.reset(flag)
+
+        await send(_response_start(status, headers))
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _run_wsgi(self, environ, loop, send):
+        """Run a sync request through the WSGI app, in a pool thread"""
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        body = self.flask_app(environ, start_response)
+        try:
+            sent_start = False
+            for chunk in body:
+                if not sent_start:
+                    emit(_response_start(started['status'], started['headers']))
+                    sent_start = True
+                if chunk:
+                    emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not sent_start:
+                emit(_response_start(started['status'], started['headers']))
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
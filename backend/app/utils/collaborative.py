@@ -0,0 +1,202 @@
+"""
+Collaborative Recommendations - "Athletes who get hyped by your songs also love..."
+Builds item-item similarity from every user's SongStats and uses it to suggest
+hype songs a user hasn't played yet
+"""
+
+import heapq
+from collections import defaultdict
+from datetime import datetime
+from math import sqrt
+
+from app import db
+from app.models import Song, SongStats, SongNeighbor, SystemSetting
+
+NEIGHBORS_PER_SONG = 50  # Strongest neighbours kept per song
+SIMILARITY_SHRINKAGE = 5  # Damps similarities backed by only a few users
+SEED_SONGS = 20  # User's top hype songs used to find recommendations
+WRITE_CHUNK_SIZE = 1000  # Songs whose neighbour rows are replaced per batch
+
+BUILT_AT_KEY = 'song_neighbors_built_at'
+
+
+def load_hype_matrix():
+    """
+    Sparse user x song matrix of positive personal hype scores
+
+    Returns:
+        (by_song, by_user) - {song_id: {user_id: score}} and {user_id: {song_id: score}}
+    """
+    by_song = defaultdict(dict)
+    by_user = defaultdict(dict)
+
+    rows = db.session.query(SongStats.user_id, SongStats.song_id, SongStats.personal_hype_score)\
+        .filter(SongStats.personal_hype_score > 0)\
+        .yield_per(10000)
+
+    for user_id, song_id, score in rows:
+        by_song[song_id][user_id] = score
+        by_user[user_id][song_id] = score
+
+    return by_song, by_user
+
+
+def song_neighbors(song_id, by_song, by_user, norms):
+    """
+    Cosine similarity between one song and every song sharing a user with it
+
+    Returns:
+        List of (similarity, neighbor_id, support), strongest first
+    """
+    dots = defaultdict(float)
+    support = defaultdict(int)
+
+    for user_id, score in by_song[song_id].items():
+        for other_id, other_score in by_user[user_id].items():
+            if other_id != song_id:
+                dots[other_id] += score * other_score
+                support[other_id] += 1
+
+    norm = norms[song_id]
+    scored = (
+        (dots[j] / (norm * norms[j]) * support[j] / (support[j] + SIMILARITY_SHRINKAGE), j, support[j])
+        for j in dots
+    )
+    return heapq.nlargest(NEIGHBORS_PER_SONG, scored)
+
+
+def build_song_neighbors(full=False):
+    """
+    Rebuild the song_neighbors table
+
+    Incremental runs only recompute songs whose stats changed since the last
+    build, plus every song that shares a user with them (their similarity to
+    the changed songs moved). Songs with no shared users keep their rows,
+    except rows pointing at a changed song they no longer share a user with.
+
+    Returns:
+        dict with counts for progress reporting
+    """
+    started = datetime.utcnow()
+    built_at = SystemSetting.get_value(BUILT_AT_KEY)
+
+    by_song, by_user = load_hype_matrix()
+    norms = {song_id: sqrt(sum(s * s for s in users.values())) for song_id, users in by_song.items()}
+
+    if full or not built_at:
+        targets = set(by_song)
+        SongNeighbor.query.delete()
+    else:
+        changed = {
+            song_id for (song_id,) in db.session.query(SongStats.song_id)
+            .filter(SongStats.last_played_at > datetime.fromisoformat(built_at))
+            .distinct()
+        }
+        targets = set(changed)
+        for song_id in changed:
+            for user_id in by_song.get(song_id, {}):
+                targets.update(by_user[user_id])
+        _delete_stale_neighbor_rows(sorted(changed), targets)
+
+    targets = sorted(targets)
+    rows_written = 0
+
+    for start in range(0, len(targets), WRITE_CHUNK_SIZE):
+        chunk = targets[start:start + WRITE_CHUNK_SIZE]
+
+        rows = []
+        for song_id in chunk:
+            if song_id not in by_song:
+                continue  # No positive responses left - its old rows are just removed
+            for similarity, neighbor_id, support in song_neighbors(song_id, by_song, by_user, norms):
+                rows.append({
+                    'song_id': song_id,
+                    'neighbor_id': neighbor_id,
+                    'similarity': similarity,
+                    'support': support
+                })
+
+        SongNeighbor.query.filter(SongNeighbor.song_id.in_(chunk)).delete(synchronize_session=False)
+        if rows:
+            db.session.execute(db.insert(SongNeighbor), rows)
+        db.session.commit()
+        rows_written += len(rows)
+
+    SystemSetting.set_value(BUILT_AT_KEY, started.isoformat())
+    db.session.commit()
+
+    return {
+        'users': len(by_user),
+        'songs': len(by_song),
+        'songs_rebuilt': len(targets),
+        'neighbor_rows': rows_written,
+        'incremental': not full and bool(built_at)
+    }
+
+
+def _delete_stale_neighbor_rows(changed, targets):
+    """
+    Drop rows pointing at changed songs from songs that aren't being rebuilt -
+    e.g. a song whose score dropped to 0 is gone from everyone's neighbours
+    """
+    for start in range(0, len(changed), WRITE_CHUNK_SIZE):
+        chunk = changed[start:start + WRITE_CHUNK_SIZE]
+        stale = [
+            song_id for (song_id,) in db.session.query(SongNeighbor.song_id)
+            .filter(SongNeighbor.neighbor_id.in_(chunk))
+            .distinct()
+            if song_id not in targets
+        ]
+        for stale_start in range(0, len(stale), WRITE_CHUNK_SIZE):
+            SongNeighbor.query.filter(
+                SongNeighbor.song_id.in_(stale[stale_start:stale_start + WRITE_CHUNK_SIZE]),
+                SongNeighbor.neighbor_id.in_(chunk)
+            ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def recommend_songs(user_id, limit=20):
+    """
+    Hype songs this user hasn't played yet, ranked by how strongly they
+    resemble the user's own top hype songs in other athletes' responses
+
+    Returns:
+        List of song dicts with predicted_hype_score and match_score
+    """
+    seeds = db.session.query(SongStats.song_id, SongStats.personal_hype_score)\
+        .filter(SongStats.user_id == user_id, SongStats.personal_hype_score > 0)\
+        .order_by(SongStats.personal_hype_score.desc())\
+        .limit(SEED_SONGS)\
+        .all()
+
+    if not seeds:
+        return []
+
+    seed_scores = dict(seeds)
+    played = {song_id for (song_id,) in db.session.query(SongStats.song_id).filter_by(user_id=user_id)}
+
+    neighbors = db.session.query(SongNeighbor.song_id, SongNeighbor.neighbor_id, SongNeighbor.similarity)\
+        .filter(SongNeighbor.song_id.in_(list(seed_scores)))\
+        .all()
+
+    weighted = defaultdict(float)
+    weights = defaultdict(float)
+    for seed_id, neighbor_id, similarity in neighbors:
+        if neighbor_id in played or similarity <= 0:
+            continue
+        weighted[neighbor_id] += similarity * seed_scores[seed_id]
+        weights[neighbor_id] += similarity
+
+    top = heapq.nlargest(limit, weighted.items(), key=lambda item: item[1])
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_([song_id for song_id, _ in top])).all()}
+
+    results = []
+    for song_id, match_score in top:
+        song = songs.get(song_id)
+        if song:
+            results.append({
+                'song': song.to_dict(),
+                'predicted_hype_score': round(match_score / weights[song_id], 2),
+                'match_score': round(match_score, 2)
+            })
+    return results
@@ -0,0 +1,100 @@
+"""
+Read Replica Routing - GET requests to opted-in blueprints read from a replica
+while writes stay on the primary
+
+DATABASE_REPLICA_URLS lists read-only copies of the primary database: a
+PostgreSQL streaming replica, or locally a SQLite file refreshed with
+`flask sync-sqlite-replicas`. Blueprints whose GET views are reads opt in
+with read_from_replicas(bp). Each GET request to them picks a replica and
+the session sends every query there, with these exceptions:
+  - flushes and INSERT/UPDATE/DELETE statements go to the primary and pin
+    the rest of the request to it, so it reads its own writes
+  - views marked @primary_only, for reads that must see the caller's write
+    from an earlier request (the active workout, the live next-song pick)
+  - code inside `with use_primary():`
+Replicas lag, so only route reads that can be a few seconds stale. With no
+replicas configured everything runs on the primary, as before.
+"""
+
+import random
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND_PREFIX = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+_replica_blueprints = set()
+
+
+def read_from_replicas(bp):
+    """Opt a blueprint's GET views in to replica reads"""
+    _replica_blueprints.add(bp.name)
+    return bp
+
+
+def primary_only(view):
+    """Keep this view on the primary even in an opted-in blueprint"""
+    view.primary_only = True
+    return view
+
+
+@contextmanager
+def use_primary():
+    """Run the enclosed queries on the primary"""
+    if not has_request_context():
+        yield
+        return
+    replica = g.pop('db_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None and not g.get('db_pinned'):
+            g.db_replica = replica
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the request's replica, if it has one"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # A write - this request reads from the primary from now on
+                g.pop('db_replica', None)
+                g.db_pinned = True
+            elif g.get('db_replica') is not None:
+                return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def register_read_replicas(app, db):
+    """Pick a replica for each read request to an opted-in blueprint"""
+    keys = [key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith(REPLICA_BIND_PREFIX)]
+    if not keys:
+        return
+
+    with app.app_context():
+        replicas = [db.engines[key] for key in keys]
+
+    for engine in replicas:
+        if engine.dialect.name == 'sqlite':
+            # A write routed here by mistake fails instead of forking the data
+            event.listen(engine, 'connect', _sqlite_query_only)
+
+    @app.before_request
+    def choose_database():
+        if request.method not in READ_METHODS or request.blueprint not in _replica_blueprints:
+            return
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, 'primary_only', False):
+            g.db_replica = random.choice(replicas)
+
+
+def _sqlite_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA query_only = ON')
+    finally:
+        cursor.close()
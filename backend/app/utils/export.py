@@ -0,0 +1,137 @@
+"""
+Workout Export - A user's whole workout archive as NDJSON
+One line per workout, shaped like GET /api/workouts/<id>. Workouts, heart
+rate readings and song plays are read as three ordered server-side cursors
+and merged by workout id, so memory stays at about one workout no matter
+how long the history is
+"""
+
+import zlib
+from itertools import groupby
+from operator import itemgetter
+
+from flask import current_app
+
+from app import db
+from app.models import WorkoutSession, HeartRateData, SongPlay, Song
+from app.utils.serializers import (
+    SONG_COLUMNS, WORKOUT_COLUMNS, HEART_RATE_COLUMNS, SONG_PLAY_COLUMNS,
+    workout_row, song_play_row, heart_rate_json
+)
+from app.utils.heart_rate_store import archived_workout_ids, rollup_samples, DETAIL_RESOLUTION
+from app.utils.hr_shards import hr_execute, shard_engine
+
+EXPORT_BATCH_SIZE = 2000  # Rows fetched per round trip from each cursor
+GZIP_FLUSH_BYTES = 64 * 1024  # Uncompressed text collected before compressing a chunk
+
+
+def _workout_filters(user_id, since):
+    """Which workouts go in the export"""
+    filters = [WorkoutSession.user_id == user_id]
+    if since:
+        # Anything that started, finished or got (re)analyzed after the last backup
+        filters.append(db.or_(
+            WorkoutSession.start_time >= since,
+            WorkoutSession.end_time >= since,
+            WorkoutSession.analyzed_at >= since
+        ))
+    return filters
+
+
+def _rows_by_workout(rows):
+    """
+    take(workout_id) -> list of that workout's rows
+    rows must be ordered by workout id (column 1) and take() called with increasing ids
+    """
+    groups = groupby(rows, key=itemgetter(1))
+    current = next(groups, None)
+
+    def take(workout_id):
+        nonlocal current
+        while current and current[0] < workout_id:
+            current = next(groups, None)
+        if not current or current[0] != workout_id:
+            return []
+        found = list(current[1])
+        current = next(groups, None)
+        return found
+
+    return take
+
+
+def export_lines(user_id, since=None):
+    """
+    Yield one NDJSON line (str, newline included) per workout, oldest first
+
+    Args:
+        user_id: Whose workouts to export
+        since: Optional datetime for incremental backups
+    """
+    filters = _workout_filters(user_id, since)
+    encoder = current_app.json
+
+    workouts = db.session.query(*WORKOUT_COLUMNS)\
+        .filter(*filters)\
+        .order_by(WorkoutSession.id)\
+        .yield_per(EXPORT_BATCH_SIZE)
+
+    hr_query = db.select(*HEART_RATE_COLUMNS)
+    if shard_engine(user_id) is None:
+        hr_query = hr_query.join(WorkoutSession, WorkoutSession.id == HeartRateData.workout_session_id)\
+            .where(*filters)
+    else:
+        # A shard has no workout_sessions table to join - filter by the workout ids instead
+        workout_ids = db.session.scalars(db.select(WorkoutSession.id).where(*filters)).all()
+        hr_query = hr_query.where(HeartRateData.workout_session_id.in_(workout_ids))
+    heart_rates = _rows_by_workout(hr_execute(
+        user_id,
+        hr_query.order_by(HeartRateData.workout_session_id, HeartRateData.timestamp)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    ))
+
+    song_plays = _rows_by_workout(
+        db.session.query(*SONG_PLAY_COLUMNS, *SONG_COLUMNS)
+        .join(WorkoutSession, WorkoutSession.id == SongPlay.workout_session_id)
+        .outerjoin(Song, Song.id == SongPlay.song_id)
+        .filter(*filters)
+        .order_by(SongPlay.workout_session_id, SongPlay.start_time)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+
+    archived = archived_workout_ids(user_id)
+
+    for workout in workouts:
+        plays = song_plays(workout.id)
+        hr_rows = heart_rates(workout.id)
+        resolution = 'raw'
+        if not hr_rows and workout.id in archived:
+            # Raw samples moved to the archive - export the rollups like the details endpoint
+            hr_rows = rollup_samples(workout.id)
+            resolution = f'{DETAIL_RESOLUTION}s'
+
+        head = encoder.dumps({
+            'workout': workout_row(workout, len(plays)),
+            'song_plays': [song_play_row(play) for play in plays],
+            'heart_rate_resolution': resolution
+        })
+        readings = ','.join(heart_rate_json(row) for row in hr_rows)
+        yield f'{head[:-1]},"heart_rate_data":[{readings}]}}\n'
+
+
+def gzip_chunks(lines):
+    """Compress a stream of text lines into gzip file chunks as they come"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    pending = []
+    pending_size = 0
+
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= GZIP_FLUSH_BYTES:
+            chunk = compressor.compress(''.join(pending).encode('utf-8'))
+            pending = []
+            pending_size = 0
+            if chunk:
+                yield chunk
+
+    yield compressor.compress(''.join(pending).encode('utf-8')) + compressor.flush()
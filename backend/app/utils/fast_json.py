@@ -0,0 +1,99 @@
+"""
+Fast JSON - App-wide JSON provider plus a streamed path for huge arrays
+Output is compact with unsorted keys, and uses orjson when it's installed.
+Responses with tens of thousands of rows can be streamed in chunks, so the
+whole body never sits in memory as one string
+"""
+
+import json
+from datetime import date
+from functools import lru_cache
+
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional - the stdlib encoder is used without it
+    orjson = None
+
+STREAM_CHUNK_ROWS = 1000  # Rows joined into each streamed chunk
+
+
+@lru_cache(maxsize=4096)
+def isoformat(value):
+    """
+    date/datetime -> ISO 8601 string (None stays None)
+    Cached because list endpoints repeat the same timestamps (seeded songs
+    share a created_at, workouts share analyzed_at batches, ...)
+    """
+    return value.isoformat() if value is not None else None
+
+
+def _default(o):
+    """Anything the encoders don't know natively - dates as ISO strings, not HTTP dates"""
+    if isinstance(o, date):
+        return isoformat(o)
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Drop-in replacement for Flask's provider (set in create_app)
+    jsonify()/current_app.json work exactly as before, just cheaper
+    """
+    sort_keys = False
+    ensure_ascii = False
+    compact = True
+    default = staticmethod(_default)
+
+    def _encode(self, obj):
+        """obj -> UTF-8 bytes"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=self.default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Caller wants specific json.dumps options (indent, ...)
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b'\n', mimetype=self.mimetype)
+
+
+def stream_json_response(fields, array_key, rows, render=None, status=200):
+    """
+    JSON object response whose biggest member is streamed in chunks
+
+    Produces the same document as jsonify({**fields, array_key: [...]}) but
+    rows are only pulled (e.g. from a yield_per query) while the body is sent.
+
+    Args:
+        fields: dict of the small members, encoded up front
+        array_key: name of the streamed array member
+        rows: iterable of rows
+        render: row -> JSON text for that row (default: encode the row as-is)
+    """
+    encoder = current_app.json
+    head = encoder.dumps(fields)[:-1]  # Drop the closing brace
+    render = render or encoder.dumps
+
+    def generate():
+        yield f"{head}{',' if fields else ''}{json.dumps(array_key)}:["
+        chunk = []
+        separator = ''
+        for row in rows:
+            chunk.append(render(row))
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
@@ -0,0 +1,225 @@
+"""
+Heart Rate Store - Reads a workout's heart rate wherever it lives, and the
+retention job that moves old raw samples out of the database
+
+Recent workouts keep every reading in heart_rate_data. After
+HR_RAW_RETENTION_DAYS the retention job rolls a workout up into 10s and
+1 minute buckets (heart_rate_rollups), writes the raw readings to a gzip
+CSV archive on disk and deletes them. Callers use heart_rate_samples() and
+get rollup buckets back as samples once the raw data is gone.
+"""
+
+import csv
+import gzip
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import WorkoutSession, HeartRateData, HeartRateRollup, HeartRateArchive, SystemSetting
+from app.utils.hr_shards import hr_execute
+from app.utils.serializers import HEART_RATE_COLUMNS
+
+ROLLUP_RESOLUTIONS = (10, 60)  # Bucket sizes in seconds
+DETAIL_RESOLUTION = 10  # Rollup used when raw samples are gone
+
+# [[workout_id, user_id], ...] archived but whose raw samples aren't deleted yet
+PENDING_DELETES_KEY = 'hr_archive_pending_deletes'
+
+# Same fields as a HEART_RATE_COLUMNS row; rollup samples have id None
+HeartRateSample = namedtuple('HeartRateSample', ['id', 'workout_session_id', 'timestamp', 'bpm'])
+
+
+def archive_dir():
+    """Where archive files go (HR_ARCHIVE_DIR or <instance folder>/hr_archive)"""
+    return current_app.config['HR_ARCHIVE_DIR'] or os.path.join(current_app.instance_path, 'hr_archive')
+
+
+def rollup_samples(workout_id, resolution=DETAIL_RESOLUTION):
+    """
+    Rollup buckets of an archived workout as samples, oldest first
+    Each sits at the middle of its bucket with the bucket's mean bpm
+    """
+    half_bucket = timedelta(seconds=resolution / 2)
+    rows = db.session.query(HeartRateRollup.bucket_start, HeartRateRollup.mean_bpm)\
+        .filter(HeartRateRollup.workout_session_id == workout_id,
+                HeartRateRollup.resolution == resolution)\
+        .order_by(HeartRateRollup.bucket_start)
+
+    return [
+        HeartRateSample(None, workout_id, bucket_start + half_bucket, round(mean_bpm))
+        for bucket_start, mean_bpm in rows
+    ]
+
+
+def heart_rate_samples(workout_id, user_id):
+    """
+    A workout's heart rate as (id, workout_session_id, timestamp, bpm) rows, oldest first
+    user_id is the workout's owner - it picks the heart rate shard
+
+    Returns:
+        (samples, resolution) - resolution is 'raw', or e.g. '10s' for an archived workout
+    """
+    samples = hr_execute(user_id, db.select(*HEART_RATE_COLUMNS)
+                         .where(HeartRateData.workout_session_id == workout_id)
+                         .order_by(HeartRateData.timestamp)).all()
+
+    if samples:
+        return samples, 'raw'
+
+    rollups = rollup_samples(workout_id)
+    return (rollups, f'{DETAIL_RESOLUTION}s') if rollups else ([], 'raw')
+
+
+def compute_rollups(workout_id, readings, resolution):
+    """
+    Bucket (timestamp, bpm) readings into clock-aligned buckets
+    (10s buckets start at :00, :10, ...; 1 minute buckets on the minute)
+
+    Returns:
+        List of heart_rate_rollups row dicts
+    """
+    buckets = {}
+    for timestamp, bpm in readings:
+        offset = (timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second) % resolution
+        start = timestamp.replace(microsecond=0) - timedelta(seconds=offset)
+        bucket = buckets.get(start)
+        if bucket:
+            bucket[0] = min(bucket[0], bpm)
+            bucket[1] = max(bucket[1], bpm)
+            bucket[2] += bpm
+            bucket[3] += 1
+        else:
+            buckets[start] = [bpm, bpm, bpm, 1]
+
+    return [
+        {
+            'workout_session_id': workout_id,
+            'resolution': resolution,
+            'bucket_start': start,
+            'min_bpm': low,
+            'max_bpm': high,
+            'mean_bpm': total / count,
+            'sample_count': count
+        }
+        for start, (low, high, total, count) in sorted(buckets.items())
+    ]
+
+
+def _write_archive(path, rows):
+    """gzip CSV of the raw rows, written to a temp file and renamed into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'timestamp', 'bpm', 'created_at'])
+        for hr_id, timestamp, bpm, created_at in rows:
+            writer.writerow([hr_id, timestamp.isoformat(), bpm, created_at.isoformat() if created_at else ''])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def archive_workout(workout_id, user_id):
+    """
+    Roll up one workout, archive its raw samples to disk and delete them
+
+    Done in order, each step committed before the next, so a crash anywhere
+    loses nothing: the archive file is complete on disk, then rollups and the
+    archive record commit (with the workout noted in PENDING_DELETES_KEY), then
+    the raw samples are deleted. With shards that delete is a commit on another
+    database; if it never happens the samples just stay until
+    finish_pending_deletes() runs (every archive-heart-rate run starts with it).
+
+    Returns:
+        Number of raw samples archived
+    """
+    rows = hr_execute(user_id, db.select(HeartRateData.id, HeartRateData.timestamp,
+                                         HeartRateData.bpm, HeartRateData.created_at)
+                      .where(HeartRateData.workout_session_id == workout_id)
+                      .order_by(HeartRateData.timestamp)).all()
+
+    relative_path = os.path.join(str(user_id), f'{workout_id}.csv.gz')
+    if rows:
+        _write_archive(os.path.join(archive_dir(), relative_path), rows)
+
+    readings = [(timestamp, bpm) for _, timestamp, bpm, _ in rows]
+    rollups = []
+    for resolution in ROLLUP_RESOLUTIONS:
+        rollups.extend(compute_rollups(workout_id, readings, resolution))
+
+    # Replace any rollups left by an earlier, interrupted run
+    HeartRateRollup.query.filter_by(workout_session_id=workout_id).delete(synchronize_session=False)
+    if rollups:
+        db.session.execute(db.insert(HeartRateRollup), rollups)
+
+    db.session.add(HeartRateArchive(
+        workout_session_id=workout_id,
+        path=relative_path if rows else '',
+        sample_count=len(rows)
+    ))
+    if rows:
+        SystemSetting.set_value(PENDING_DELETES_KEY, json.dumps(_pending_deletes() + [[workout_id, user_id]]))
+    db.session.commit()
+
+    if rows:
+        delete_archived_samples(workout_id, user_id)
+
+    return len(rows)
+
+
+def _pending_deletes():
+    return json.loads(SystemSetting.get_value(PENDING_DELETES_KEY) or '[]')
+
+
+def delete_archived_samples(workout_id, user_id):
+    """
+    Delete an archived workout's raw samples, then cross it off the pending list
+    Two commits, the delete first - repeating it is harmless
+    """
+    hr_execute(user_id, db.delete(HeartRateData).where(HeartRateData.workout_session_id == workout_id))
+    db.session.commit()
+
+    SystemSetting.set_value(PENDING_DELETES_KEY, json.dumps(
+        [entry for entry in _pending_deletes() if entry[0] != workout_id]
+    ))
+    db.session.commit()
+
+
+def finish_pending_deletes():
+    """
+    Delete raw samples an earlier run archived but stopped before deleting
+
+    Returns:
+        Number of workouts cleaned up
+    """
+    pending = _pending_deletes()
+    for workout_id, user_id in pending:
+        delete_archived_samples(workout_id, user_id)
+    return len(pending)
+
+
+def workouts_to_archive(retention_days, limit=None):
+    """(workout_id, user_id) of finished workouts older than the retention window, not yet archived"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    query = db.session.query(WorkoutSession.id, WorkoutSession.user_id)\
+        .outerjoin(HeartRateArchive, HeartRateArchive.workout_session_id == WorkoutSession.id)\
+        .filter(WorkoutSession.status != 'active',
+                WorkoutSession.end_time < cutoff,
+                HeartRateArchive.workout_session_id.is_(None))\
+        .order_by(WorkoutSession.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def archived_workout_ids(user_id):
+    """Ids of the user's workouts whose raw samples were archived"""
+    return {
+        workout_id for (workout_id,) in db.session.query(HeartRateArchive.workout_session_id)
+        .join(WorkoutSession, WorkoutSession.id == HeartRateArchive.workout_session_id)
+        .filter(WorkoutSession.user_id == user_id)
+    }
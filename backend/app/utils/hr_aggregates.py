@@ -0,0 +1,188 @@
+"""
+HR Aggregates - Hourly heart rate totals per user for dashboards and trends
+Every completed workout adds its readings to heart_rate_aggregates once, so
+"average HR per week" or "time in Zone 4 this month" reads a few hundred
+small rows per year instead of every raw sample
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import WorkoutSession, HeartRateAggregate
+from app.utils.heart_rate_store import heart_rate_samples
+from app.utils.next_song import DEFAULT_MAX_HEART_RATE
+from app.utils.user_cache import load_user
+
+ZONE_FLOORS = (60, 70, 80, 90)  # % of max HR where Zones 2-5 start (same as hr_zone_for_percent)
+MAX_SAMPLE_SECONDS = 30  # A reading counts until the next one, but no longer than this
+ZONE_COLUMNS = ('zone1_seconds', 'zone2_seconds', 'zone3_seconds', 'zone4_seconds', 'zone5_seconds')
+
+PERIODS = ('day', 'week', 'month')
+
+
+def bucket_readings(readings, max_hr):
+    """
+    Hourly totals of (timestamp, bpm) readings in time order
+
+    Returns:
+        {hour_start: [count, bpm_sum, min_bpm, max_bpm, zone1_s, ..., zone5_s]}
+    """
+    buckets = {}
+    gap = 0
+    last = len(readings) - 1
+
+    for i, (timestamp, bpm) in enumerate(readings):
+        if i < last:
+            gap = min((readings[i + 1][0] - timestamp).total_seconds(), MAX_SAMPLE_SECONDS)
+        # The last reading counts as long as the one before it
+
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        bucket = buckets.get(hour)
+        if bucket is None:
+            bucket = buckets[hour] = [0, 0, bpm, bpm, 0, 0, 0, 0, 0]
+
+        bucket[0] += 1
+        bucket[1] += bpm
+        if bpm < bucket[2]:
+            bucket[2] = bpm
+        if bpm > bucket[3]:
+            bucket[3] = bpm
+        bucket[4 + bisect_right(ZONE_FLOORS, bpm * 100 / max_hr)] += gap
+
+    return buckets
+
+
+def add_to_aggregates(user_id, buckets):
+    """Merge hourly totals into the user's aggregate rows (caller commits)"""
+    if not buckets:
+        return
+
+    existing = {
+        row.bucket_start: row for row in HeartRateAggregate.query.filter(
+            HeartRateAggregate.user_id == user_id,
+            HeartRateAggregate.bucket_start.in_(list(buckets))
+        )
+    }
+
+    for hour, (count, bpm_sum, low, high, *zones) in buckets.items():
+        row = existing.get(hour)
+        if row is None:
+            row = HeartRateAggregate(user_id=user_id, bucket_start=hour, sample_count=0, bpm_sum=0,
+                                     **{column: 0 for column in ZONE_COLUMNS})
+            db.session.add(row)
+        row.sample_count += count
+        row.bpm_sum += bpm_sum
+        row.min_bpm = low if row.min_bpm is None else min(row.min_bpm, low)
+        row.max_bpm = high if row.max_bpm is None else max(row.max_bpm, high)
+        for column, seconds in zip(ZONE_COLUMNS, zones):
+            setattr(row, column, getattr(row, column) + round(seconds))
+
+
+def max_heart_rate_for(user_id):
+    user = load_user(user_id)
+    return (user.calculate_max_heart_rate() if user else None) or DEFAULT_MAX_HEART_RATE
+
+
+def record_workout(workout_id, user_id, readings=None):
+    """
+    Add one finished workout to the aggregates (caller commits)
+    Call exactly once per workout - when it completes or is imported
+
+    Args:
+        readings: (timestamp, bpm) pairs in time order, loaded if not given
+    """
+    if readings is None:
+        samples, _ = heart_rate_samples(workout_id, user_id)
+        readings = [(sample.timestamp, sample.bpm) for sample in samples]
+    add_to_aggregates(user_id, bucket_readings(readings, max_heart_rate_for(user_id)))
+
+
+def rebuild_user_aggregates(user_id):
+    """Recompute a user's aggregates from all finished workouts (e.g. after an age change)"""
+    HeartRateAggregate.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+    workout_ids = [
+        workout_id for (workout_id,) in db.session.query(WorkoutSession.id)
+        .filter(WorkoutSession.user_id == user_id, WorkoutSession.status != 'active')
+        .order_by(WorkoutSession.id)
+    ]
+    for workout_id in workout_ids:
+        record_workout(workout_id, user_id)
+        db.session.flush()  # Later workouts in the same hour merge into these rows
+
+    db.session.commit()
+    return len(workout_ids)
+
+
+def _load_rows(user_id, since):
+    query = db.session.query(
+        HeartRateAggregate.bucket_start, HeartRateAggregate.sample_count, HeartRateAggregate.bpm_sum,
+        HeartRateAggregate.min_bpm, HeartRateAggregate.max_bpm,
+        *(getattr(HeartRateAggregate, column) for column in ZONE_COLUMNS)
+    ).filter(HeartRateAggregate.user_id == user_id, HeartRateAggregate.bucket_start >= since)
+    return query.order_by(HeartRateAggregate.bucket_start).all()
+
+
+def _summarize(rows):
+    """Totals of aggregate rows -> API dict"""
+    count = sum(row[1] for row in rows)
+    zones = [sum(row[5 + z] for row in rows) for z in range(len(ZONE_COLUMNS))]
+    return {
+        'avg_heart_rate': round(sum(row[2] for row in rows) / count, 1) if count else None,
+        'min_heart_rate': min((row[3] for row in rows), default=None),
+        'max_heart_rate': max((row[4] for row in rows), default=None),
+        'active_minutes': round(sum(zones) / 60, 1),
+        'time_in_zone_minutes': {f'Zone {z + 1}': round(seconds / 60, 1) for z, seconds in enumerate(zones)},
+        'samples': count
+    }
+
+
+def dashboard(user_id, days=30):
+    """Heart rate summary of the last `days` days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    summary = _summarize(_load_rows(user_id, since.replace(minute=0, second=0, microsecond=0)))
+    summary['workouts'] = WorkoutSession.query.filter(
+        WorkoutSession.user_id == user_id,
+        WorkoutSession.status != 'active',
+        WorkoutSession.start_time >= since
+    ).count()
+    summary['days'] = days
+    return summary
+
+
+def period_start(moment, period):
+    """Start of the day / week (Monday) / month containing `moment`"""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _previous_period(start, period):
+    if period == 'week':
+        return start - timedelta(weeks=1)
+    if period == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - timedelta(days=1)
+
+
+def trends(user_id, period='week', count=12):
+    """
+    Per-period heart rate summaries for the last `count` days/weeks/months,
+    oldest first (periods without workouts are included with zero minutes)
+    """
+    starts = [period_start(datetime.utcnow(), period)]
+    for _ in range(count - 1):
+        starts.append(_previous_period(starts[-1], period))
+    starts.reverse()
+
+    grouped = {start: [] for start in starts}
+    for row in _load_rows(user_id, starts[0]):
+        rows = grouped.get(period_start(row[0], period))
+        if rows is not None:  # Skips readings timestamped in the future
+            rows.append(row)
+
+    return [{'period_start': start.date().isoformat(), **_summarize(grouped[start])} for start in starts]
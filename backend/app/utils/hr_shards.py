@@ -0,0 +1,83 @@
+"""
+Heart Rate Shards - Spreads heart_rate_data over several databases by user
+
+Every reading from every athlete lands in one heart_rate_data table: one
+B-tree and, under SQLite, one file lock that all ingest requests queue on.
+With HR_SHARD_URLS set, a user's samples live in shard user_id % N instead -
+separate SQLite files (each with its own write lock and WAL) or separate
+databases - so athletes on different shards write in parallel. All of a
+user's samples stay on one shard, so per-workout and per-user reads still
+hit a single database.
+
+Anything touching heart_rate_data goes through hr_execute() /
+hr_connection() with the owner's user id, inside the normal db.session
+transaction. Without shards they run on the main database exactly as before.
+With shards that transaction spans two databases and db.session.commit()
+commits them one after the other, not atomically - a crash in between keeps
+one side only. Code writing to both orders its commits so either outcome
+can be retried (see archive_workout()).
+Shards only hold heart_rate_data, without the foreign key to
+workout_sessions (that table stays in the main database, which then has no
+heart_rate_data table), and deleting a workout deletes its samples on the
+shard. The shard count is fixed once there's data - changing it means
+moving samples.
+"""
+
+from flask import current_app
+
+from app import db
+from app.models import HeartRateData
+from app.utils.sqlite_mode import register_sqlite_mode
+
+SHARD_BIND_PREFIX = 'hr_shard'
+
+
+def shard_count():
+    return len(current_app.config['HR_SHARD_URLS'])
+
+
+def shard_engines():
+    """Every shard's engine, in shard order"""
+    return [db.engines[f'{SHARD_BIND_PREFIX}{i}'] for i in range(shard_count())]
+
+
+def shard_engine(user_id):
+    """Engine holding this user's heart rate samples (None = the main database)"""
+    count = shard_count()
+    if not count:
+        return None
+    return db.engines[f'{SHARD_BIND_PREFIX}{user_id % count}']
+
+
+def hr_connection(user_id):
+    """The session's connection to this user's shard, for bulk inserts"""
+    engine = shard_engine(user_id)
+    return db.session.connection(bind_arguments={'bind': engine} if engine is not None else None)
+
+
+def hr_execute(user_id, statement, params=None):
+    """Run a statement against this user's heart_rate_data, in the session's transaction"""
+    if shard_engine(user_id) is None:
+        return db.session.execute(statement, params)
+    # Straight on the shard's connection - ORM bulk INSERT/DELETE pick their
+    # connection from the mapper and would ignore a bind argument
+    return hr_connection(user_id).execute(statement, params)
+
+
+def create_shard_tables():
+    """Create heart_rate_data (and its indexes) on every shard that doesn't have it"""
+    metadata = db.MetaData()
+    db.Table(HeartRateData.__tablename__, metadata, *(
+        db.Column(column.name, column.type, primary_key=column.primary_key,
+                  nullable=column.nullable, index=column.index)
+        for column in HeartRateData.__table__.columns
+    ))
+    for engine in shard_engines():
+        metadata.create_all(engine)
+
+
+def register_hr_shards(app):
+    """File-backed SQLite shards get the same WAL mode and pragmas as the main database"""
+    with app.app_context():
+        for i, engine in enumerate(shard_engines()):
+            register_sqlite_mode(app, engine, f'{SHARD_BIND_PREFIX}{i}')
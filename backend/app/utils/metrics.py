@@ -0,0 +1,219 @@
+"""
+Request Metrics - Latency, status and SQL counts per endpoint, served at /metrics
+Recorded by before/after request hooks plus SQLAlchemy engine events and
+rendered in the Prometheus text format. Everything is in-process memory
+guarded by one lock, so the cost per request is a few dict updates.
+
+Streamed responses (export, big workout details) are recorded once the body
+has been sent, so their latency and SQL include the rows the generator read.
+
+Each gunicorn worker keeps its own numbers - scrape the workers directly
+(or sum across them) rather than through the load balancer.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)  # SQL statements per request
+
+# Where a request's RequestTimer lives. Not on g: a streamed body runs in a
+# fresh app context (and g) but still sees the same request.
+_TIMER_KEY = 'metrics.request_timer'
+
+
+class Histogram:
+    """Prometheus-style histogram for one label set"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """All counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.collectors = []  # Callables returning extra exposition lines (e.g. sqlite_mode)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}  # (endpoint, method) -> Histogram of seconds
+            self.queries = {}  # (endpoint, method) -> Histogram of SQL statements per request
+            self.db_seconds = {}  # (endpoint, method) -> total seconds spent in SQL
+            self.statuses = {}  # (endpoint, method, status) -> requests
+            self.db_lock_errors = 0  # Statements that failed waiting on a database lock
+
+    def record(self, endpoint, method, status, seconds, query_count, db_seconds):
+        key = (endpoint, method)
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+                self.db_seconds[key] = 0.0
+            histogram.observe(seconds)
+            self.queries[key].observe(query_count)
+            self.db_seconds[key] += db_seconds
+            status_key = (endpoint, method, status)
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def add_collector(self, collect):
+        """Append collect()'s lines to every /metrics render"""
+        self.collectors.append(collect)
+
+    def record_lock_error(self):
+        with self._lock:
+            self.db_lock_errors += 1
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP http_request_duration_seconds Time to build the response, by endpoint',
+                '# TYPE http_request_duration_seconds histogram'
+            ]
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                lines += histogram.render('http_request_duration_seconds',
+                                          f'endpoint="{_label(endpoint)}",method="{method}"')
+
+            lines += ['# HELP http_requests_total Requests by endpoint and status code',
+                      '# TYPE http_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.statuses.items()):
+                lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {count}')
+
+            lines += ['# HELP http_request_db_queries SQL statements run per request',
+                      '# TYPE http_request_db_queries histogram']
+            for (endpoint, method), histogram in sorted(self.queries.items()):
+                lines += histogram.render('http_request_db_queries',
+                                          f'endpoint="{_label(endpoint)}",method="{method}"')
+
+            lines += ['# HELP http_request_db_seconds_total Time spent in SQL statements',
+                      '# TYPE http_request_db_seconds_total counter']
+            for (endpoint, method), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{{endpoint="{_label(endpoint)}",'
+                             f'method="{method}"}} {seconds:.6f}')
+
+            lines += ['# HELP db_lock_errors_total Statements that failed on a database lock',
+                      '# TYPE db_lock_errors_total counter',
+                      f'db_lock_errors_total {self.db_lock_errors}']
+
+        for collect in self.collectors:
+            lines += collect()
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry for the whole process
+request_metrics = RequestMetrics()
+
+
+class RequestTimer:
+    """Start time and SQL totals of one request"""
+    __slots__ = ('started', 'sql_queries', 'sql_seconds', 'sql_started', 'recorded')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.sql_started = None
+        self.recorded = False
+
+
+def _request_timer():
+    return request.environ.get(_TIMER_KEY) if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _request_timer()
+    if timer is not None:
+        timer.sql_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _request_timer()
+    if timer is not None and timer.sql_started is not None:
+        timer.sql_queries += 1
+        timer.sql_seconds += time.perf_counter() - timer.sql_started
+        timer.sql_started = None
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # SQLite "database is locked", PostgreSQL deadlocks and lock timeouts
+    message = str(context.original_exception).lower()
+    if 'locked' in message or 'deadlock' in message or 'lock timeout' in message:
+        request_metrics.record_lock_error()
+
+
+def register_metrics(app):
+    """Time every request and serve the numbers at /metrics"""
+
+    @app.before_request
+    def start_request_timer():
+        request.environ[_TIMER_KEY] = RequestTimer()
+
+    def finish(timer, endpoint, method, status):
+        if timer is None or timer.recorded:
+            return
+        timer.recorded = True
+        request_metrics.record(
+            endpoint or 'unmatched',  # 404s share one label instead of one per URL
+            method,
+            status,
+            time.perf_counter() - timer.started,
+            timer.sql_queries,
+            timer.sql_seconds
+        )
+
+    @app.after_request
+    def record_request(response):
+        timer = _request_timer()
+        if response.is_streamed:
+            # The body hasn't been generated yet - record once it's been sent
+            endpoint, method, status = request.endpoint, request.method, response.status_code
+            response.call_on_close(lambda: finish(timer, endpoint, method, status))
+        else:
+            finish(timer, request.endpoint, request.method, response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # Unhandled exceptions skip after_request
+        if exc is not None:
+            finish(_request_timer(), request.endpoint, request.method, 500)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
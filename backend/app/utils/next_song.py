@@ -0,0 +1,251 @@
+"""
+Next Song Picker - Chooses the next track from the live heart rate
+Compares where the heart rate is heading with the workout profile's target zone
+and picks a song whose zone and tempo push it in the right direction
+"""
+
+import threading
+from bisect import bisect_left
+
+from app import db
+from app.models import HeartRateData, SongPlay, Song
+from app.models.workout_profile import WorkoutProfile
+from app.utils.hr_shards import hr_execute
+from app.utils.user_cache import load_user
+
+ZONES = ['Zone 1', 'Zone 2', 'Zone 3', 'Zone 4', 'Zone 5']
+
+DEFAULT_MAX_HEART_RATE = 190  # 220 - 30, used until the user sets their age
+DEFAULT_TARGET_ZONE = (70, 80)  # Aerobic zone, used when the workout has no profile
+
+TREND_SAMPLES = 6  # Most recent HR readings used for the trend (~1 minute)
+LOOKAHEAD_MINUTES = 1.0  # How far ahead the trend is projected
+ZONE_SHIFT_GAP = 5  # % of max HR outside the target before we jump a whole song zone
+RECENT_PLAYS_EXCLUDED = 20  # Recently played songs that won't be picked again
+
+
+class ZoneSongIndex:
+    """
+    Per-zone song lists sorted by tempo, then highest hype_score first
+    Finding the song closest to a target tempo is a bisect + short scan
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zones = {}  # zone -> (tempos, entries) where entries are (tempo, -hype, song_id)
+        self.built = False
+
+    def build_from_db(self):
+        rows = db.session.query(Song.id, Song.auto_category_zone, Song.tempo, Song.hype_score)\
+            .filter(Song.auto_category_zone.isnot(None), Song.tempo.isnot(None))\
+            .all()
+
+        buckets = {zone: [] for zone in ZONES}
+        for song_id, zone, tempo, hype in rows:
+            if zone in buckets:
+                buckets[zone].append((tempo, -(hype or 0), song_id))
+
+        zones = {}
+        for zone, entries in buckets.items():
+            entries.sort()
+            zones[zone] = ([e[0] for e in entries], entries)
+
+        with self._lock:
+            self._zones = zones
+            self.built = True
+
+    def ensure_built(self):
+        if not self.built:
+            self.build_from_db()
+
+    def add(self, song):
+        """Insert a newly categorized song (keeps the zone list sorted)"""
+        if not self.built or song.auto_category_zone not in ZONES or song.tempo is None:
+            return
+
+        entry = (song.tempo, -(song.hype_score or 0), song.id)
+        with self._lock:
+            tempos, entries = self._zones[song.auto_category_zone]
+            # Copy-on-write so readers never see a half-updated list
+            entries = list(entries)
+            pos = bisect_left(entries, entry)
+            entries.insert(pos, entry)
+            self._zones[song.auto_category_zone] = ([e[0] for e in entries], entries)
+
+    def closest(self, zone, tempo, exclude=()):
+        """
+        Song in `zone` whose tempo is closest to `tempo`, skipping excluded ids
+        Among equal tempos the higher hype score wins
+
+        Returns:
+            (song_id, tempo) or None if the zone has no eligible songs
+        """
+        tempos, entries = self._zones.get(zone, ([], []))
+        if not entries:
+            return None
+
+        # Walk outwards from the insertion point; only excluded songs are skipped
+        right = bisect_left(tempos, tempo)
+        left = right - 1
+        while left >= 0 or right < len(entries):
+            left_gap = tempo - tempos[left] if left >= 0 else None
+            right_gap = tempos[right] - tempo if right < len(entries) else None
+
+            if right_gap is None or (left_gap is not None and left_gap < right_gap):
+                candidate, left = entries[left], left - 1
+            else:
+                candidate, right = entries[right], right + 1
+
+            if candidate[2] not in exclude:
+                return candidate[2], candidate[0]
+
+        return None
+
+
+# Shared index for the whole process
+zone_song_index = ZoneSongIndex()
+
+
+def hr_zone_for_percent(percent):
+    """Heart rate zone (by % of max HR) from RESEARCH_FINDINGS.md"""
+    if percent >= 90:
+        return 'Zone 5'
+    elif percent >= 80:
+        return 'Zone 4'
+    elif percent >= 70:
+        return 'Zone 3'
+    elif percent >= 60:
+        return 'Zone 2'
+    return 'Zone 1'
+
+
+def tempo_for_intensity(percent):
+    """Song tempo matching an intensity (% of max HR): 50% -> 90 BPM, 100% -> 180 BPM"""
+    return 90 + (percent - 50) * 1.8
+
+
+def heart_rate_trend(samples):
+    """
+    Least-squares slope of HR readings in BPM per minute
+    samples are (timestamp, bpm) pairs in time order
+    """
+    if len(samples) < 2:
+        return 0.0
+
+    t0 = samples[0][0]
+    xs = [(ts - t0).total_seconds() / 60 for ts, _ in samples]
+    ys = [bpm for _, bpm in samples]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    denom = sum((x - x_mean) ** 2 for x in xs)
+    if denom == 0:
+        return 0.0
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / denom
+
+
+def find_workout_profile(workout):
+    """The user's own profile with the workout's profile name, else the matching preset"""
+    if not workout.workout_profile_name:
+        return None
+
+    candidates = WorkoutProfile.query.filter(
+        WorkoutProfile.name == workout.workout_profile_name,
+        db.or_(WorkoutProfile.user_id == workout.user_id, WorkoutProfile.is_preset == True)
+    ).all()
+
+    for profile in candidates:
+        if profile.user_id == workout.user_id:
+            return profile
+    return candidates[0] if candidates else None
+
+
+def pick_next_song(workout):
+    """
+    Pick the best next song for an active workout
+
+    Projects the heart rate one minute ahead from the recent trend, measures the
+    gap to the profile's target zone, and picks a song from the zone that closes
+    that gap with a tempo scaled to the intensity we want.
+
+    Returns:
+        dict with the chosen song and the numbers behind the choice
+    """
+    samples = hr_execute(workout.user_id, db.select(HeartRateData.timestamp, HeartRateData.bpm)
+                         .where(HeartRateData.workout_session_id == workout.id)
+                         .order_by(HeartRateData.timestamp.desc())
+                         .limit(TREND_SAMPLES)).all()
+
+    if not samples:
+        return {'error': 'No heart rate data yet for this workout'}
+
+    samples = list(reversed(samples))
+    current_bpm = samples[-1][1]
+    trend = heart_rate_trend(samples)
+    projected_bpm = current_bpm + trend * LOOKAHEAD_MINUTES
+
+    user = load_user(workout.user_id)
+    max_hr = (user.calculate_max_heart_rate() if user else None) or DEFAULT_MAX_HEART_RATE
+
+    profile = find_workout_profile(workout)
+    if profile and profile.target_zone_min and profile.target_zone_max:
+        zone_min, zone_max = profile.target_zone_min, profile.target_zone_max
+    else:
+        zone_min, zone_max = DEFAULT_TARGET_ZONE
+
+    projected_percent = projected_bpm / max_hr * 100
+    target_percent = (zone_min + zone_max) / 2
+
+    # Positive gap = heart rate is heading below the target, we need more hype
+    if projected_percent < zone_min:
+        gap = zone_min - projected_percent
+    elif projected_percent > zone_max:
+        gap = zone_max - projected_percent
+    else:
+        gap = 0.0
+
+    zone_number = ZONES.index(hr_zone_for_percent(target_percent))
+    if gap > ZONE_SHIFT_GAP:
+        zone_number = min(zone_number + 1, len(ZONES) - 1)
+    elif gap < -ZONE_SHIFT_GAP:
+        zone_number = max(zone_number - 1, 0)
+    desired_zone = ZONES[zone_number]
+
+    # Song tempo follows intensity, overshooting in the direction of the gap
+    desired_tempo = tempo_for_intensity(target_percent + gap)
+
+    recent = db.session.query(SongPlay.song_id)\
+        .filter(SongPlay.workout_session_id == workout.id)\
+        .order_by(SongPlay.start_time.desc())\
+        .limit(RECENT_PLAYS_EXCLUDED)\
+        .all()
+    exclude = {song_id for (song_id,) in recent}
+
+    zone_song_index.ensure_built()
+
+    # Fall back to neighbouring zones if the desired one is exhausted
+    choice = None
+    chosen_zone = desired_zone
+    for offset in (0, -1, 1, -2, 2):
+        index = zone_number + offset
+        if 0 <= index < len(ZONES):
+            choice = zone_song_index.closest(ZONES[index], desired_tempo, exclude)
+            if choice:
+                chosen_zone = ZONES[index]
+                break
+
+    if not choice:
+        return {'error': 'No songs with audio features in the library'}
+
+    song = db.session.get(Song, choice[0])
+
+    return {
+        'song': song.to_dict() if song else None,
+        'song_zone': chosen_zone,
+        'current_bpm': current_bpm,
+        'bpm_trend_per_min': round(trend, 1),
+        'projected_bpm': round(projected_bpm),
+        'target_bpm_range': [round(max_hr * zone_min / 100), round(max_hr * zone_max / 100)],
+        'target_gap_percent': round(gap, 1),
+        'desired_tempo': round(desired_tempo, 1),
+        'profile_name': profile.name if profile else None
+    }
@@ -0,0 +1,76 @@
+"""
+Password Hashing - bcrypt work on a small dedicated thread pool
+bcrypt releases the GIL, so running it on a bounded pool keeps login spikes
+from eating every CPU core while other request threads (like HR ingest) keep going
+
+The caller's thread still waits for its hash - that only helps when a worker
+has other threads to serve with: gthread workers (gunicorn.conf.py) or the
+ASGI entry point's sync thread pool, not gunicorn's default sync workers.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify jobs are already queued"""
+
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+def _pool():
+    """Create the pool on first use, sized from the app config"""
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                config = current_app.config
+                _slots = threading.BoundedSemaphore(config['BCRYPT_MAX_PENDING'])
+                _executor = ThreadPoolExecutor(
+                    max_workers=config['BCRYPT_POOL_SIZE'],
+                    thread_name_prefix='bcrypt'
+                )
+    return _executor
+
+
+def _run(fn, *args):
+    """Run fn on the bcrypt pool and wait for the result"""
+    executor = _pool()
+    timeout = current_app.config['BCRYPT_QUEUE_TIMEOUT']
+    if not _slots.acquire(timeout=timeout):
+        raise PasswordHasherBusy()
+    try:
+        return executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of password using the configured cost factor"""
+    rounds = rounds or current_app.config['BCRYPT_LOG_ROUNDS']
+    password_bytes = password.encode('utf-8')
+    return _run(lambda: bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds)).decode('utf-8'))
+
+
+def verify_password(password, password_hash):
+    """True if password matches the bcrypt hash"""
+    return _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_rounds(password_hash):
+    """Cost factor stored in a bcrypt hash ($2b$12$... -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a different cost than the current config"""
+    return hash_rounds(password_hash) != current_app.config['BCRYPT_LOG_ROUNDS']
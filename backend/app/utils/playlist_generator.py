@@ -0,0 +1,232 @@
+"""
+Playlist Generator - Builds a whole workout playlist that follows an intensity curve
+Warmup -> peak -> cooldown, with smooth tempo changes between songs
+"""
+
+from bisect import bisect_left
+
+from app import db
+from app.models import Song, SongStats
+from app.utils.next_song import tempo_for_intensity
+
+BEAM_WIDTH = 24  # Partial playlists kept after each step
+CANDIDATES_PER_STEP = 24  # Songs tried per partial playlist (closest to the target tempo)
+JUMP_CANDIDATES = 8  # Extra songs tried closest to the previous song's tempo
+TYPICAL_SONG_MS = 210000  # Used to look up the curve before a song is chosen
+
+TEMPO_SCALE = 10.0  # BPM off target that costs as much as...
+HYPE_SCALE = 10.0  # ...this many hype points off target
+JUMP_WEIGHT = 1.5  # How much a tempo jump between songs costs relative to fit
+PERSONAL_WEIGHT = 0.5  # Bonus per 10 points of the user's own hype/cooldown score
+OVERSHOOT_WEIGHT = 4.0  # Cost per minute the last song runs past the duration, squared
+CURVE_RESOLUTION = 1000  # Curve targets are precomputed at this many points
+MAX_PLAYLIST_SONGS = 200  # Beam steps cap, whatever the shortest song in the catalog
+
+
+def hype_for_intensity(percent):
+    """Song hype score matching an intensity (% of max HR): Zone 2 (60%) -> 35 ... Zone 5 (90%) -> 80"""
+    return 35 + (percent - 60) * 1.5
+
+
+def default_curve(profile):
+    """
+    Warmup -> peak -> cooldown curve for a workout profile
+    Points are (fraction of duration, % of max HR)
+    """
+    zone_min = profile.target_zone_min or 70
+    zone_max = profile.target_zone_max or 80
+    mid = (zone_min + zone_max) / 2
+    return [
+        (0.0, 60),
+        (0.15, zone_min),
+        (0.5, mid),
+        (0.7, zone_max),
+        (0.85, mid),
+        (1.0, 55)
+    ]
+
+
+def curve_value(curve, fraction):
+    """Linear interpolation of the curve at a fraction of the workout"""
+    if fraction <= curve[0][0]:
+        return curve[0][1]
+    for (x0, y0), (x1, y1) in zip(curve, curve[1:]):
+        if fraction <= x1:
+            if x1 == x0:
+                return y1
+            return y0 + (y1 - y0) * (fraction - x0) / (x1 - x0)
+    return curve[-1][1]
+
+
+def load_candidate_pool(user_id):
+    """
+    Songs with everything needed for planning, sorted by tempo
+    Each entry: (tempo, song_id, hype_score, duration_ms, personal_hype, personal_cooldown)
+    """
+    personal = {
+        song_id: (hype or 0, cooldown or 0)
+        for song_id, hype, cooldown in db.session.query(
+            SongStats.song_id, SongStats.personal_hype_score, SongStats.personal_cooldown_score
+        ).filter(SongStats.user_id == user_id)
+    }
+
+    rows = db.session.query(Song.tempo, Song.id, Song.hype_score, Song.duration_ms)\
+        .filter(Song.tempo.isnot(None), Song.hype_score.isnot(None), Song.duration_ms > 0)\
+        .all()
+
+    pool = [
+        (tempo, song_id, hype, duration_ms) + personal.get(song_id, (0, 0))
+        for tempo, song_id, hype, duration_ms in rows
+    ]
+    pool.sort()
+    return pool
+
+
+def _nearest_by_tempo(pool, tempos, tempo, count, used):
+    """Indexes of up to `count` unused songs closest to `tempo`"""
+    found = []
+    right = bisect_left(tempos, tempo)
+    left = right - 1
+    while len(found) < count and (left >= 0 or right < len(pool)):
+        if right >= len(pool) or (left >= 0 and tempo - tempos[left] < tempos[right] - tempo):
+            index, left = left, left - 1
+        else:
+            index, right = right, right + 1
+        if index not in used:
+            found.append(index)
+    return found
+
+
+def plan_playlist(pool, duration_ms, curve):
+    """
+    Beam search for the song order that best follows the curve
+
+    Each step extends every kept partial playlist by one song, scores it on
+    how well its tempo and hype fit the curve at that point, how far its tempo
+    jumps from the previous song, and how the user personally responds to it,
+    then keeps the BEAM_WIDTH cheapest.
+
+    Returns:
+        List of pool indexes in play order
+    """
+    if not pool:
+        return []
+
+    tempos = [entry[0] for entry in pool]
+    shortest = min(entry[3] for entry in pool)
+    # Every step adds a song not used yet, so the pool size bounds it too
+    max_steps = min(duration_ms // shortest + 1, len(pool), MAX_PLAYLIST_SONGS)
+
+    # Targets along the curve, looked up instead of interpolated per candidate:
+    # (tempo, hype, rising) where rising means the curve is not heading down yet
+    intensities = [curve_value(curve, i / CURVE_RESOLUTION) for i in range(CURVE_RESOLUTION + 1)]
+    look_ahead = CURVE_RESOLUTION // 20
+    targets = [
+        (tempo_for_intensity(value), hype_for_intensity(value),
+         intensities[min(i + look_ahead, CURVE_RESOLUTION)] >= value)
+        for i, value in enumerate(intensities)
+    ]
+
+    def target_at(ms):
+        return targets[min(int(ms / duration_ms * CURVE_RESOLUTION), CURVE_RESOLUTION)]
+
+    # State: (cost, elapsed_ms, path) - path is a tuple of pool indexes
+    beam = [(0.0, 0, ())]
+    finished = []
+
+    for _ in range(max_steps):
+        if not beam:
+            break
+
+        expanded = []
+        for cost, elapsed, path in beam:
+            used = set(path)
+            last_tempo = pool[path[-1]][0] if path else None
+
+            # Songs near the tempo the curve wants next, plus songs near the
+            # previous tempo so smooth transitions are always on the table
+            target_tempo = target_at(elapsed + TYPICAL_SONG_MS / 2)[0]
+            candidates = set(_nearest_by_tempo(pool, tempos, target_tempo, CANDIDATES_PER_STEP, used))
+            if last_tempo is not None:
+                candidates.update(_nearest_by_tempo(pool, tempos, last_tempo, JUMP_CANDIDATES, used))
+
+            for index in candidates:
+                tempo, _, hype, song_ms, personal_hype, personal_cooldown = pool[index]
+
+                wanted_tempo, wanted_hype, rising = target_at(elapsed + song_ms / 2)
+
+                step_cost = ((tempo - wanted_tempo) / TEMPO_SCALE) ** 2
+                step_cost += ((hype - wanted_hype) / HYPE_SCALE) ** 2
+                if last_tempo is not None:
+                    step_cost += JUMP_WEIGHT * ((tempo - last_tempo) / TEMPO_SCALE) ** 2
+                step_cost -= PERSONAL_WEIGHT * (personal_hype if rising else personal_cooldown) / 10
+
+                new_elapsed = elapsed + song_ms
+                new_state = (cost + step_cost, new_elapsed, path + (index,))
+
+                if new_elapsed >= duration_ms:
+                    overshoot = (new_elapsed - duration_ms) / 60000
+                    finished.append((new_state[0] + OVERSHOOT_WEIGHT * overshoot ** 2,) + new_state[1:])
+                else:
+                    expanded.append(new_state)
+
+        if not expanded and not finished:
+            break  # Pool exhausted - keep the longest partial playlists
+
+        expanded.sort(key=lambda state: state[0])
+        beam = expanded[:BEAM_WIDTH]
+
+    if not finished:
+        # Ran out of songs before filling the duration - use the longest playlist we have
+        finished = beam
+
+    return list(min(finished, key=lambda state: state[0])[2]) if finished else []
+
+
+def generate_playlist(user_id, profile, duration_minutes, curve=None):
+    """
+    Generate a playlist for a workout profile that follows an intensity curve
+
+    Args:
+        user_id: User the playlist is for (their SongStats bias the picks)
+        profile: WorkoutProfile whose target zone shapes the default curve
+        duration_minutes: Length of the workout
+        curve: Optional list of (fraction of duration, % of max HR) points
+
+    Returns:
+        dict with the ordered songs and a summary
+    """
+    curve = sorted(curve) if curve else default_curve(profile)
+    duration_ms = int(duration_minutes * 60000)
+
+    pool = load_candidate_pool(user_id)
+    order = plan_playlist(pool, duration_ms, curve)
+
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_([pool[i][1] for i in order])).all()}
+
+    playlist = []
+    elapsed = 0
+    previous_tempo = None
+    max_jump = 0
+    for index in order:
+        tempo, song_id, _, song_ms, _, _ = pool[index]
+        if previous_tempo is not None:
+            max_jump = max(max_jump, abs(tempo - previous_tempo))
+        playlist.append({
+            'position': len(playlist) + 1,
+            'start_offset_seconds': elapsed // 1000,
+            'target_intensity': round(curve_value(curve, (elapsed + song_ms / 2) / duration_ms), 1),
+            'song': songs[song_id].to_dict() if song_id in songs else None
+        })
+        elapsed += song_ms
+        previous_tempo = tempo
+
+    return {
+        'profile_id': profile.id,
+        'duration_minutes': duration_minutes,
+        'curve': [list(point) for point in curve],
+        'songs': playlist,
+        'count': len(playlist),
+        'total_duration_seconds': elapsed // 1000,
+        'max_tempo_jump': round(max_jump, 1)
+    }
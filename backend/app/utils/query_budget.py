@@ -0,0 +1,118 @@
+"""
+Query Budgets - Catch N+1 queries before they reach production
+Views declare how many SQL statements one request may run:
+
+    @bp.route('/friends', methods=['GET'])
+    @query_budget(2)
+    @jwt_required()
+    def get_friends(): ...
+
+With QUERY_BUDGET_CHECKS set to 'warn' or 'raise', every request records the
+shape of each statement it runs (SQL text with IN lists collapsed). A request
+is a violation when it goes over its view's budget, or when one statement
+shape runs N_PLUS_ONE_THRESHOLD times or more - the signature of a query per
+row. 'warn' logs violations, 'raise' fails the request with
+QueryBudgetExceeded (what benchmarks/check_query_budgets.py runs in CI).
+Off by default, so production pays nothing.
+
+Statements run while a streamed body is generated happen after the check and
+aren't counted against the budget.
+"""
+
+import re
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CHECK_MODES = ('off', 'warn', 'raise')
+
+# "IN (?, ?, ?)" / "IN (%(id_1_1)s, %(id_1_2)s)" -> "IN (?)" so list length doesn't change the shape
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL than its view allows, or the same statement over and over"""
+
+
+def query_budget(max_queries, allow_repeats=False):
+    """
+    Declare the most SQL statements one request to this view may run
+
+    Args:
+        max_queries: Statement budget per request
+        allow_repeats: True for views that repeat a statement by design
+                       (e.g. one insert per imported file)
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        view.query_budget_allow_repeats = allow_repeats
+        return view
+    return decorator
+
+
+def statement_shape(statement):
+    """SQL text with whitespace normalized and IN lists collapsed"""
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_shapes' in g:
+        g.query_shapes[statement_shape(statement)] += 1
+
+
+def check_request(endpoint, shapes):
+    """
+    Problems with one request's statements
+
+    Returns:
+        List of human readable problems (empty when within budget)
+    """
+    view = current_app.view_functions.get(endpoint)
+    budget = getattr(view, 'query_budget', None)
+    threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+    problems = []
+
+    total = sum(shapes.values())
+    if budget is not None and total > budget:
+        problems.append(f'{total} queries, budget is {budget}')
+
+    if not getattr(view, 'query_budget_allow_repeats', False):
+        for shape, count in shapes.most_common():
+            if count < threshold:
+                break
+            problems.append(f'same statement ran {count} times (N+1?): {shape[:200]}')
+
+    return problems
+
+
+def register_query_budgets(app):
+    """Check each request against its view's budget when QUERY_BUDGET_CHECKS is on"""
+    mode = app.config['QUERY_BUDGET_CHECKS']
+    if mode not in CHECK_MODES:
+        raise ValueError(f'QUERY_BUDGET_CHECKS must be one of {", ".join(CHECK_MODES)}')
+    if mode == 'off':
+        return
+
+    @app.before_request
+    def start_query_recording():
+        g.query_shapes = Counter()
+
+    @app.after_request
+    def check_query_budget(response):
+        shapes = g.pop('query_shapes', None)
+        if shapes is None or request.endpoint is None:
+            return response
+
+        problems = check_request(request.endpoint, shapes)
+        if not problems:
+            return response
+
+        message = f'{request.method} {request.path} ({request.endpoint}): ' + '; '.join(problems)
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        app.logger.warning('Query budget: %s', message)
+        return response
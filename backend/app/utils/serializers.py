@@ -0,0 +1,128 @@
+"""
+Row Serializers - Build API dicts straight from column tuples
+Same shapes as the models' to_dict(), but without loading ORM objects,
+lazy relationships or a query per row. Query with the *_COLUMNS tuples and
+pass each result row to the matching function.
+"""
+
+from app.models import WorkoutSession, HeartRateData, SongPlay, Song
+from app.utils.fast_json import isoformat
+
+SONG_COLUMNS = (
+    Song.id, Song.spotify_id, Song.apple_music_id, Song.title, Song.artist, Song.album,
+    Song.duration_ms, Song.external_url, Song.tempo, Song.energy, Song.valence,
+    Song.danceability, Song.acousticness, Song.instrumentalness, Song.loudness,
+    Song.speechiness, Song.hype_score, Song.auto_category_zone, Song.created_at
+)
+
+WORKOUT_COLUMNS = (
+    WorkoutSession.id, WorkoutSession.user_id, WorkoutSession.start_time,
+    WorkoutSession.end_time, WorkoutSession.workout_type, WorkoutSession.workout_profile_name,
+    WorkoutSession.status, WorkoutSession.avg_heart_rate, WorkoutSession.max_heart_rate,
+    WorkoutSession.min_heart_rate, WorkoutSession.created_at, WorkoutSession.analyzed_at
+)
+
+HEART_RATE_COLUMNS = (
+    HeartRateData.id, HeartRateData.workout_session_id, HeartRateData.timestamp, HeartRateData.bpm
+)
+
+SONG_PLAY_COLUMNS = (
+    SongPlay.id, SongPlay.workout_session_id, SongPlay.start_time, SongPlay.end_time,
+    SongPlay.avg_bpm_during_song, SongPlay.max_bpm_during_song, SongPlay.bpm_change,
+    SongPlay.song_position_in_workout
+)
+
+
+def song_row(row):
+    """SONG_COLUMNS row -> same dict as Song.to_dict()"""
+    (song_id, spotify_id, apple_music_id, title, artist, album, duration_ms, external_url,
+     tempo, energy, valence, danceability, acousticness, instrumentalness, loudness,
+     speechiness, hype_score, zone, created_at) = row
+    return {
+        'id': song_id,
+        'spotify_id': spotify_id,
+        'apple_music_id': apple_music_id,
+        'title': title,
+        'artist': artist,
+        'album': album,
+        'duration_ms': duration_ms,
+        'external_url': external_url,
+        'audio_features': {
+            'tempo': tempo,
+            'energy': energy,
+            'valence': valence,
+            'danceability': danceability,
+            'acousticness': acousticness,
+            'instrumentalness': instrumentalness,
+            'loudness': loudness,
+            'speechiness': speechiness
+        },
+        'hype_score': hype_score,
+        'auto_category_zone': zone,
+        'created_at': isoformat(created_at)
+    }
+
+
+def workout_row(row, total_songs):
+    """WORKOUT_COLUMNS row -> same dict as WorkoutSession.to_dict()"""
+    (workout_id, user_id, start_time, end_time, workout_type, profile_name, status,
+     avg_hr, max_hr, min_hr, created_at, analyzed_at) = row
+    duration = (end_time - start_time).total_seconds() / 60 if end_time and start_time else None
+    return {
+        'id': workout_id,
+        'user_id': user_id,
+        'start_time': isoformat(start_time),
+        'end_time': isoformat(end_time),
+        'duration_minutes': duration,
+        'workout_type': workout_type,
+        'workout_profile_name': profile_name,
+        'status': status,
+        'avg_heart_rate': avg_hr,
+        'max_heart_rate': max_hr,
+        'min_heart_rate': min_hr,
+        'created_at': isoformat(created_at),
+        'analyzed_at': isoformat(analyzed_at),
+        'total_songs': total_songs or 0
+    }
+
+
+def song_play_row(row):
+    """SONG_PLAY_COLUMNS + SONG_COLUMNS row (outer joined) -> same dict as SongPlay.to_dict()"""
+    play_count = len(SONG_PLAY_COLUMNS)
+    (play_id, workout_id, start_time, end_time, avg_bpm, max_bpm, bpm_change, position) = row[:play_count]
+    song = row[play_count:]
+    return {
+        'id': play_id,
+        'workout_session_id': workout_id,
+        'song': song_row(song) if song[0] is not None else None,
+        'start_time': isoformat(start_time),
+        'end_time': isoformat(end_time),
+        'avg_bpm_during_song': avg_bpm,
+        'max_bpm_during_song': max_bpm,
+        'bpm_change': bpm_change,
+        'song_position_in_workout': position
+    }
+
+
+def heart_rate_json(row):
+    """
+    HEART_RATE_COLUMNS row -> JSON text of HeartRateData.to_dict()
+    Every field is a number or an ISO timestamp, so the text is formatted
+    directly instead of building a dict and encoding it
+    """
+    hr_id, workout_id, timestamp, bpm = row
+    if hr_id is None:
+        hr_id = 'null'  # Rollup samples of archived workouts have no row id
+    return (f'{{"id":{hr_id},"workout_session_id":{workout_id},'
+            f'"timestamp":"{timestamp.isoformat()}","bpm":{bpm}}}')
+
+
+def heart_rate_row(row):
+    """HEART_RATE_COLUMNS row -> same dict as HeartRateData.to_dict()"""
+    hr_id, workout_id, timestamp, bpm = row
+    return {
+        'id': hr_id,
+        'workout_session_id': workout_id,
+        'timestamp': timestamp.isoformat(),
+        'bpm': bpm
+    }
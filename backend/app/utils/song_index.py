@@ -0,0 +1,268 @@
+"""
+Song Feature Index - In-memory nearest-neighbour search over audio features
+Answers "songs like this one" without scanning the songs table
+"""
+
+import heapq
+import math
+import threading
+
+# Audio features used for similarity, with the range used to scale each one to 0-1.
+# Fixed ranges (instead of min/max of the current catalog) mean a newly added song
+# never forces the existing vectors to be renormalized.
+FEATURE_RANGES = {
+    'tempo': (40.0, 220.0),
+    'energy': (0.0, 1.0),
+    'valence': (0.0, 1.0),
+    'danceability': (0.0, 1.0),
+    'acousticness': (0.0, 1.0),
+    'instrumentalness': (0.0, 1.0),
+    'loudness': (-60.0, 0.0),
+    'speechiness': (0.0, 1.0),
+}
+FEATURES = tuple(FEATURE_RANGES)
+
+LEAF_SIZE = 16  # Points per leaf - small linear scans beat deeper recursion in Python
+MAX_PENDING = 2048  # Songs added since the last build before the tree is rebuilt
+
+
+def normalize_features(features):
+    """
+    Scale a {feature: value} mapping to a tuple of 0-1 floats
+    Returns None if any feature is missing
+    """
+    vector = []
+    for name in FEATURES:
+        value = features.get(name)
+        if value is None:
+            return None
+        low, high = FEATURE_RANGES[name]
+        scaled = (value - low) / (high - low)
+        vector.append(min(max(scaled, 0.0), 1.0))
+    return tuple(vector)
+
+
+def song_vector(song):
+    """Normalized feature vector for a Song (or None if features are missing)"""
+    return normalize_features({name: getattr(song, name) for name in FEATURES})
+
+
+def weight_vector(weights=None):
+    """Per-dimension weights in FEATURES order (missing weights default to 1)"""
+    weights = weights or {}
+    return tuple(float(weights.get(name, 1.0)) for name in FEATURES)
+
+
+class _KDTree:
+    """
+    Static KD-tree over (song_id, vector) points
+    Split axis is the dimension with the largest spread in each node
+    """
+
+    def __init__(self, points):
+        self.points = list(points)
+        # Parallel node arrays: axis is -1 for leaves, which use [start, end) into points
+        self.axis = []
+        self.split = []
+        self.left = []
+        self.right = []
+        self.start = []
+        self.end = []
+        self.root = self._build(0, len(self.points)) if self.points else None
+
+    def _new_node(self, axis, split, start, end):
+        self.axis.append(axis)
+        self.split.append(split)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.axis) - 1
+
+    def _build(self, start, end):
+        if end - start <= LEAF_SIZE:
+            return self._new_node(-1, 0.0, start, end)
+
+        segment = self.points[start:end]
+        dims = len(segment[0][1])
+        spreads = []
+        for d in range(dims):
+            values = [p[1][d] for p in segment]
+            spreads.append(max(values) - min(values))
+        axis = max(range(dims), key=spreads.__getitem__)
+
+        if spreads[axis] == 0:
+            # All points identical - nothing to split on
+            return self._new_node(-1, 0.0, start, end)
+
+        segment.sort(key=lambda p: p[1][axis])
+        self.points[start:end] = segment
+        mid = start + (end - start) // 2
+        node = self._new_node(axis, segment[mid - start][1][axis], start, end)
+        self.left[node] = self._build(start, mid)
+        self.right[node] = self._build(mid, end)
+        return node
+
+    def search(self, query, weights, k, heap, exclude):
+        """
+        Push the k nearest points into heap (a max-heap of (-distance, song_id))
+        Distance is the weighted squared euclidean distance
+        """
+        if self.root is None or k < 1:
+            return
+
+        points = self.points
+        axis_of, split_of = self.axis, self.split
+        left_of, right_of = self.left, self.right
+        start_of, end_of = self.start, self.end
+        dims = range(len(query))
+        uniform = all(w == 1.0 for w in weights)
+        offsets = [0.0] * len(query)
+
+        def visit(node, bound):
+            axis = axis_of[node]
+            if axis == -1:
+                for song_id, vector in points[start_of[node]:end_of[node]]:
+                    if song_id in exclude:
+                        continue
+                    if uniform:
+                        dist = math.dist(vector, query)
+                        dist *= dist
+                    else:
+                        dist = 0.0
+                        for d in dims:
+                            diff = vector[d] - query[d]
+                            dist += weights[d] * diff * diff
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-dist, song_id))
+                    elif dist < -heap[0][0]:
+                        heapq.heapreplace(heap, (-dist, song_id))
+                return
+
+            diff = query[axis] - split_of[node]
+            if diff >= 0:
+                near, far = right_of[node], left_of[node]
+            else:
+                near, far = left_of[node], right_of[node]
+            visit(near, bound)
+
+            # Lower bound for the far side: distance from the query to that
+            # node's cell, updated incrementally along the split axis
+            old = offsets[axis]
+            far_bound = bound + weights[axis] * (diff * diff - old * old)
+            if len(heap) < k or far_bound < -heap[0][0]:
+                offsets[axis] = diff
+                visit(far, far_bound)
+                offsets[axis] = old
+
+        visit(self.root, 0.0)
+
+
+class SongFeatureIndex:
+    """
+    Nearest-neighbour index over normalized song feature vectors
+
+    Songs added after the last build go into a small pending list that is
+    scanned linearly; once it grows past MAX_PENDING the tree is rebuilt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = _KDTree([])
+        self._pending = []
+        self._vectors = {}  # song_id -> vector, for "songs like this" lookups
+        self.built = False
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def build(self, points):
+        """Replace the index contents with (song_id, vector) points"""
+        points = [(song_id, vector) for song_id, vector in points if vector is not None]
+        tree = _KDTree(points)
+        with self._lock:
+            self._tree = tree
+            self._pending = []
+            self._vectors = dict(points)
+            self.built = True
+
+    def build_from_db(self):
+        """Load every song with audio features from the database"""
+        from app import db
+        from app.models.song import Song
+
+        columns = [Song.id] + [getattr(Song, name) for name in FEATURES]
+        rows = db.session.query(*columns).filter(Song.tempo.isnot(None)).all()
+        self.build(
+            (row[0], normalize_features(dict(zip(FEATURES, row[1:]))))
+            for row in rows
+        )
+
+    def ensure_built(self):
+        if not self.built:
+            self.build_from_db()
+
+    def add(self, song):
+        """Add (or update) a single song - call after its audio features are saved"""
+        vector = song_vector(song)
+        if not self.built or vector is None or song.id is None:
+            return  # Not loaded yet - the first build will read it from the database
+
+        rebuild = False
+        with self._lock:
+            if song.id in self._vectors:
+                # Features changed - drop the stale point on the next rebuild
+                rebuild = True
+            self._vectors[song.id] = vector
+            self._pending.append((song.id, vector))
+            if len(self._pending) > MAX_PENDING:
+                rebuild = True
+
+        if rebuild:
+            self.build(list(self._vectors.items()))
+
+    def vector_for(self, song_id):
+        return self._vectors.get(song_id)
+
+    def query(self, vector, k=10, weights=None, exclude=()):
+        """
+        Find the k songs closest to a normalized vector
+
+        Returns:
+            List of (song_id, distance) sorted by distance
+        """
+        if k < 1:
+            return []
+
+        weights = weight_vector(weights)
+        exclude = set(exclude)
+        heap = []
+
+        with self._lock:
+            tree = self._tree
+            pending = list(self._pending)
+
+        tree.search(vector, weights, k, heap, exclude)
+
+        for song_id, point in pending:
+            if song_id in exclude:
+                continue
+            dist = sum(w * (a - b) ** 2 for w, a, b in zip(weights, point, vector))
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist, song_id))
+            elif dist < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist, song_id))
+
+        results = sorted((-neg_dist, song_id) for neg_dist, song_id in heap)
+        return [(song_id, round(dist ** 0.5, 4)) for dist, song_id in results]
+
+    def similar_to(self, song_id, k=10, weights=None):
+        """k nearest neighbours of a song already in the index (excluding itself)"""
+        vector = self.vector_for(song_id)
+        if vector is None:
+            return []
+        return self.query(vector, k=k, weights=weights, exclude={song_id})
+
+
+# Shared index for the whole process
+song_index = SongFeatureIndex()
@@ -0,0 +1,223 @@
+"""
+SQLite Production Mode - WAL journaling, tuned pragmas, a sized connection
+pool and background checkpoints, so one node can ingest and read at once
+
+In SQLite's default rollback-journal mode every HR insert commit locks the
+whole file and readers wait behind it. In WAL mode readers keep reading the
+last committed snapshot while one writer appends to the -wal file; writers
+still take turns, each waiting up to busy_timeout for the lock. (pysqlite
+only opens a transaction before the first write, so a view's reads never
+pin an old snapshot that its insert would then conflict with.)
+
+The WAL is copied back into the database by checkpoints. SQLite runs one on
+the commit that pushes the WAL past wal_autocheckpoint pages - inside some
+unlucky request - and a PASSIVE checkpoint can't finish while readers use
+old snapshots, so under steady load the file keeps growing. Instead a
+background thread per process checkpoints every SQLITE_CHECKPOINT_INTERVAL
+seconds and truncates the WAL once it's past SQLITE_WAL_TRUNCATE_MB; the
+automatic checkpoint stays on, raised, as a safety net.
+
+/metrics gains the contention numbers: time spent in write statements
+(on SQLite that's mostly waiting for the write lock), checkpoint results,
+WAL size and pool usage. Lock errors are counted in app/utils/metrics.py.
+Applies to file-backed SQLite with SQLITE_WAL on - the main database and
+each heart rate shard (app/utils/hr_shards.py), labelled by db in /metrics.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app.utils.metrics import Histogram, request_metrics
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+WRITE_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLAC')  # First 6 characters of the statement
+
+
+def is_sqlite_file(uri):
+    """True for a SQLite database on disk (not :memory:)"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+class SQLiteStats:
+    """Write timings, checkpoint results and pool usage per SQLite database in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engines = {}  # name -> engine
+        self.write_seconds = {}  # name -> Histogram
+        self.checkpoints = {}  # (name, mode, 'ok' or 'busy') -> count
+        self.checkpoint_seconds = {}  # name -> seconds
+        self.wal_pages = {}  # name -> (WAL pages, pages copied back) at the last checkpoint
+
+    def add_engine(self, name, engine):
+        with self._lock:
+            if not self.engines:
+                request_metrics.add_collector(self.render)
+            self.engines[name] = engine
+            self.write_seconds[name] = Histogram(WRITE_SECONDS_BUCKETS)
+            self.checkpoint_seconds[name] = 0.0
+
+    def name_of(self, engine):
+        return next((name for name, known in self.engines.items() if known is engine), None)
+
+    def observe_write(self, name, seconds):
+        with self._lock:
+            self.write_seconds[name].observe(seconds)
+
+    def record_checkpoint(self, name, mode, busy, wal_pages, checkpointed, seconds):
+        key = (name, mode, 'busy' if busy else 'ok')
+        with self._lock:
+            self.checkpoints[key] = self.checkpoints.get(key, 0) + 1
+            self.checkpoint_seconds[name] += seconds
+            self.wal_pages[name] = (wal_pages, checkpointed)
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP sqlite_write_statement_seconds INSERT/UPDATE/DELETE time, mostly waiting for the write lock',
+                     '# TYPE sqlite_write_statement_seconds histogram']
+            for name, histogram in sorted(self.write_seconds.items()):
+                lines += histogram.render('sqlite_write_statement_seconds', f'db="{name}"')
+
+            lines += ['# HELP sqlite_checkpoints_total WAL checkpoints by mode and result',
+                      '# TYPE sqlite_checkpoints_total counter']
+            for (name, mode, result), count in sorted(self.checkpoints.items()):
+                lines.append(f'sqlite_checkpoints_total{{db="{name}",mode="{mode}",result="{result}"}} {count}')
+            lines += ['# TYPE sqlite_checkpoint_seconds_total counter']
+            for name, seconds in sorted(self.checkpoint_seconds.items()):
+                lines.append(f'sqlite_checkpoint_seconds_total{{db="{name}"}} {seconds:.6f}')
+            lines += ['# HELP sqlite_wal_pages WAL pages at the last checkpoint, and how many were copied back',
+                      '# TYPE sqlite_wal_pages gauge']
+            for name, (wal_pages, checkpointed) in sorted(self.wal_pages.items()):
+                lines.append(f'sqlite_wal_pages{{db="{name}"}} {wal_pages}')
+                lines.append(f'sqlite_wal_pages_checkpointed{{db="{name}"}} {checkpointed}')
+
+            lines += ['# HELP db_pool_connections Pooled connections in use, idle and over pool_size',
+                      '# TYPE db_pool_connections gauge']
+            for name, engine in sorted(self.engines.items()):
+                pool = engine.pool
+                lines += [f'db_pool_connections{{db="{name}",state="checked_out"}} {pool.checkedout()}',
+                          f'db_pool_connections{{db="{name}",state="idle"}} {pool.checkedin()}',
+                          f'db_pool_connections{{db="{name}",state="overflow"}} {max(0, pool.overflow())}']
+        return lines
+
+
+# Shared by the whole process
+sqlite_stats = SQLiteStats()
+
+
+def wal_path(engine):
+    return f'{engine.url.database}-wal'
+
+
+def checkpoint(engine, mode='PASSIVE'):
+    """
+    Run a WAL checkpoint
+
+    Returns:
+        (busy, wal_pages, checkpointed_pages) as reported by SQLite
+    """
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f'Checkpoint mode must be one of {", ".join(CHECKPOINT_MODES)}')
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        busy, wal_pages, checkpointed = conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one()
+    name = sqlite_stats.name_of(engine)
+    if name is not None:
+        sqlite_stats.record_checkpoint(name, mode, busy, wal_pages, checkpointed, time.perf_counter() - started)
+    return busy, wal_pages, checkpointed
+
+
+class _Checkpointer:
+    """Background thread checkpointing one database's WAL (one per process)"""
+
+    def __init__(self, engine, interval, truncate_bytes, logger):
+        self.engine = engine
+        self.interval = interval
+        self.truncate_bytes = truncate_bytes
+        self.logger = logger
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        # Checked by pid so a worker forked after the first connect starts its own
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name='sqlite-checkpoint', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                size = os.path.getsize(wal_path(self.engine)) if os.path.exists(wal_path(self.engine)) else 0
+                checkpoint(self.engine, 'TRUNCATE' if size > self.truncate_bytes else 'PASSIVE')
+            except Exception:
+                self.logger.exception('SQLite checkpoint failed')
+
+
+def configure_engine_options(app):
+    """Size the connection pool - call before db.init_app()"""
+    if not app.config['SQLITE_WAL'] or not is_sqlite_file(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['SQLITE_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', app.config['SQLITE_POOL_TIMEOUT'])
+
+
+def register_sqlite_mode(app, engine, name='primary'):
+    """Apply the pragmas on every new connection to engine and start checkpointing it"""
+    config = app.config
+    if not config['SQLITE_WAL'] or not is_sqlite_file(engine.url):
+        return
+
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {", ".join(SYNCHRONOUS_MODES)}')
+
+    pragmas = (
+        f'PRAGMA busy_timeout = {config["SQLITE_BUSY_TIMEOUT_MS"]}',  # First, so switching to WAL waits too
+        'PRAGMA journal_mode = WAL',
+        f'PRAGMA synchronous = {synchronous}',
+        f'PRAGMA cache_size = -{config["SQLITE_CACHE_SIZE_KB"]}',  # Negative = KiB rather than pages
+        f'PRAGMA mmap_size = {config["SQLITE_MMAP_SIZE_MB"] * 1024 * 1024}',
+        f'PRAGMA wal_autocheckpoint = {config["SQLITE_WAL_AUTOCHECKPOINT"]}'
+    )
+
+    checkpointer = None
+    if config['SQLITE_CHECKPOINT_INTERVAL'] > 0:
+        checkpointer = _Checkpointer(engine, config['SQLITE_CHECKPOINT_INTERVAL'],
+                                     config['SQLITE_WAL_TRUNCATE_MB'] * 1024 * 1024, app.logger)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+        if checkpointer is not None:
+            checkpointer.ensure_running()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_write_timer(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in _WRITE_VERBS:
+            conn.info['sqlite_write_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_write_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('sqlite_write_started', None)
+        if started is not None:
+            sqlite_stats.observe_write(name, time.perf_counter() - started)
+
+    sqlite_stats.add_engine(name, engine)
@@ -0,0 +1,112 @@
+"""
+User Cache - Loads the JWT's user once and remembers it for a short while
+Hooked into Flask-JWT-Extended's user_lookup_loader, so every blueprint can use
+`current_user` without a users query on each request
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class CachedUser:
+    """
+    Read-only snapshot of the User fields routes actually need
+    Use User.query.get(current_user.id) when you need to modify the user
+    """
+    __slots__ = ('id', 'email', 'name', 'age', 'is_active', 'spotify_access_token',
+                 'preferred_music_service', '_public')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.email = user.email
+        self.name = user.name
+        self.age = user.age
+        self.is_active = user.is_active
+        self.spotify_access_token = user.spotify_access_token
+        self.preferred_music_service = user.preferred_music_service
+        self._public = user.to_dict()
+
+    def calculate_max_heart_rate(self):
+        return self._public['max_heart_rate']
+
+    def to_dict(self):
+        return dict(self._public)
+
+
+class UserCache:
+    """
+    Size-bounded LRU of CachedUser with a time-to-live per entry
+    Entries are dropped as soon as an update or delete of the user row is
+    committed in this process (see the User mapper events); other processes
+    catch up within the TTL
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, CachedUser)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user, ttl, max_size):
+        cached = CachedUser(user)
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + ttl, cached)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared cache for the whole process
+user_cache = UserCache()
+
+
+def load_user(user_id):
+    """CachedUser for an id, hitting the database only on a cache miss"""
+    from app import db
+    from app.models import User
+    from app.utils.db_routing import use_primary
+
+    cached = user_cache.get(user_id)
+    if cached:
+        return cached
+
+    with use_primary():  # A new account may not have reached the replicas yet
+        user = db.session.get(User, user_id)
+    if not user:
+        return None
+
+    config = current_app.config
+    return user_cache.put(user, config['USER_CACHE_TTL'], config['USER_CACHE_SIZE'])
+
+
+def register_user_loader(jwt):
+    """Wire the cache into Flask-JWT-Extended"""
+
+    @jwt.user_lookup_loader
+    def user_lookup_callback(_jwt_header, jwt_data):
+        user = load_user(int(jwt_data['sub']))
+        # Unknown or deactivated users fail authentication (401)
+        if not user or not user.is_active:
+            return None
+        return user
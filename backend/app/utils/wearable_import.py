@@ -0,0 +1,290 @@
+"""
+Wearable Import - Load heart rate history from watch export files
+Supports TCX and GPX (with HR extensions) and CSV, optionally gzipped.
+Files are parsed incrementally and saved workout by workout: one
+WorkoutSession plus bulk-inserted HeartRateData per transaction
+"""
+
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta, timezone
+from xml.etree.ElementTree import XMLParser
+
+from app import db
+from app.models import WorkoutSession, HeartRateData
+from app.utils.hr_aggregates import record_workout
+from app.utils.hr_shards import hr_connection
+
+IMPORT_BATCH_SIZE = 20000  # HR rows per INSERT
+CSV_SESSION_GAP = timedelta(minutes=30)  # Readings further apart start a new workout
+
+FORMATS = ('tcx', 'gpx', 'csv')
+
+CSV_TIME_COLUMNS = ('timestamp', 'time', 'datetime', 'date')
+CSV_BPM_COLUMNS = ('bpm', 'heart_rate', 'heartrate', 'hr')
+CSV_WORKOUT_COLUMNS = ('workout', 'workout_id', 'activity_id', 'session')
+CSV_TYPE_COLUMNS = ('workout_type', 'sport', 'activity', 'type')
+
+
+class ImportFormatError(ValueError):
+    """File can't be imported (unknown format, missing columns, broken XML...)"""
+
+
+def detect_format(filename):
+    """'tcx' / 'gpx' / 'csv' from a file name (a trailing .gz is allowed), else None"""
+    name = (filename or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    extension = name.rpartition('.')[2]
+    return extension if extension in FORMATS else None
+
+
+def parse_time(text):
+    """ISO 8601 (any offset) or unix seconds -> naive UTC datetime, like the rest of the app"""
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1]  # Already UTC - skips the timezone conversion below
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            return datetime.fromtimestamp(float(text), timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            raise ImportFormatError(f'Unrecognized timestamp: {text!r}')
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _HeartRateTarget:
+    """
+    Parser target for TCX/GPX: collects (timestamp, bpm) pairs per workout
+
+    expat calls start/data/end directly, so no element tree is ever built -
+    comparing tag names is all the work done per element
+    """
+
+    def __init__(self, point_tag, workout_tag, time_tag, hr_tag, type_tag=None, type_attribute=None):
+        self.point_tag = point_tag
+        self.workout_tag = workout_tag
+        self.time_tag = time_tag
+        self.hr_tag = hr_tag
+        self.type_tag = type_tag
+        self.type_attribute = type_attribute
+
+        self.completed = []  # Finished workouts, drained by the caller after each feed
+        self.samples = []
+        self.workout_type = None
+        self.timestamp = self.bpm = None
+        self.text = []
+
+    def start(self, tag, attrib):
+        name = tag[tag.rfind('}') + 1:]  # Drop the namespace
+        if name == self.point_tag:
+            self.timestamp = self.bpm = None
+        elif name == self.workout_tag and self.type_attribute:
+            self.workout_type = attrib.get(self.type_attribute)
+        self.text = []
+
+    def data(self, text):
+        self.text.append(text)
+
+    def end(self, tag):
+        name = tag[tag.rfind('}') + 1:]
+        if name == self.time_tag:
+            self.timestamp = ''.join(self.text)
+        elif name == self.hr_tag:
+            self.bpm = ''.join(self.text)
+        elif name == self.point_tag:
+            if self.timestamp and self.bpm:
+                self.samples.append((parse_time(self.timestamp), int(float(self.bpm))))
+        elif name == self.workout_tag:
+            if self.samples:
+                self.completed.append({'workout_type': self.workout_type, 'samples': self.samples})
+            self.samples = []
+            self.workout_type = None
+        elif name == self.type_tag:
+            self.workout_type = ''.join(self.text).strip() or None
+        self.text = []
+
+    def close(self):
+        pass
+
+
+def _parse_xml(stream, target, chunk_size=256 * 1024):
+    """Feed the file through expat in chunks, yielding workouts as they complete"""
+    parser = XMLParser(target=target)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        parser.feed(chunk)
+        if target.completed:
+            yield from target.completed
+            target.completed = []
+    parser.close()
+    yield from target.completed
+
+
+def parse_tcx(stream):
+    """Garmin Training Center files: one workout per <Activity>"""
+    return _parse_xml(stream, _HeartRateTarget('Trackpoint', 'Activity', 'Time', 'Value',
+                                               type_attribute='Sport'))
+
+
+def parse_gpx(stream):
+    """GPX tracks with a TrackPointExtension <hr>: one workout per <trk>"""
+    return _parse_xml(stream, _HeartRateTarget('trkpt', 'trk', 'time', 'hr', type_tag='type'))
+
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def parse_csv(stream):
+    """
+    CSV with a header row: timestamp + bpm columns, optionally a workout id
+    and workout type. Without a workout id column, a gap of more than 30
+    minutes between readings starts a new workout
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = [column.strip().lower() for column in next(reader, [])]
+
+    time_col = _find_column(header, CSV_TIME_COLUMNS)
+    bpm_col = _find_column(header, CSV_BPM_COLUMNS)
+    if time_col is None or bpm_col is None:
+        raise ImportFormatError('CSV needs a timestamp column and a bpm column')
+    workout_col = _find_column(header, CSV_WORKOUT_COLUMNS)
+    type_col = _find_column(header, CSV_TYPE_COLUMNS)
+
+    samples = []
+    workout_type = None
+    current_key = None
+    previous = None
+
+    for row in reader:
+        if len(row) <= max(time_col, bpm_col) or not row[bpm_col]:
+            continue
+        timestamp = parse_time(row[time_col])
+
+        if workout_col is not None:
+            new_workout = row[workout_col] != current_key
+            current_key = row[workout_col]
+        else:
+            new_workout = previous is not None and timestamp - previous > CSV_SESSION_GAP
+        previous = timestamp
+
+        if new_workout and samples:
+            yield {'workout_type': workout_type, 'samples': samples}
+            samples = []
+        if not samples and type_col is not None and len(row) > type_col:
+            workout_type = row[type_col] or None
+
+        samples.append((timestamp, int(float(row[bpm_col]))))
+
+    if samples:
+        yield {'workout_type': workout_type, 'samples': samples}
+
+
+PARSERS = {'tcx': parse_tcx, 'gpx': parse_gpx, 'csv': parse_csv}
+
+
+def _insert_samples(workout_id, user_id, samples):
+    """Bulk insert one workout's (timestamp, bpm) pairs in IMPORT_BATCH_SIZE batches"""
+    connection = hr_connection(user_id)
+    created_at = datetime.utcnow()
+
+    if connection.dialect.name == 'sqlite':
+        # SQLAlchemy formats every SQLite datetime in Python, which costs more
+        # than the insert itself. isoformat() writes the exact same text in C,
+        # and the rows go straight to the driver's executemany.
+        sql = ('INSERT INTO heart_rate_data (workout_session_id, timestamp, bpm, created_at) '
+               'VALUES (?, ?, ?, ?)')
+        created_at = created_at.isoformat(' ', 'microseconds')
+        for start in range(0, len(samples), IMPORT_BATCH_SIZE):
+            connection.exec_driver_sql(sql, [
+                (workout_id, timestamp.isoformat(' ', 'microseconds'), bpm, created_at)
+                for timestamp, bpm in samples[start:start + IMPORT_BATCH_SIZE]
+            ])
+        return
+
+    insert = HeartRateData.__table__.insert()
+    for start in range(0, len(samples), IMPORT_BATCH_SIZE):
+        connection.execute(insert, [
+            {'workout_session_id': workout_id, 'timestamp': timestamp, 'bpm': bpm,
+             'created_at': created_at}
+            for timestamp, bpm in samples[start:start + IMPORT_BATCH_SIZE]
+        ])
+
+
+def save_workouts(user_id, workouts):
+    """
+    Store parsed workouts, one commit each
+    Workouts starting at the same moment as one the user already has are
+    skipped, so re-importing a file is harmless
+
+    Returns:
+        dict with workouts/samples imported, skipped count and new workout ids
+    """
+    existing = {
+        start for (start,) in db.session.query(WorkoutSession.start_time).filter_by(user_id=user_id)
+    }
+    result = {'workouts': 0, 'samples': 0, 'skipped': 0, 'workout_ids': []}
+
+    for parsed in workouts:
+        samples = parsed['samples']
+        samples.sort()
+        start_time = samples[0][0]
+        if start_time in existing:
+            result['skipped'] += 1
+            continue
+        existing.add(start_time)
+
+        bpms = [bpm for _, bpm in samples]
+        workout = WorkoutSession(
+            user_id=user_id,
+            workout_type=(parsed['workout_type'] or 'Imported')[:50],
+            status='completed',
+            start_time=start_time,
+            end_time=samples[-1][0],
+            avg_heart_rate=sum(bpms) // len(bpms),
+            max_heart_rate=max(bpms),
+            min_heart_rate=min(bpms)
+        )
+        db.session.add(workout)
+        db.session.flush()  # Get workout ID
+
+        _insert_samples(workout.id, user_id, samples)
+        record_workout(workout.id, user_id, samples)
+        db.session.commit()
+
+        result['workouts'] += 1
+        result['samples'] += len(samples)
+        result['workout_ids'].append(workout.id)
+
+    return result
+
+
+def import_file(user_id, filename, stream):
+    """
+    Parse and store one export file (binary stream)
+
+    Raises:
+        ImportFormatError if the file type is unknown or the content is broken.
+        Workouts saved before the error stay saved.
+    """
+    file_format = detect_format(filename)
+    if not file_format:
+        raise ImportFormatError(f'Unsupported file type: {filename} (use .tcx, .gpx or .csv)')
+
+    if filename.lower().endswith('.gz'):
+        stream = gzip.GzipFile(fileobj=stream)
+
+    try:
+        return save_workouts(user_id, PARSERS[file_format](stream))
+    except (SyntaxError, ValueError, OSError) as e:  # ParseError is a SyntaxError
+        db.session.rollback()
+        if isinstance(e, ImportFormatError):
+            raise
+        raise ImportFormatError(f'Could not read {filename}: {e}')
@@ -4,15 +4,32 @@ This is the CORE INTELLIGENCE of Vibes Matched!
 """
 
 from app import db
-from app.models import WorkoutSession, HeartRateData, SongPlay, Song, SongStats
+from app.models import WorkoutSession, WorkoutAnalysis, SongPlay, Song, SongStats, UserTopSongs
+from app.utils.db_routing import use_primary
+from app.utils.heart_rate_store import heart_rate_samples
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import flag_modified
 from datetime import datetime, timedelta
 from statistics import mean
 
+# Bump when the scoring below changes: stored analyses of older versions are
+# redone (once) on their next /analyze call, swapping their SongStats share
+ANALYSIS_VERSION = 1
+
+# How many songs each materialized top-songs ranking keeps
+TOP_SONGS_CACHE_SIZE = 100
+
+# Position of the ranking score inside a compact UserTopSongs entry
+RANKING_SCORE_INDEX = {'hype': 4, 'cooldown': 5}
+
 
 def analyze_workout(workout_id):
     """
     Analyze a completed workout to determine which songs pumped the user up
 
+    The result is stored per algorithm version, so calling this again returns
+    it without recomputing or counting the workout into SongStats twice.
+
     Returns:
         dict with analysis results and top hype/cooldown songs
     """
@@ -21,13 +38,17 @@ def analyze_workout(workout_id):
     if not workout:
         return {'error': 'Workout not found'}
 
-    if workout.status != 'completed':
+    stored = WorkoutAnalysis.query.filter_by(workout_session_id=workout_id).all()
+    current = next((a for a in stored if a.algorithm_version == ANALYSIS_VERSION), None)
+    if current:
+        return current.get_result()
+
+    if workout.status not in ('completed', 'analyzed'):
         return {'error': 'Workout must be completed before analysis'}
 
     # Get all song plays and heart rate data
     song_plays = SongPlay.query.filter_by(workout_session_id=workout_id).all()
-    hr_data = HeartRateData.query.filter_by(workout_session_id=workout_id)\
-        .order_by(HeartRateData.timestamp).all()
+    hr_data, _ = heart_rate_samples(workout_id, workout.user_id)  # Raw, or rollups once archived
 
     if not song_plays:
         return {'message': 'No songs tracked during this workout'}
@@ -43,11 +64,16 @@ def analyze_workout(workout_id):
     baseline_hr_data = [hr for hr in hr_data if hr.timestamp <= baseline_cutoff]
     baseline_bpm = mean([hr.bpm for hr in baseline_hr_data]) if baseline_hr_data else None
 
+    # Songs loaded once for every play instead of one query per play
+    song_ids = {song_play.song_id for song_play in song_plays}
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_(song_ids))}
+
     # Analyze each song play
     song_analysis = []
+    analyzed_plays = []
 
     for song_play in song_plays:
-        analysis = analyze_song_play(song_play, hr_data, baseline_bpm, workout)
+        analysis = analyze_song_play(song_play, hr_data, baseline_bpm, workout, songs)
 
         if analysis:
             # Update SongPlay with calculated data
@@ -57,15 +83,21 @@ def analyze_workout(workout_id):
             song_play.song_position_in_workout = analysis['position']
 
             song_analysis.append(analysis)
+            analyzed_plays.append((song_play.song_id, analysis))
 
-            # Update user's SongStats
-            update_song_stats(workout.user_id, song_play.song_id, analysis)
-
-    # Mark workout as analyzed
-    workout.status = 'analyzed'
-    workout.analyzed_at = datetime.utcnow()
-
-    db.session.commit()
+    # What this workout adds to the user's SongStats, and what an older
+    # version of the analysis added before
+    contributions = [
+        [song_id, analysis['avg_bpm'], analysis['hype_score'], analysis['cooldown_score']]
+        for song_id, analysis in analyzed_plays
+    ]
+    if stored:
+        previous = [c for old in stored for c in old.get_contributions()]
+    elif workout.status == 'analyzed':
+        # Analyzed before results were stored - already counted, by this version's scoring
+        previous = contributions
+    else:
+        previous = []
 
     # Sort songs by hype score
     hype_songs = sorted(
@@ -80,7 +112,7 @@ def analyze_workout(workout_id):
         reverse=True
     )
 
-    return {
+    result = {
         'workout_id': workout_id,
         'baseline_bpm': baseline_bpm,
         'songs_analyzed': len(song_analysis),
@@ -89,11 +121,60 @@ def analyze_workout(workout_id):
         'message': 'Workout analyzed successfully! 🎵💪'
     }
 
+    for old in stored:
+        db.session.delete(old)
+    analysis_row = WorkoutAnalysis(workout_session_id=workout_id, algorithm_version=ANALYSIS_VERSION)
+    analysis_row.set_result(result)
+    analysis_row.set_contributions(contributions)
+    db.session.add(analysis_row)
+
+    # Mark workout as analyzed
+    workout.status = 'analyzed'
+    workout.analyzed_at = datetime.utcnow()
 
-def analyze_song_play(song_play, all_hr_data, baseline_bpm, workout):
+    try:
+        # Update user's SongStats by the difference, one record per song
+        if contributions != previous:
+            removed = _group_by_song(previous)
+            added = _group_by_song(contributions)
+            song_ids = removed.keys() | added.keys()
+            user_stats = load_song_stats(workout.user_id, song_ids)
+            changed_stats = [
+                update_song_stats(workout.user_id, song_id, removed.get(song_id, []),
+                                  added.get(song_id, []), user_stats)
+                for song_id in sorted(song_ids)
+            ]
+
+            # Keep the materialized top songs rankings in step with the new stats
+            update_top_song_rankings(workout.user_id, changed_stats)
+
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent call stored this analysis first - its stats stand, ours roll back
+        db.session.rollback()
+        current = db.session.get(WorkoutAnalysis, (workout_id, ANALYSIS_VERSION))
+        if current is None:
+            raise
+        return current.get_result()
+
+    return result
+
+
+def _group_by_song(contributions):
+    """{song_id: [(avg_bpm, hype_score, cooldown_score), ...]}"""
+    by_song = {}
+    for song_id, *scores in contributions:
+        by_song.setdefault(song_id, []).append(scores)
+    return by_song
+
+
+def analyze_song_play(song_play, all_hr_data, baseline_bpm, workout, songs=None):
     """
     Analyze a single song play to determine its effect on heart rate
 
+    Args:
+        songs: Optional {song_id: Song} already loaded for the workout
+
     Returns:
         dict with song analysis data
     """
@@ -171,7 +252,7 @@ def analyze_song_play(song_play, all_hr_data, baseline_bpm, workout):
             cooldown_score *= 1.2
 
     # Get song details
-    song = Song.query.get(song_play.song_id)
+    song = songs.get(song_play.song_id) if songs is not None else db.session.get(Song, song_play.song_id)
 
     return {
         'song_play_id': song_play.id,
@@ -186,12 +267,58 @@ def analyze_song_play(song_play, all_hr_data, baseline_bpm, workout):
     }
 
 
-def update_song_stats(user_id, song_id, analysis):
+def load_song_stats(user_id, song_ids):
+    """
+    {song_id: SongStats} of a user for these songs, without a query per song
+    Songs without stats yet get zeroed records, inserted in one batch
+    (added one by one, the ORM would flush an INSERT per song)
     """
-    Update user's personal stats for a song based on latest play
+    if not song_ids:
+        return {}
+
+    def load(ids):
+        return {
+            stats.song_id: stats for stats in SongStats.query.filter(
+                SongStats.user_id == user_id,
+                SongStats.song_id.in_(ids)
+            )
+        }
+
+    user_stats = load(song_ids)
+    missing = song_ids - user_stats.keys()
+    if missing:
+        db.session.execute(db.insert(SongStats), [
+            {
+                'user_id': user_id,
+                'song_id': song_id,
+                'times_played_during_workout': 0,
+                'avg_bpm_response': 0,
+                'personal_hype_score': 0,
+                'personal_cooldown_score': 0
+            }
+            for song_id in sorted(missing)
+        ])
+        user_stats.update(load(missing))
+
+    return user_stats
+
+
+def update_song_stats(user_id, song_id, removed, added, user_stats=None):
+    """
+    Update user's personal stats for a song: take plays out of the running
+    averages and put plays in, as one change
+    Caller is responsible for committing
+
+    Args:
+        removed: (avg_bpm, hype_score, cooldown_score) of plays counted before
+        added: (avg_bpm, hype_score, cooldown_score) of plays to count
+        user_stats: Optional {song_id: SongStats} from load_song_stats()
     """
     # Find or create SongStats
-    stats = SongStats.query.filter_by(user_id=user_id, song_id=song_id).first()
+    if user_stats is not None:
+        stats = user_stats.get(song_id)
+    else:
+        stats = SongStats.query.filter_by(user_id=user_id, song_id=song_id).first()
 
     if not stats:
         stats = SongStats(
@@ -206,22 +333,98 @@ def update_song_stats(user_id, song_id, analysis):
 
     # Update running averages
     times_played = stats.times_played_during_workout
+    new_times_played = times_played - len(removed) + len(added)
+
+    def reweighted(average, index):
+        # Weighted average with the removed plays' share swapped for the added ones
+        if new_times_played <= 0:
+            return 0
+        total = average * times_played - sum(p[index] for p in removed) + sum(p[index] for p in added)
+        return total / new_times_played
+
+    stats.avg_bpm_response = reweighted(stats.avg_bpm_response, 0)
+    stats.personal_hype_score = reweighted(stats.personal_hype_score, 1)
+    stats.personal_cooldown_score = reweighted(stats.personal_cooldown_score, 2)
+
+    stats.times_played_during_workout = max(new_times_played, 0)
+    if added:
+        stats.last_played_at = datetime.utcnow()
+
+    # Write both scores even when one didn't move, so every changed row has the
+    # same columns and the flush sends them as one executemany UPDATE
+    flag_modified(stats, 'personal_hype_score')
+    flag_modified(stats, 'personal_cooldown_score')
+
+    return stats
+
+
+def _ranking_entry(stats):
+    """Compact UserTopSongs row for a SongStats record"""
+    return [
+        stats.id,
+        stats.song_id,
+        stats.times_played_during_workout,
+        stats.avg_bpm_response,
+        stats.personal_hype_score,
+        stats.personal_cooldown_score,
+        stats.last_played_at.isoformat() if stats.last_played_at else None
+    ]
 
-    # Calculate new averages using weighted average
-    stats.avg_bpm_response = (
-        (stats.avg_bpm_response * times_played + analysis['avg_bpm']) / (times_played + 1)
-    )
 
-    stats.personal_hype_score = (
-        (stats.personal_hype_score * times_played + analysis['hype_score']) / (times_played + 1)
-    )
+def rebuild_top_song_ranking(user_id, song_type):
+    """
+    Recompute a user's materialized top songs ranking from SongStats
+    Caller is responsible for committing
+    """
+    column = SongStats.personal_hype_score if song_type == 'hype' else SongStats.personal_cooldown_score
 
-    stats.personal_cooldown_score = (
-        (stats.personal_cooldown_score * times_played + analysis['cooldown_score']) / (times_played + 1)
-    )
+    stats = SongStats.query.filter_by(user_id=user_id)\
+        .filter(column > 0)\
+        .order_by(column.desc())\
+        .limit(TOP_SONGS_CACHE_SIZE)\
+        .all()
+
+    ranking = db.session.get(UserTopSongs, (user_id, song_type))
+    if not ranking:
+        ranking = UserTopSongs(user_id=user_id, ranking_type=song_type)
+        db.session.add(ranking)
+
+    ranking.set_entries([_ranking_entry(s) for s in stats])
+    return ranking
+
+
+def update_top_song_rankings(user_id, changed_stats):
+    """
+    Merge freshly updated SongStats into the user's hype and cooldown rankings
 
-    stats.times_played_during_workout += 1
-    stats.last_played_at = datetime.utcnow()
+    Changed songs are re-scored in place. If a song falls out of a full
+    ranking the next best song isn't known here, so that ranking is rebuilt.
+    """
+    changed = {stats.id: stats for stats in changed_stats}
+
+    for song_type, score_index in RANKING_SCORE_INDEX.items():
+        ranking = db.session.get(UserTopSongs, (user_id, song_type))
+        if not ranking:
+            rebuild_top_song_ranking(user_id, song_type)
+            continue
+
+        entries = ranking.get_entries()
+        full = len(entries) >= TOP_SONGS_CACHE_SIZE
+        cutoff = entries[-1][score_index] if full else 0
+
+        merged = [e for e in entries if e[0] not in changed]
+        merged += [_ranking_entry(stats) for stats in changed.values()]
+        merged = [e for e in merged if e[score_index] and e[score_index] > 0]
+
+        if full:
+            # Songs outside a full ranking may outscore anything below the old cutoff
+            merged = [e for e in merged if e[score_index] >= cutoff]
+            if len(merged) < TOP_SONGS_CACHE_SIZE:
+                rebuild_top_song_ranking(user_id, song_type)
+                continue
+
+        merged.sort(key=lambda e: e[score_index], reverse=True)
+        ranking.set_entries(merged[:TOP_SONGS_CACHE_SIZE])
 
     db.session.commit()
 
@@ -229,6 +432,7 @@ def update_song_stats(user_id, song_id, analysis):
 def get_user_top_songs(user_id, song_type='hype', limit=20):
     """
     Get user's top hype or cooldown songs based on all workout history
+    Served from the materialized UserTopSongs ranking (rebuilt if missing)
 
     Args:
         user_id: User ID
@@ -238,17 +442,46 @@ def get_user_top_songs(user_id, song_type='hype', limit=20):
     Returns:
         List of songs sorted by personal score
     """
-    if song_type == 'hype':
-        stats = SongStats.query.filter_by(user_id=user_id)\
-            .filter(SongStats.personal_hype_score > 0)\
-            .order_by(SongStats.personal_hype_score.desc())\
-            .limit(limit)\
-            .all()
-    else:  # cooldown
+    song_type = 'hype' if song_type == 'hype' else 'cooldown'
+
+    if limit > TOP_SONGS_CACHE_SIZE:
+        # Deeper than the materialized ranking - sort SongStats directly
+        column = SongStats.personal_hype_score if song_type == 'hype' else SongStats.personal_cooldown_score
         stats = SongStats.query.filter_by(user_id=user_id)\
-            .filter(SongStats.personal_cooldown_score > 0)\
-            .order_by(SongStats.personal_cooldown_score.desc())\
+            .filter(column > 0)\
+            .order_by(column.desc())\
             .limit(limit)\
             .all()
-
-    return [stat.to_dict() for stat in stats]
+        entries = [_ranking_entry(s) for s in stats]
+    else:
+        ranking = db.session.get(UserTopSongs, (user_id, song_type))
+        if ranking:
+            entries = ranking.get_entries()[:limit]
+        else:
+            # A lagging replica may just not have it yet - check the primary before rebuilding
+            with use_primary():
+                ranking = db.session.get(UserTopSongs, (user_id, song_type))
+                if not ranking:
+                    ranking = rebuild_top_song_ranking(user_id, song_type)
+                    db.session.commit()
+                entries = ranking.get_entries()[:limit]
+
+    # One query for all the songs instead of one per ranking row
+    song_ids = [e[1] for e in entries]
+    songs = {song.id: song for song in Song.query.filter(Song.id.in_(song_ids)).all()} if song_ids else {}
+
+    results = []
+    for stats_id, song_id, times_played, avg_bpm, hype, cooldown, last_played in entries:
+        song = songs.get(song_id)
+        results.append({
+            'id': stats_id,
+            'user_id': user_id,
+            'song': song.to_dict() if song else None,
+            'times_played': times_played,
+            'avg_bpm_response': avg_bpm,
+            'personal_hype_score': hype,
+            'personal_cooldown_score': cooldown,
+            'last_played_at': last_played
+        })
+
+    return results
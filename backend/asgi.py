@@ -0,0 +1,12 @@
+"""
+Vibes Matched - ASGI Entry Point
+Same app as run.py, but async views (the Spotify calls) wait on an event
+loop instead of holding a worker - see app/utils/asgi.py
+
+    uvicorn asgi:app --workers 4 --port 5000
+"""
+
+from app import create_app
+from app.utils.asgi import FlaskASGI
+
+app = FlaskASGI(create_app())
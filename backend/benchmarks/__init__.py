@@ -0,0 +1 @@
+# Benchmarks package - run from backend/ with `python -m benchmarks.<name>`
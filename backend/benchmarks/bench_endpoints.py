@@ -0,0 +1,241 @@
+"""
+Endpoint Benchmark - p50/p95 latency and SQL query counts of the hot endpoints,
+compared against a saved JSON baseline
+
+Generates a synthetic dataset (benchmarks/dataset.py) into a throwaway
+SQLite database and drives these through Flask's test client, spread over
+a sample of users:
+  - ingest:    POST /api/workouts/<id>/heartrate
+  - end:       POST /api/workouts/<id>/end       (40 min workout at 1 Hz)
+  - analyze:   POST /api/workouts/<id>/analyze
+  - details:   GET  /api/workouts/<id>
+  - history:   GET  /api/workouts/history
+  - library:   GET  /api/workouts/songs/library?limit=20
+  - feed:      GET  /api/social/activity/feed
+  - top_songs: GET  /api/workouts/top-songs
+
+--save writes the results as the baseline. --baseline compares against it
+and exits 1 when an endpoint runs more queries than before, or its p50/p95
+got more than --threshold slower (and by at least --min-delta-ms, so a
+0.3 -> 0.4 ms blip doesn't fail the build). Latency baselines only mean
+something on the machine that recorded them - save one per CI runner.
+
+Usage (from backend/):
+    python -m benchmarks.bench_endpoints --save benchmarks/endpoint_baseline.json
+    python -m benchmarks.bench_endpoints --baseline benchmarks/endpoint_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WARMUP = 3  # Untimed calls per endpoint before measuring
+LIVE_WORKOUT_MINUTES = 40
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(samples):
+    """[(ms, queries)] -> result dict"""
+    times = [ms for ms, _ in samples]
+    return {
+        'p50_ms': round(statistics.median(times), 3),
+        'p95_ms': round(percentile(times, 95), 3),
+        'queries': max(queries for _, queries in samples),
+        'n': len(samples)
+    }
+
+
+def compare(baseline, results, threshold, min_delta_ms):
+    """Regression messages (empty when nothing got worse)"""
+    problems = []
+    for name, old in baseline['endpoints'].items():
+        new = results['endpoints'].get(name)
+        if new is None:
+            problems.append(f'{name}: missing from this run')
+            continue
+        if new['queries'] > old['queries']:
+            problems.append(f'{name}: {new["queries"]} queries, baseline {old["queries"]}')
+        for stat in ('p50_ms', 'p95_ms'):
+            if new[stat] > old[stat] * (1 + threshold) and new[stat] - old[stat] >= min_delta_ms:
+                problems.append(f'{name}: {stat} {new[stat]:.2f} ms, baseline {old[stat]:.2f} ms '
+                                f'(+{(new[stat] / old[stat] - 1) * 100:.0f}%)')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scale', default='tiny', help='benchmarks.dataset scale (default: tiny)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50, help='Timed calls per endpoint')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as a new baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare against this baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown (default: 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Ignore slowdowns smaller than this (default: 1.0)')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import create_app, db
+    from app.commands import init_db
+    from app.models import WorkoutSession, HeartRateData, SongPlay
+    from app.utils.hr_shards import hr_connection
+    from benchmarks.dataset import SCALES, Loader, generate, heart_rate_curve
+
+    app = create_app()
+    volumes = SCALES[args.scale]
+    with app.app_context():
+        init_db()
+        started = time.perf_counter()
+        generate(volumes, seed=args.seed, log=lambda message: None)
+        print(f'Dataset {args.scale} {volumes} built in {time.perf_counter() - started:.0f}s')
+
+    rnd = random.Random(args.seed)
+    client = app.test_client()
+    with app.app_context():
+        # Users with some history, so every endpoint has something to return
+        active_users = [
+            user_id for (user_id,) in db.session.query(WorkoutSession.user_id).distinct().order_by(WorkoutSession.user_id)
+        ]
+        bench_users = rnd.sample(active_users, min(20, len(active_users)))
+        headers = {user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+                   for user_id in bench_users}
+        workouts = {
+            user_id: [w for (w,) in db.session.query(WorkoutSession.id).filter_by(user_id=user_id)]
+            for user_id in bench_users
+        }
+        song_count = volumes['songs']
+
+    queries = [0]
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def count_query(*_):
+        queries[0] += 1
+
+    def timed(method, url, user_id, **kwargs):
+        queries[0] = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, headers=headers[user_id], **kwargs)
+        ms = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} -> {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return ms, queries[0]
+
+    def live_workout(user_id, with_data=True):
+        """An active workout that started LIVE_WORKOUT_MINUTES ago, with 1 Hz HR and a song every ~3 min"""
+        with app.app_context():
+            start = datetime.utcnow() - timedelta(minutes=LIVE_WORKOUT_MINUTES)
+            workout = WorkoutSession(user_id=user_id, workout_type='HIIT', workout_profile_name='HIIT',
+                                     status='active', start_time=start)
+            db.session.add(workout)
+            db.session.flush()
+            if with_data:
+                hr_loader = Loader(hr_connection(user_id))
+                hr_loader.insert(HeartRateData.__table__, ('workout_session_id', 'timestamp', 'bpm', 'created_at'), [
+                    (workout.id, hr_loader.value(start + timedelta(seconds=t)), bpm, hr_loader.value(start))
+                    for t, bpm in heart_rate_curve(rnd, LIVE_WORKOUT_MINUTES, 62, 185, 'HIIT')
+                ])
+                loader = Loader(db.session.connection())
+                loader.insert(SongPlay.__table__, ('workout_session_id', 'song_id', 'start_time', 'end_time', 'created_at'), [
+                    (workout.id, rnd.randint(1, song_count), loader.value(start + timedelta(seconds=s)),
+                     loader.value(start + timedelta(seconds=s + 200)), loader.value(start))
+                    for s in range(0, LIVE_WORKOUT_MINUTES * 60 - 200, 205)
+                ])
+            db.session.commit()
+            return workout.id
+
+    def run(name, call):
+        # Warmup and timed calls get distinct indexes, so analyze sees each ended workout once
+        for i in range(WARMUP):
+            call(i)
+        samples = [call(i) for i in range(WARMUP, WARMUP + args.repeat)]
+        results[name] = summarize(samples)
+        r = results[name]
+        print(f'{name:10} p50 {r["p50_ms"]:8.2f} ms  p95 {r["p95_ms"]:8.2f} ms  queries {r["queries"]:3}')
+
+    def user(i):
+        return bench_users[i % len(bench_users)]
+
+    results = {}
+
+    # Write path
+    ingest_workouts = {user_id: live_workout(user_id, with_data=False) for user_id in bench_users}
+    ingest_clock = [datetime.utcnow()]
+
+    def ingest(i):
+        ingest_clock[0] += timedelta(seconds=1)
+        return timed('POST', f'/api/workouts/{ingest_workouts[user(i)]}/heartrate', user(i),
+                     json={'bpm': 120 + i % 60, 'timestamp': ingest_clock[0].isoformat()})
+    run('ingest', ingest)
+
+    ended = []
+
+    def end(i):
+        workout_id = live_workout(user(i))
+        ended.append((user(i), workout_id))
+        return timed('POST', f'/api/workouts/{workout_id}/end', user(i))
+    run('end', end)
+
+    run('analyze', lambda i: timed('POST', f'/api/workouts/{ended[i][1]}/analyze', ended[i][0]))
+    run('details', lambda i: timed('GET', f'/api/workouts/{workouts[user(i)][i % len(workouts[user(i)])]}', user(i)))
+    run('history', lambda i: timed('GET', '/api/workouts/history', user(i)))
+    run('library', lambda i: timed('GET', '/api/workouts/songs/library?limit=20', user(i)))
+    run('feed', lambda i: timed('GET', '/api/social/activity/feed', user(i)))
+    run('top_songs', lambda i: timed('GET', '/api/workouts/top-songs', user(i)))
+
+    os.unlink(db_file)
+
+    report = {
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                    'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'scale': args.scale,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'endpoints': results
+    }
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'Baseline saved to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get('scale'), baseline.get('repeat')) != (args.scale, args.repeat):
+            print(f'Warning: baseline was recorded with scale={baseline.get("scale")} '
+                  f'repeat={baseline.get("repeat")}', file=sys.stderr)
+        problems = compare(baseline, report, args.threshold, args.min_delta_ms)
+        if problems:
+            print(f'\n{len(problems)} regression(s) against {args.baseline}:')
+            for problem in problems:
+                print(f'  {problem}')
+            sys.exit(1)
+        print(f'No regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
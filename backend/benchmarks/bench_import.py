@@ -0,0 +1,104 @@
+"""
+Import Benchmark - samples per second through the wearable importer
+
+Writes synthetic TCX, GPX and CSV exports (many workouts each) to a temp
+directory and imports them into a throwaway SQLite database, timing parse +
+insert separately from file generation.
+
+Usage (from backend/):
+    python -m benchmarks.bench_import --workouts 200 --samples 3600
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TCX_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+            '<Activities>')
+GPX_HEAD = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1" '
+            'xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">')
+
+
+def workout_samples(rnd, start, samples):
+    bpm = 100
+    for i in range(samples):
+        bpm = max(70, min(195, bpm + rnd.randint(-3, 3)))
+        yield (start + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ'), bpm
+
+
+def write_files(directory, workouts, samples, seed=0):
+    rnd = random.Random(seed)
+    starts = [datetime(2020, 1, 1, 7) + timedelta(days=i) for i in range(workouts * 3)]
+
+    with open(os.path.join(directory, 'history.tcx'), 'w') as f:
+        f.write(TCX_HEAD)
+        for start in starts[:workouts]:
+            f.write(f'<Activity Sport="Running"><Id>{start.isoformat()}Z</Id><Lap><Track>')
+            for ts, bpm in workout_samples(rnd, start, samples):
+                f.write(f'<Trackpoint><Time>{ts}</Time><Position><LatitudeDegrees>52.1</LatitudeDegrees>'
+                        f'<LongitudeDegrees>4.3</LongitudeDegrees></Position>'
+                        f'<HeartRateBpm><Value>{bpm}</Value></HeartRateBpm></Trackpoint>')
+            f.write('</Track></Lap></Activity>')
+        f.write('</Activities></TrainingCenterDatabase>')
+
+    with open(os.path.join(directory, 'history.gpx'), 'w') as f:
+        f.write(GPX_HEAD)
+        for start in starts[workouts:workouts * 2]:
+            f.write('<trk><type>cycling</type><trkseg>')
+            for ts, bpm in workout_samples(rnd, start, samples):
+                f.write(f'<trkpt lat="52.1" lon="4.3"><time>{ts}</time><extensions>'
+                        f'<gpxtpx:TrackPointExtension><gpxtpx:hr>{bpm}</gpxtpx:hr>'
+                        f'</gpxtpx:TrackPointExtension></extensions></trkpt>')
+            f.write('</trkseg></trk>')
+        f.write('</gpx>')
+
+    with open(os.path.join(directory, 'history.csv'), 'w') as f:
+        f.write('workout_id,timestamp,bpm\n')
+        for n, start in enumerate(starts[workouts * 2:]):
+            f.writelines(f'{n},{ts},{bpm}\n' for ts, bpm in workout_samples(rnd, start, samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workouts', type=int, default=200, help='Workouts per file format')
+    parser.add_argument('--samples', type=int, default=3600, help='HR samples per workout')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_file = os.path.join(directory, 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+
+    from app import create_app
+    from app.commands import init_db
+    from app.models import User
+    from app.utils.wearable_import import import_file
+
+    print(f'Writing {args.workouts} workouts x {args.samples} samples per format...')
+    write_files(directory, args.workouts, args.samples)
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        from app import db
+        user = User(email='import@bench.dev', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+
+        print(f'{"file":<12} {"MB":>6} {"workouts":>9} {"samples":>10} {"seconds":>8} {"samples/s":>11}')
+        for name in ('history.tcx', 'history.gpx', 'history.csv'):
+            path = os.path.join(directory, name)
+            started = time.perf_counter()
+            with open(path, 'rb') as f:
+                result = import_file(user.id, name, f)
+            elapsed = time.perf_counter() - started
+            print(f'{name:<12} {os.path.getsize(path) / 1e6:6.1f} {result["workouts"]:9d} '
+                  f'{result["samples"]:10d} {elapsed:8.2f} {result["samples"] / elapsed:11,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+JSON Benchmark - CPU time and peak memory of the workout details response
+
+Builds one workout with a lot of heart rate samples in a throwaway SQLite
+database, then renders GET /api/workouts/<id> three ways:
+  - old:      ORM objects -> to_dict() -> Flask's default (sorted stdlib) encoder
+  - buffered: column tuples -> serializers -> FastJSONProvider, one body
+  - streamed: same rows pulled with yield_per and sent in chunks
+
+Usage (from backend/):
+    python -m benchmarks.bench_json --samples 10000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--samples', type=int, default=10000)
+    parser.add_argument('--songs', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+    from flask.json.provider import DefaultJSONProvider
+
+    from app import create_app, db
+    from app.commands import init_db
+    from app.models import WorkoutSession, HeartRateData, SongPlay, Song
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+
+    client = app.test_client()
+    token = client.post('/api/auth/register', json={'email': 'json@bench.dev', 'password': 'pw'})\
+        .get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with app.app_context():
+        start = datetime(2025, 1, 15, 7, 0, 0)
+        workout = WorkoutSession(user_id=1, workout_type='Bench', status='completed',
+                                 start_time=start, end_time=start + timedelta(seconds=args.samples))
+        db.session.add(workout)
+        db.session.flush()
+        workout_id = workout.id
+
+        db.session.execute(db.insert(Song), [
+            {'spotify_id': f'bench{i}', 'title': f'Song {i}', 'artist': 'Bench',
+             'tempo': 100 + i, 'energy': 0.7, 'valence': 0.5, 'duration_ms': 200000}
+            for i in range(args.songs)
+        ])
+        db.session.execute(db.insert(SongPlay), [
+            {'workout_session_id': workout_id, 'song_id': i + 1,
+             'start_time': start + timedelta(seconds=i * 200)}
+            for i in range(args.songs)
+        ])
+        db.session.execute(db.insert(HeartRateData), [
+            {'workout_session_id': workout_id, 'bpm': 100 + i % 80,
+             'timestamp': start + timedelta(seconds=i)}
+            for i in range(args.samples)
+        ])
+        db.session.commit()
+
+    old_encoder = DefaultJSONProvider(app)
+
+    def render_old():
+        # What get_workout_details did before the serializer layer
+        with app.app_context():
+            workout = db.session.get(WorkoutSession, workout_id)
+            hr_data = HeartRateData.query.filter_by(workout_session_id=workout_id)\
+                .order_by(HeartRateData.timestamp).all()
+            song_plays = SongPlay.query.filter_by(workout_session_id=workout_id)\
+                .order_by(SongPlay.start_time).all()
+            body = old_encoder.dumps({
+                'workout': workout.to_dict(),
+                'heart_rate_data': [hr.to_dict() for hr in hr_data],
+                'song_plays': [sp.to_dict() for sp in song_plays]
+            }).encode('utf-8')
+            db.session.remove()
+            return len(body)
+
+    def render_endpoint(threshold):
+        def render():
+            app.config['JSON_STREAM_THRESHOLD'] = threshold
+            response = client.get(f'/api/workouts/{workout_id}', headers=headers, buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            return size
+        return render
+
+    variants = [
+        ('old', render_old),
+        ('buffered', render_endpoint(args.samples + 1)),
+        ('streamed', render_endpoint(0)),
+    ]
+
+    # Streaming must not change the document
+    def fetch(threshold):
+        app.config['JSON_STREAM_THRESHOLD'] = threshold
+        return json.loads(client.get(f'/api/workouts/{workout_id}', headers=headers).data)
+
+    streamed = fetch(0)
+    assert streamed == fetch(args.samples + 1), 'buffered and streamed responses differ'
+    assert len(streamed['heart_rate_data']) == args.samples
+
+    print(f'Workout details with {args.samples} HR samples and {args.songs} songs '
+          f'(median of {args.repeat})')
+    print(f'{"path":<10} {"cpu ms":>8} {"peak MB":>8} {"body KB":>8}')
+
+    for name, render in variants:
+        render()  # Warm up
+
+        cpu = []
+        for _ in range(args.repeat):
+            started = time.process_time()
+            size = render()
+            cpu.append((time.process_time() - started) * 1000)
+
+        tracemalloc.start()
+        render()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f'{name:<10} {statistics.median(cpu):8.1f} {peak / 1e6:8.1f} {size / 1024:8.0f}')
+
+    os.unlink(db_file)
+
+
+if __name__ == '__main__':
+    main()
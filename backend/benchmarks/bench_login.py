@@ -0,0 +1,101 @@
+"""
+Login Benchmark - login throughput and HR ingest latency during a login spike
+
+Runs against a throwaway SQLite database through Flask's test client, with
+several threads hammering /api/auth/login while one athlete keeps posting
+heart rate readings. Compare runs with different BCRYPT_POOL_SIZE values.
+
+Usage (from backend/):
+    python -m benchmarks.bench_login --login-threads 8 --seconds 10 --pool-size 2
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--pool-size', type=int, default=2, help='BCRYPT_POOL_SIZE')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.rounds)
+    os.environ['BCRYPT_POOL_SIZE'] = str(args.pool_size)
+    os.environ['BCRYPT_MAX_PENDING'] = str(max(args.login_threads * 2, 32))
+
+    from app import create_app
+
+    from app.commands import init_db
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+
+    # One account for the login storm, one athlete with an active workout
+    setup = app.test_client()
+    setup.post('/api/auth/register', json={'email': 'storm@bench.dev', 'password': 'pw'})
+    token = setup.post('/api/auth/register', json={'email': 'athlete@bench.dev', 'password': 'pw'})\
+        .get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    workout_id = setup.post('/api/workouts/start', headers=headers, json={'workout_type': 'Bench'})\
+        .get_json()['workout']['id']
+
+    def ingest(samples, stop):
+        client = app.test_client()
+        bpm = 120
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.post(f'/api/workouts/{workout_id}/heartrate', headers=headers, json={'bpm': bpm})
+            samples.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    def login(counter, errors, stop):
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post('/api/auth/login', json={'email': 'storm@bench.dev', 'password': 'pw'})
+            if response.status_code == 200:
+                counter.append(1)
+            else:
+                errors.append(response.status_code)
+
+    def run(login_threads):
+        stop = threading.Event()
+        ingest_ms, logins, errors = [], [], []
+        threads = [threading.Thread(target=ingest, args=(ingest_ms, stop))]
+        threads += [threading.Thread(target=login, args=(logins, errors, stop)) for _ in range(login_threads)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return ingest_ms, len(logins), errors
+
+    print(f'bcrypt rounds={args.rounds} pool_size={args.pool_size} cpus={os.cpu_count()}')
+    print('-' * 60)
+    for label, login_threads in (('idle', 0), ('login spike', args.login_threads)):
+        ingest_ms, logins, errors = run(login_threads)
+        print(f'{label:12} | logins/s {logins / args.seconds:6.1f} | rejected {len(errors):4} | '
+              f'ingest p50 {statistics.median(ingest_ms):6.1f} ms  p95 {percentile(ingest_ms, 95):6.1f} ms  '
+              f'p99 {percentile(ingest_ms, 99):6.1f} ms  (n={len(ingest_ms)})')
+
+    os.unlink(db_file)
+
+
+if __name__ == '__main__':
+    main()
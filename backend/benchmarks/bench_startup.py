@@ -0,0 +1,88 @@
+"""
+Startup Benchmark - time-to-first-request for one and for N app processes
+
+Each process imports the app, calls create_app() and serves GET /health and
+GET /api/profiles/presets through the test client, reporting how long each
+step took. N processes are started at the same moment to mimic a gunicorn
+master booting N workers against the same database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --workers 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+WORKER_SCRIPT = r'''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/health')
+first = time.perf_counter()
+client.get('/api/profiles/presets')
+first_db = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - started) * 1000,
+    'first_db_request_ms': (first_db - started) * 1000,
+}))
+'''
+
+
+def run_workers(count, env):
+    """Start `count` processes at once; returns (wall ms, per-process timings)"""
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT], env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(count)
+    ]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in processes]
+    return (time.perf_counter() - started) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_file}', PYTHONPATH=backend_dir)
+
+    # One-time bootstrap, like a deploy step
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run.py', 'init-db'],
+                   cwd=backend_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    for count in (1, args.workers):
+        walls, timings = [], []
+        for _ in range(args.repeat):
+            wall, results = run_workers(count, env)
+            walls.append(wall)
+            timings.extend(results)
+
+        def median(key):
+            return statistics.median(t[key] for t in timings)
+
+        print(f'{count} worker(s): all ready in {statistics.median(walls):7.1f} ms | '
+              f'import {median("import_ms"):6.1f} ms | create_app {median("create_app_ms"):5.1f} ms | '
+              f'first request {median("first_request_ms"):6.1f} ms | '
+              f'first DB request {median("first_db_request_ms"):6.1f} ms')
+
+    os.unlink(db_file)
+
+
+if __name__ == '__main__':
+    main()
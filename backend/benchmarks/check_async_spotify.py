@@ -0,0 +1,138 @@
+"""
+Async Spotify Check - Fails when in-flight Spotify calls hold database connections
+
+Serves the app through FlaskASGI (no server needed) with Spotify stubbed by
+an httpx transport that answers after --latency seconds, then fires more
+concurrent audio-features / currently-playing / callback requests than the
+SQLite pool has connections (SQLITE_POOL_SIZE + SQLITE_MAX_OVERFLOW). A view
+that keeps its connection while it awaits Spotify exhausts the pool: the
+next request blocks the event loop in pool checkout and the run times out.
+Exits 1 on any non-200 response or if the burst takes longer than --max-seconds.
+
+Usage (from backend/):
+    python -m benchmarks.check_async_spotify [--requests 64] [--latency 1]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=64, help='Concurrent requests in the burst')
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds the Spotify stub takes to answer')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='Fail if the burst takes longer')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+    os.environ['SQLITE_POOL_TIMEOUT'] = '3'  # Fail fast instead of hanging on an exhausted pool
+
+    import httpx
+
+    from app import create_app, db
+    from app.commands import init_db
+    from app.models import Song, User
+    from app.routes import spotify
+    from app.utils.asgi import FlaskASGI
+    from app.utils.user_cache import user_cache
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+    pool_limit = app.config['SQLITE_POOL_SIZE'] + app.config['SQLITE_MAX_OVERFLOW']
+
+    client = app.test_client()
+    body = client.post('/api/auth/register', json={'email': 'async@bench.dev', 'password': 'pw'}).get_json()
+    user_id = body['user']['id']
+    headers = [(b'authorization', f'Bearer {body["access_token"]}'.encode())]
+    with app.app_context():
+        db.session.get(User, user_id).spotify_access_token = 'stub'
+        db.session.add(Song(spotify_id='known', title='Known', artist='Bench', tempo=120))
+        db.session.commit()
+
+    async def spotify_stub(request):
+        await asyncio.sleep(args.latency)
+        path = request.url.path
+        if path.endswith('/api/token'):
+            return httpx.Response(200, json={'access_token': 'stub', 'refresh_token': 'stub'})
+        if path.endswith('/currently-playing'):
+            return httpx.Response(204)
+        if '/audio-features/' in path:
+            return httpx.Response(200, json={'tempo': 128.0, 'energy': 0.8, 'valence': 0.6, 'danceability': 0.7,
+                                             'acousticness': 0.1, 'instrumentalness': 0.0, 'loudness': -5.0,
+                                             'speechiness': 0.05})
+        track_id = path.rsplit('/', 1)[-1]
+        return httpx.Response(200, json={'id': track_id, 'name': track_id, 'artists': [{'name': 'Stub'}],
+                                         'album': {'name': 'Stub'}, 'duration_ms': 200000,
+                                         'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'}})
+
+    new_client = spotify._new_http_client
+
+    def stubbed_client():
+        stubbed = new_client()
+        stubbed._transport = httpx.MockTransport(spotify_stub)
+        return stubbed
+
+    spotify._new_http_client = stubbed_client
+    asgi = FlaskASGI(app)
+
+    async def call(path, query=b'', authorized=True):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query,
+                 'headers': headers if authorized else []}
+        await asgi(scope, receive, send)
+        return sent[0]['status'], b''.join(m.get('body', b'') for m in sent[1:])
+
+    def request_for(i):
+        kind = i % 4
+        if kind == 0:
+            return call('/api/spotify/audio-features/known')
+        if kind == 1:
+            return call(f'/api/spotify/audio-features/new{i}')  # Inserts a song after the Spotify calls
+        if kind == 2:
+            return call('/api/spotify/currently-playing')
+        return call('/api/spotify/callback', f'code=stub&state={user_id}'.encode(), authorized=False)
+
+    async def burst():
+        user_cache.clear()  # The first requests look the user up in the database
+        return await asyncio.wait_for(
+            asyncio.gather(*(request_for(i) for i in range(args.requests))),
+            timeout=args.max_seconds * 3
+        )
+
+    print(f'{args.requests} concurrent Spotify requests, stub latency {args.latency:.1f}s, '
+          f'database pool {pool_limit} connections')
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(burst())
+    except asyncio.TimeoutError:
+        print('FAIL: burst never finished - the event loop is stuck waiting for database connections')
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    failures = [(status, json.loads(body or b'{}')) for status, body in results if status != 200]
+    print(f'{len(results) - len(failures)}/{len(results)} OK in {elapsed:.2f}s')
+    for status, payload in failures[:5]:
+        print(f'  HTTP {status}: {payload}')
+
+    if failures or elapsed > args.max_seconds:
+        print('FAIL' + (f': took longer than {args.max_seconds:.0f}s' if not failures else ''))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Query Budget Check - Fails when an endpoint goes over its @query_budget or
+runs the same statement once per row (N+1)
+
+Seeds a throwaway SQLite database with a user, friends, pending requests,
+friends' workouts and a full workout of their own (enough rows that an N+1
+shows up as a repeated statement), then calls every endpoint with
+QUERY_BUDGET_CHECKS=raise. Prints the query count of each call next to its
+budget and exits 1 on any violation, or if a budgeted endpoint was never
+called - so it can gate CI:
+
+Usage (from backend/):
+    python -m benchmarks.check_query_budgets [--verbose]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+FRIENDS = 6  # Accepted friends, each with a workout in the feed
+PENDING = 6  # Pending requests to the main user
+SONGS = 12
+HR_SAMPLES = 180
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--verbose', '-v', action='store_true', help='List the statements each request ran')
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file}'
+    os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+    os.environ['QUERY_BUDGET_CHECKS'] = 'raise'
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import create_app, db
+    from app.commands import init_db
+    from app.models import WorkoutSession, HeartRateData, Song, Friendship
+    from app.utils.hr_shards import hr_execute
+    from app.utils.query_budget import QueryBudgetExceeded, statement_shape
+
+    app = create_app()
+    app.testing = True  # Let QueryBudgetExceeded propagate out of the test client
+    with app.app_context():
+        init_db()
+
+    client = app.test_client()
+
+    def register(email):
+        response = client.post('/api/auth/register', json={'email': email, 'password': 'pw',
+                                                            'name': email.split('@')[0], 'age': 30})
+        body = response.get_json()
+        return body['user']['id'], {'Authorization': f'Bearer {body["access_token"]}'}
+
+    user_id, headers = register('budget@bench.dev')
+    others = [register(f'friend{i}@bench.dev')[0] for i in range(FRIENDS + PENDING)]
+    register('stranger@bench.dev')
+
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.execute(db.insert(Friendship), [
+            {'user_id': other, 'friend_id': user_id,
+             'status': 'accepted' if i < FRIENDS else 'pending',
+             'accepted_at': now if i < FRIENDS else None}
+            for i, other in enumerate(others)
+        ])
+        db.session.execute(db.insert(WorkoutSession), [
+            {'user_id': other, 'workout_type': 'Running', 'status': 'completed',
+             'start_time': now - timedelta(hours=i + 2), 'end_time': now - timedelta(hours=i + 1),
+             'avg_heart_rate': 140, 'max_heart_rate': 170}
+            for i, other in enumerate(others[:FRIENDS])
+        ])
+        db.session.execute(db.insert(Song), [
+            {'spotify_id': f'budget{i}', 'title': f'Song {i}', 'artist': 'Bench',
+             'tempo': 90 + i * 5, 'energy': 0.5 + i / 50, 'valence': 0.5, 'danceability': 0.6,
+             'acousticness': 0.1, 'instrumentalness': 0.0, 'loudness': -6.0, 'speechiness': 0.05,
+             'duration_ms': 200000}
+            for i in range(SONGS)
+        ])
+        db.session.commit()
+
+    results = []  # (label, endpoint, statements, budget, problem)
+    statements = []
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement_shape(statement))
+
+    def call(method, url, label=None, **kwargs):
+        statements.clear()
+        problem = None
+        response = None
+        try:
+            response = client.open(url, method=method, headers=headers, **kwargs)
+        except QueryBudgetExceeded as exc:
+            problem = str(exc)
+        except Exception as exc:  # Testing mode re-raises view errors
+            problem = f'{type(exc).__name__}: {exc}'
+        endpoint = app.url_map.bind('localhost').match(url.split('?')[0], method=method)[0]
+        budget = getattr(app.view_functions[endpoint], 'query_budget', None)
+        if problem is None and response.status_code >= 500:
+            problem = f'HTTP {response.status_code}'
+        results.append((label or f'{method} {url}', endpoint, list(statements), budget, problem))
+        return response
+
+    # A live workout, start to finish
+    workout_id = call('POST', '/api/workouts/start',
+                      json={'workout_type': 'HIIT', 'workout_profile_name': 'HIIT'}).get_json()['workout']['id']
+    with app.app_context():
+        start = datetime.utcnow() - timedelta(seconds=HR_SAMPLES * 10)
+        db.session.get(WorkoutSession, workout_id).start_time = start
+        hr_execute(user_id, db.insert(HeartRateData), [
+            {'workout_session_id': workout_id, 'bpm': 100 + (i * 7) % 70,
+             'timestamp': start + timedelta(seconds=i * 10)}
+            for i in range(HR_SAMPLES - 1)
+        ])
+        db.session.commit()
+
+    call('POST', f'/api/workouts/{workout_id}/heartrate', json={'bpm': 150})
+    for i in range(SONGS):
+        call('POST', f'/api/workouts/{workout_id}/song', label=f'POST /api/workouts/{workout_id}/song',
+             json={'spotify_id': f'budget{i}', 'title': f'Song {i}', 'artist': 'Bench',
+                   'start_time': (start + timedelta(seconds=i * 150)).isoformat()})
+    call('POST', f'/api/workouts/{workout_id}/transition', json={'new_workout_type': 'Cooldown'})
+    call('GET', f'/api/workouts/{workout_id}/next-song')
+    call('GET', '/api/workouts/active')
+    call('POST', f'/api/workouts/{workout_id}/end')
+    call('POST', f'/api/workouts/{workout_id}/analyze')
+    call('POST', f'/api/workouts/{workout_id}/analyze', label=f'POST /api/workouts/{workout_id}/analyze (stored)')
+    call('GET', f'/api/workouts/{workout_id}')
+    call('GET', '/api/workouts/history')
+    call('GET', '/api/workouts/export')
+    call('GET', '/api/workouts/top-songs')
+    call('GET', '/api/workouts/top-songs?type=cooldown')
+    call('GET', '/api/workouts/recommendations')
+    call('GET', '/api/workouts/stats/dashboard')
+    call('GET', '/api/workouts/stats/trends?period=day&count=7')
+    call('GET', '/api/workouts/songs/library')
+    call('GET', '/api/workouts/songs/1/similar')
+    call('POST', '/api/workouts/songs/nearest', json={'features': {
+        'tempo': 120, 'energy': 0.7, 'valence': 0.5, 'danceability': 0.6,
+        'acousticness': 0.1, 'instrumentalness': 0.0, 'loudness': -6, 'speechiness': 0.05
+    }})
+
+    # Profiles
+    call('GET', '/api/profiles/')
+    call('GET', '/api/profiles/presets')
+    call('GET', '/api/profiles/custom')
+    profile_id = call('POST', '/api/profiles/', json={'name': 'Budget', 'target_zone_min': 70,
+                                                      'target_zone_max': 85}).get_json()['profile']['id']
+    call('GET', f'/api/profiles/{profile_id}')
+    call('PUT', f'/api/profiles/{profile_id}', json={'name': 'Budget 2'})
+    call('POST', f'/api/profiles/{profile_id}/playlist', json={'duration_minutes': 30})
+    call('DELETE', f'/api/profiles/{profile_id}')
+
+    # Social
+    call('GET', '/api/social/friends')
+    call('GET', '/api/social/friends/requests')
+    call('GET', '/api/social/activity/feed')
+    call('GET', '/api/social/users/search?q=friend')
+    call('POST', f'/api/social/workouts/{workout_id}/share')
+    call('POST', '/api/social/friends/add', json={'email': 'stranger@bench.dev'})
+    with app.app_context():
+        pending = [f.id for f in Friendship.query.filter_by(friend_id=user_id, status='pending')]
+    call('POST', f'/api/social/friends/accept/{pending[0]}')
+    call('POST', f'/api/social/friends/reject/{pending[1]}')
+    call('DELETE', f'/api/social/friends/remove/{others[0]}')
+
+    # Auth
+    call('GET', '/api/auth/me')
+
+    os.unlink(db_file)
+
+    # Report
+    failures = []
+    called = set()
+    print(f'{"request":60} {"queries":>7} {"budget":>6}')
+    for label, endpoint, ran, budget, problem in results:
+        called.add(endpoint)
+        print(f'{label[:60]:60} {len(ran):>7} {budget if budget is not None else "-":>6}'
+              + (f'  FAIL {problem}' if problem else ''))
+        if args.verbose:
+            for shape in ran:
+                print(f'    {shape[:150]}')
+        if problem:
+            failures.append(label)
+
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, 'query_budget')}
+    for endpoint in sorted(budgeted - called):
+        print(f'{endpoint}: has a query budget but was never called')
+        failures.append(endpoint)
+
+    if failures:
+        print(f'\n{len(failures)} query budget failure(s)')
+        sys.exit(1)
+    print(f'\nAll {len(results)} requests within budget ({len(budgeted)} budgeted endpoints)')
+
+
+if __name__ == '__main__':
+    main()
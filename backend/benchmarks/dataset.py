@@ -0,0 +1,516 @@
+"""
+Synthetic Dataset - Production-shaped data for benchmarks and profiling
+
+Fills an empty database with users, a song catalog, friendships and a
+workout history ending today, all from one seed (same seed + volumes = same
+rows apart from the bcrypt salt, shifted to the build day):
+  - songs:       audio features drawn from Spotify-like distributions
+                 (energy/loudness correlated, acousticness against them),
+                 hype score and zone computed like the app does
+  - friendships: preferential attachment, so friend counts follow a power
+                 law - a few very connected users, most with a handful
+  - workouts:    per-user activity is skewed too; each workout has a heart
+                 rate curve (warmup, intervals or steady state, cooldown,
+                 lag and noise), a song every ~3 minutes picked from a
+                 power-law popularity, and is analyzed - song plays,
+                 SongStats and hourly HR aggregates are filled in with the
+                 app's own analysis functions
+
+Rows go in with bulk executemany batches and explicit ids (straight to the
+driver on SQLite), never one ORM object at a time. Users, songs and
+friendships take about a minute at 100k/1M; workouts are bound by building
+the heart rate curves (~60k samples/s on one core), so size them with
+--workouts and --hr-interval. Every user's password is PASSWORD, emails are
+user<id>@bench.dev.
+
+Usage (from backend/):
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.dataset --scale small
+    python -m benchmarks.dataset --database-url sqlite:////tmp/big.db --scale large --workouts 5
+"""
+
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+PASSWORD = 'benchmark'
+BATCH_SIZE = 20000  # Rows per executemany
+
+# Preset volumes - any of them can be overridden on the command line
+SCALES = {
+    'tiny': dict(users=200, songs=5000, friends=8, workouts=4, days=60, hr_interval=5),
+    'small': dict(users=2000, songs=50000, friends=12, workouts=6, days=90, hr_interval=5),
+    'medium': dict(users=20000, songs=250000, friends=16, workouts=8, days=180, hr_interval=5),
+    'large': dict(users=100000, songs=1000000, friends=20, workouts=10, days=365, hr_interval=10),
+}
+
+# workout_type -> (low % max HR, high % max HR, seconds per work/rest interval or None for steady)
+WORKOUT_TYPES = {
+    'HIIT': (0.72, 0.92, 60),
+    'Running': (0.74, 0.84, None),
+    'Cycling': (0.68, 0.80, None),
+    'Strength': (0.58, 0.76, 45),
+    'Yoga': (0.50, 0.62, None),
+}
+WORKOUT_TYPE_WEIGHTS = (3, 4, 2, 3, 1)
+WORKOUT_MINUTES = {'HIIT': (20, 40), 'Running': (25, 70), 'Cycling': (40, 90), 'Strength': (35, 70), 'Yoga': (30, 60)}
+HOUR_WEIGHTS = [0] * 5 + [2, 6, 8, 5, 3, 2, 2, 4, 3, 2, 2, 3, 6, 8, 7, 5, 3, 1, 0]  # Start hour, UTC
+
+
+def heart_rate_curve(rnd, minutes, resting_hr, max_hr, workout_type, interval=1):
+    """
+    Yield (seconds since start, bpm) every `interval` seconds of a workout
+
+    Warmup ramp over the first ~12%, then work/rest intervals (HIIT, Strength)
+    or a slowly drifting steady state, then a cooldown. The heart follows
+    its target with a ~20s lag plus beat-to-beat noise.
+    """
+    low, high, period = WORKOUT_TYPES[workout_type]
+    effort = rnd.uniform(-0.04, 0.04)  # Good day / bad day
+    low, high = (low + effort) * max_hr, (high + effort) * max_hr
+    total = int(minutes * 60)
+    warmup_end = total * 0.12
+    cooldown_start = total * 0.88
+    drift_phase = rnd.uniform(0, 2 * math.pi)
+    follow = min(1.0, interval / 20)
+
+    bpm = resting_hr + rnd.uniform(5, 15)
+    for t in range(0, total, interval):
+        if t < warmup_end:
+            target = resting_hr + (low - resting_hr) * t / warmup_end
+        elif t >= cooldown_start:
+            target = low - (low - resting_hr - 20) * (t - cooldown_start) / (total - cooldown_start)
+        elif period:
+            target = high if (t // period) % 2 == 0 else low
+        else:
+            target = (low + high) / 2 + (high - low) / 2 * math.sin(t / 300 + drift_phase)
+
+        bpm += (target - bpm) * follow + rnd.gauss(0, 1.2)
+        yield t, int(round(min(max(bpm, 40), max_hr + 5)))
+
+
+def _clip(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def song_features(rnd):
+    """One song's audio features, roughly shaped like Spotify's catalog"""
+    from app.models.song import compute_hype_score, zone_for_hype_score
+
+    energy = rnd.betavariate(2.4, 1.6)
+    tempo = _clip(rnd.gauss(118 + 20 * energy, 24), 55, 210)
+    if rnd.random() < 0.08:
+        tempo = _clip(tempo * rnd.choice((0.5, 2.0)), 55, 210)  # Half/double time detections
+    valence = _clip(rnd.betavariate(2, 2) * 0.8 + energy * 0.2, 0, 1)
+    acousticness = _clip(rnd.betavariate(0.7, 2.2) * (1.3 - energy), 0, 1)
+    features = {
+        'tempo': round(tempo, 3),
+        'energy': round(energy, 4),
+        'valence': round(valence, 4),
+        'danceability': round(rnd.betavariate(4, 2.5), 4),
+        'acousticness': round(acousticness, 4),
+        'instrumentalness': round(rnd.betavariate(0.4, 12) if rnd.random() < 0.8 else rnd.betavariate(3, 1), 4),
+        'loudness': round(_clip(-13 + 10 * energy + rnd.gauss(0, 2.5), -40, 0), 3),
+        'speechiness': round(rnd.betavariate(1, 14), 4),
+    }
+    hype = compute_hype_score(energy, tempo, valence)
+    return features, hype, zone_for_hype_score(hype)
+
+
+def popular_index(rnd, n):
+    """0..n-1, where index i is picked ~1/(i+1) as often as index 0 (Zipf-like popularity)"""
+    return min(int(n ** rnd.random()) - 1, n - 1)
+
+
+class Loader:
+    """Batched executemany inserts with explicit ids"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.sqlite = connection.dialect.name == 'sqlite'
+        self.counts = {}
+
+    def value(self, moment):
+        # SQLite stores datetimes as text - formatting in C beats SQLAlchemy's
+        # per-value processor by far (same trick as wearable_import)
+        if self.sqlite and moment is not None:
+            return moment.isoformat(' ', 'microseconds')
+        return moment
+
+    def insert(self, table, columns, rows):
+        """rows: list of tuples in `columns` order"""
+        if not rows:
+            return
+        if self.sqlite:
+            sql = (f'INSERT INTO {table.name} ({", ".join(columns)}) '
+                   f'VALUES ({", ".join("?" * len(columns))})')
+            for start in range(0, len(rows), BATCH_SIZE):
+                self.connection.exec_driver_sql(sql, rows[start:start + BATCH_SIZE])
+        else:
+            statement = table.insert()
+            for start in range(0, len(rows), BATCH_SIZE):
+                self.connection.execute(statement, [dict(zip(columns, row))
+                                                    for row in rows[start:start + BATCH_SIZE]])
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+
+
+def generate_users(loader, volumes, seed, now):
+    """Users 1..N with ages and resting heart rates; returns {user_id: (age, resting_hr)}"""
+    from app.models import User
+    from app.utils.passwords import hash_password
+
+    rnd = random.Random(f'{seed}-users')
+    password_hash = hash_password(PASSWORD)  # One bcrypt for everybody
+    people = {}
+    rows = []
+    for user_id in range(1, volumes['users'] + 1):
+        age = int(_clip(rnd.gauss(34, 11), 16, 75))
+        resting = int(_clip(rnd.gauss(64, 8), 45, 90))
+        people[user_id] = (age, resting)
+        created = now - timedelta(days=volumes['days'] + rnd.randint(1, 700))
+        rows.append((user_id, f'user{user_id}@bench.dev', password_hash, f'Athlete {user_id}', age,
+                     resting, 'spotify', loader.value(created), True))
+
+    loader.insert(User.__table__, ('id', 'email', 'password_hash', 'name', 'age', 'resting_heart_rate',
+                                   'preferred_music_service', 'created_at', 'is_active'), rows)
+    return people
+
+
+def generate_songs(loader, volumes, seed, now):
+    """Songs 1..N; returns {song_id: duration_ms}"""
+    from app.models import Song
+
+    rnd = random.Random(f'{seed}-songs')
+    artists = max(1, volumes['songs'] // 8)
+    durations = {}
+    rows = []
+    created = loader.value(now - timedelta(days=volumes['days'] + 30))
+    columns = ('id', 'spotify_id', 'title', 'artist', 'album', 'duration_ms', 'external_url', 'tempo',
+               'energy', 'valence', 'danceability', 'acousticness', 'instrumentalness', 'loudness',
+               'speechiness', 'hype_score', 'auto_category_zone', 'created_at', 'audio_features_fetched_at')
+
+    for song_id in range(1, volumes['songs'] + 1):
+        f, hype, zone = song_features(rnd)
+        duration = int(_clip(rnd.gauss(205000, 45000), 90000, 480000))
+        durations[song_id] = duration
+        artist = popular_index(rnd, artists) + 1
+        spotify_id = f'syn{song_id:019d}'
+        rows.append((song_id, spotify_id, f'Track {song_id}', f'Artist {artist}', f'Album {artist}-{song_id % 7}',
+                     duration, f'https://open.spotify.com/track/{spotify_id}', f['tempo'], f['energy'],
+                     f['valence'], f['danceability'], f['acousticness'], f['instrumentalness'], f['loudness'],
+                     f['speechiness'], hype, zone, created, created))
+        if len(rows) >= BATCH_SIZE:
+            loader.insert(Song.__table__, columns, rows)
+            rows = []
+
+    loader.insert(Song.__table__, columns, rows)
+    return durations
+
+
+def generate_friendships(loader, volumes, seed, now):
+    """Preferential attachment: each new user befriends ~friends/2 users picked by their friend count"""
+    from app.models import Friendship
+
+    rnd = random.Random(f'{seed}-friends')
+    per_user = max(1, volumes['friends'] // 2)
+    endpoints = []  # Every friendship adds both users once, so picks are degree-weighted
+    rows = []
+    friendship_id = 0
+
+    for user_id in range(1, volumes['users'] + 1):
+        if endpoints:
+            targets = set()
+            for _ in range(min(per_user, user_id - 1) * 2):  # A few tries to find distinct people
+                targets.add(rnd.choice(endpoints))
+                if len(targets) == per_user:
+                    break
+        else:
+            targets = set()
+
+        for friend_id in sorted(targets):
+            friendship_id += 1
+            created = now - timedelta(days=rnd.uniform(0, volumes['days']))
+            pending = rnd.random() < 0.05
+            accepted = None if pending else loader.value(created + timedelta(hours=rnd.uniform(0, 48)))
+            rows.append((friendship_id, user_id, friend_id, 'pending' if pending else 'accepted',
+                         loader.value(created), accepted))
+            endpoints += (user_id, friend_id)
+        if not targets:
+            endpoints.append(user_id)  # So the first users can be picked at all
+
+    loader.insert(Friendship.__table__, ('id', 'user_id', 'friend_id', 'status', 'created_at', 'accepted_at'), rows)
+
+
+class _Play:
+    """Just enough of a SongPlay for analyze_song_play()"""
+    __slots__ = ('id', 'song_id', 'start_time', 'end_time')
+
+    def __init__(self, play_id, song_id, start_time, end_time):
+        self.id = play_id
+        self.song_id = song_id
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+class _Workout:
+    __slots__ = ('start_time', 'end_time')
+
+    def __init__(self, start_time, end_time):
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+def generate_workouts(loader, volumes, seed, now, people, durations, log, hr_loader):
+    """
+    Workouts with heart rate, song plays, analysis results and HR aggregates
+    hr_loader(user_id) is the Loader for that user's heart rate shard
+    """
+    from app.models import WorkoutSession, HeartRateData, SongPlay, SongStats, HeartRateAggregate
+    from app.utils.heart_rate_store import HeartRateSample
+    from app.utils.hr_aggregates import bucket_readings
+    from app.utils.workout_analysis import analyze_song_play
+
+    catalog = len(durations)
+    types = list(WORKOUT_TYPES)
+    ids = {'workout': 0, 'hr': 0, 'play': 0, 'stats': 0}
+    pending = {'workouts': [], 'plays': [], 'stats': [], 'aggregates': []}
+    pending_hr = {}  # Loader -> rows, one per shard
+
+    columns = {
+        'workouts': (WorkoutSession.__table__, ('id', 'user_id', 'start_time', 'end_time', 'workout_type',
+                                                'workout_profile_name', 'status', 'avg_heart_rate',
+                                                'max_heart_rate', 'min_heart_rate', 'created_at', 'analyzed_at')),
+        'plays': (SongPlay.__table__, ('id', 'workout_session_id', 'song_id', 'start_time', 'end_time',
+                                       'avg_bpm_during_song', 'max_bpm_during_song', 'bpm_change',
+                                       'song_position_in_workout', 'created_at')),
+        'stats': (SongStats.__table__, ('id', 'user_id', 'song_id', 'times_played_during_workout',
+                                        'avg_bpm_response', 'personal_hype_score', 'personal_cooldown_score',
+                                        'last_played_at', 'created_at')),
+        'aggregates': (HeartRateAggregate.__table__, ('user_id', 'bucket_start', 'sample_count', 'bpm_sum',
+                                                      'min_bpm', 'max_bpm', 'zone1_seconds', 'zone2_seconds',
+                                                      'zone3_seconds', 'zone4_seconds', 'zone5_seconds')),
+    }
+
+    def flush():
+        for key, rows in pending.items():
+            table, names = columns[key]
+            loader.insert(table, names, rows)
+            rows.clear()
+        for shard_loader, rows in pending_hr.items():
+            shard_loader.insert(HeartRateData.__table__, ('id', 'workout_session_id', 'timestamp', 'bpm', 'created_at'), rows)
+            rows.clear()
+
+    started = time.perf_counter()
+    for user_id, (age, resting) in people.items():
+        rnd = random.Random(f'{seed}-workouts-{user_id}')
+        max_hr = 220 - age
+        # Activity is skewed too: most users log a few workouts, some log a lot
+        count = int(volumes['workouts'] * rnd.paretovariate(2.5) / 1.67)
+        taste = [popular_index(rnd, catalog) + 1 for _ in range(60)]  # Songs this user keeps coming back to
+
+        days = sorted(rnd.uniform(0, volumes['days']) for _ in range(count))
+        stats = {}  # song_id -> [plays, bpm_sum, hype_sum, cooldown_sum, last_played]
+        user_buckets = {}
+
+        for day in reversed(days):
+            workout_type = rnd.choices(types, WORKOUT_TYPE_WEIGHTS)[0]
+            minutes = rnd.uniform(*WORKOUT_MINUTES[workout_type])
+            date = (now - timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
+            start = date + timedelta(hours=rnd.choices(range(24), HOUR_WEIGHTS)[0], seconds=rnd.randint(0, 3599))
+            if start + timedelta(minutes=minutes) > now:
+                start = now - timedelta(minutes=minutes + 5)
+            end = start + timedelta(minutes=minutes)
+
+            ids['workout'] += 1
+            workout_id = ids['workout']
+            samples = []
+            for offset, bpm in heart_rate_curve(rnd, minutes, resting, max_hr, workout_type, volumes['hr_interval']):
+                ids['hr'] += 1
+                samples.append(HeartRateSample(ids['hr'], workout_id, start + timedelta(seconds=offset), bpm))
+
+            # A song every ~3 minutes, mostly from the user's favourites
+            plays = []
+            moment = start + timedelta(seconds=rnd.randint(0, 30))
+            while moment < end:
+                song_id = rnd.choice(taste) if rnd.random() < 0.6 else popular_index(rnd, catalog) + 1
+                ids['play'] += 1
+                finish = min(moment + timedelta(milliseconds=durations[song_id]), end)
+                plays.append(_Play(ids['play'], song_id, moment, finish))
+                moment = finish + timedelta(seconds=rnd.randint(1, 8))
+
+            # Analyze it the way the app would
+            bpms = [s.bpm for s in samples]
+            baseline = [s.bpm for s in samples if s.timestamp <= start + timedelta(seconds=min(120, minutes * 12))]
+            baseline_bpm = sum(baseline) / len(baseline) if baseline else None
+            workout = _Workout(start, end)
+            analyzed_at = end + timedelta(minutes=rnd.randint(1, 10))
+
+            for play in plays:
+                analysis = analyze_song_play(play, samples, baseline_bpm, workout, songs={})
+                if analysis:
+                    row = stats.get(play.song_id)
+                    if row is None:
+                        row = stats[play.song_id] = [0, 0, 0, 0, analyzed_at]
+                    row[0] += 1
+                    row[1] += analysis['avg_bpm']
+                    row[2] += analysis['hype_score']
+                    row[3] += analysis['cooldown_score']
+                    row[4] = analyzed_at
+                    fields = (analysis['avg_bpm'], analysis['max_bpm'], int(analysis['bpm_change']), analysis['position'])
+                else:
+                    fields = (None, None, None, None)
+                pending['plays'].append((play.id, workout_id, play.song_id, loader.value(play.start_time),
+                                         loader.value(play.end_time), *fields, loader.value(play.start_time)))
+
+            pending['workouts'].append((workout_id, user_id, loader.value(start), loader.value(end), workout_type,
+                                        workout_type, 'analyzed', sum(bpms) // len(bpms), max(bpms), min(bpms),
+                                        loader.value(start), loader.value(analyzed_at)))
+            created = loader.value(end)
+            pending_hr.setdefault(hr_loader(user_id), []).extend(
+                (s.id, workout_id, loader.value(s.timestamp), s.bpm, created) for s in samples
+            )
+
+            for hour, bucket in bucket_readings([(s.timestamp, s.bpm) for s in samples], max_hr).items():
+                total = user_buckets.get(hour)
+                if total is None:
+                    user_buckets[hour] = bucket
+                else:
+                    total[0] += bucket[0]
+                    total[1] += bucket[1]
+                    total[2] = min(total[2], bucket[2])
+                    total[3] = max(total[3], bucket[3])
+                    for z in range(4, 9):
+                        total[z] += bucket[z]
+
+        for song_id, (plays_count, bpm_sum, hype_sum, cooldown_sum, last_played) in sorted(stats.items()):
+            ids['stats'] += 1
+            pending['stats'].append((ids['stats'], user_id, song_id, plays_count, bpm_sum / plays_count,
+                                     hype_sum / plays_count, cooldown_sum / plays_count,
+                                     loader.value(last_played), loader.value(last_played)))
+        for hour, (count_, bpm_sum, low, high, *zones) in sorted(user_buckets.items()):
+            pending['aggregates'].append((user_id, loader.value(hour), count_, bpm_sum, low, high,
+                                          *(round(seconds) for seconds in zones)))
+
+        if sum(len(rows) for rows in pending_hr.values()) >= BATCH_SIZE * 5:
+            flush()
+        if user_id % 1000 == 0:
+            log(f'  workouts: {user_id}/{len(people)} users, {ids["workout"]} workouts, '
+                f'{ids["hr"]} HR samples ({time.perf_counter() - started:.0f}s)')
+
+    flush()
+
+
+def _sync_sequences(connection, loaded):
+    """Explicit ids don't advance PostgreSQL sequences - move them past the data"""
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in ('users', 'songs', 'friendships', 'workout_sessions', 'heart_rate_data', 'song_plays', 'song_stats'):
+        if table not in loaded:
+            continue  # Not in this database (heart rate shards)
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        )
+
+
+def generate(volumes, seed=42, log=print):
+    """
+    Fill the (empty) database of the current app context
+
+    Args:
+        volumes: dict like SCALES['small']
+        seed: Same seed + volumes = same data
+
+    Returns:
+        {table name: rows inserted}
+    """
+    from app import db
+    from app.models import User
+    from app.utils.hr_shards import hr_connection
+
+    if db.session.query(User.id).first():
+        raise RuntimeError('The database already has users - generate into an empty database')
+
+    # History ends at the build day (feeds and dashboards look at the last N days),
+    # so rows are identical apart from that shift
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    connection = db.session.connection()
+    loader = Loader(connection)
+    loaders = {connection: loader}
+
+    def hr_loader(user_id):
+        # Heart rate goes to the user's shard - the main loader when unsharded
+        shard_connection = hr_connection(user_id)
+        if shard_connection not in loaders:
+            loaders[shard_connection] = Loader(shard_connection)
+        return loaders[shard_connection]
+
+    for user_id in range(1, volumes['users'] + 1):
+        hr_loader(user_id)
+    for shard_connection, each in loaders.items():
+        if each.sqlite:
+            shard_connection.exec_driver_sql('PRAGMA synchronous=OFF')  # Throwaway benchmark data
+
+    steps = [
+        ('users', lambda: generate_users(loader, volumes, seed, now)),
+        ('songs', lambda: generate_songs(loader, volumes, seed, now)),
+        ('friendships', lambda: generate_friendships(loader, volumes, seed, now)),
+    ]
+    results = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        results[name] = step()
+        log(f'{name}: {loader.counts.get(name, 0)} rows ({time.perf_counter() - started:.1f}s)')
+
+    started = time.perf_counter()
+    generate_workouts(loader, volumes, seed, now, results['users'], results['songs'], log, hr_loader)
+    log(f'workouts: done ({time.perf_counter() - started:.1f}s)')
+
+    counts = {}
+    for shard_connection, each in loaders.items():
+        _sync_sequences(shard_connection, each.counts)
+        for table, rows in each.counts.items():
+            counts[table] = counts.get(table, 0) + rows
+    db.session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scale', choices=SCALES, default='small', help='Preset volumes (default: small)')
+    parser.add_argument('--database-url', help='Target database (default: DATABASE_URL)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--songs', type=int)
+    parser.add_argument('--friends', type=int, help='Average friends per user')
+    parser.add_argument('--workouts', type=int, help='Typical workouts per user')
+    parser.add_argument('--days', type=int, help='Days of workout history')
+    parser.add_argument('--hr-interval', type=int, help='Seconds between heart rate samples')
+    args = parser.parse_args()
+
+    volumes = dict(SCALES[args.scale])
+    for key in volumes:
+        if getattr(args, key) is not None:
+            volumes[key] = getattr(args, key)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+
+    from app import create_app
+    from app.commands import init_db
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        print(f'Generating {volumes} (seed {args.seed}) into {app.config["SQLALCHEMY_DATABASE_URI"]}')
+        started = time.perf_counter()
+        counts = generate(volumes, seed=args.seed)
+
+    print(f'Done in {time.perf_counter() - started:.0f}s: ' + ', '.join(f'{n} {t}' for t, n in counts.items()))
+    print(f'Log in as user<id>@bench.dev / {PASSWORD}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Live Workout Load Generator - N simulated athletes working out at once
+against a running server
+
+Each athlete logs in and does what the app does during a workout:
+start -> a heart rate reading every second -> a song every 3 minutes ->
+end -> analyze. Heart rates follow benchmarks.dataset.heart_rate_curve
+(warmup, intervals or steady state, cooldown) for a random workout type,
+and athletes start spread over --ramp seconds so they don't move in lockstep.
+--speed compresses time (2 = a reading every 0.5s, a song every 90s).
+
+Reports throughput, p50/p95/p99 latency and errors per endpoint, how far
+behind schedule the readings were sent (if that grows, the load generator
+itself is the bottleneck - run fewer athletes per process), and lock
+contention from the server's /metrics: statements that failed on a
+database lock and SQL time per request. Under gunicorn /metrics only covers
+the worker that answered it - run one worker when looking at contention.
+
+Athletes are user<i>@bench.dev, as created by benchmarks.dataset (songs
+come from its catalog too); missing accounts are registered first.
+
+Usage (from backend/):
+    python -m benchmarks.dataset --database-url sqlite:////tmp/load.db --scale tiny
+    DATABASE_URL=sqlite:////tmp/load.db gunicorn -w 4 -b :5000 'app:create_app()'  # gthread, see gunicorn.conf.py
+    python -m benchmarks.loadgen --athletes 200 --minutes 10 --speed 2 --json /tmp/load.json
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.dataset import PASSWORD, WORKOUT_TYPES, WORKOUT_TYPE_WEIGHTS, heart_rate_curve
+
+# Endpoint name in the report -> view in /metrics
+ENDPOINTS = {
+    'start': 'workouts.start_workout',
+    'heartrate': 'workouts.log_heart_rate',
+    'song': 'workouts.log_song_play',
+    'end': 'workouts.end_workout',
+    'analyze': 'workouts.analyze_workout_endpoint'
+}
+SONG_SECONDS = 180  # A song every 3 minutes
+FALLBACK_SONGS = 50  # Song ids to use when the server has no catalog
+
+_METRIC_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Results:
+    """Latencies and outcomes from every athlete thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)  # endpoint -> seconds
+        self.outcomes = defaultdict(Counter)  # endpoint -> status code (or exception name) -> requests
+        self.lag = []  # Seconds each reading went out after it was due
+        self.workouts = 0
+
+    def record(self, endpoint, seconds, outcome):
+        with self._lock:
+            self.latency[endpoint].append(seconds)
+            self.outcomes[endpoint][outcome] += 1
+
+    def record_lag(self, seconds):
+        with self._lock:
+            self.lag.append(seconds)
+
+    def record_workout(self):
+        with self._lock:
+            self.workouts += 1
+
+
+def scrape_metrics(session, url):
+    """Lock errors and SQL time per endpoint from /metrics (None if it can't be read)"""
+    try:
+        text = session.get(f'{url}/metrics', timeout=10).text
+    except requests.RequestException:
+        return None
+
+    metrics = {'lock_errors': 0, 'db_seconds': {}, 'requests': Counter()}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        endpoint = re.search(r'endpoint="([^"]*)"', labels or '')
+        if name == 'db_lock_errors_total':
+            metrics['lock_errors'] = int(float(value))
+        elif name == 'http_request_db_seconds_total':
+            metrics['db_seconds'][endpoint.group(1)] = float(value)
+        elif name == 'http_requests_total':
+            metrics['requests'][endpoint.group(1)] += int(float(value))
+    return metrics
+
+
+class Athlete:
+    """One simulated user with their own HTTP session"""
+
+    def __init__(self, index, args, results, songs):
+        self.email = f'user{index}@bench.dev'
+        self.rnd = random.Random(args.seed * 100003 + index)
+        self.args = args
+        self.results = results
+        self.songs = songs
+        self.session = requests.Session()
+        self.api = f'{args.url}/api'
+
+    def call(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.api}{path}', timeout=self.args.timeout, **kwargs)
+            outcome = response.status_code
+        except requests.RequestException as exc:
+            response = None
+            outcome = type(exc).__name__
+        self.results.record(endpoint, time.perf_counter() - started, outcome)
+        return response
+
+    def login(self):
+        """Log in, registering the account first if it doesn't exist"""
+        credentials = {'email': self.email, 'password': PASSWORD}
+        response = self.session.post(f'{self.api}/auth/login', json=credentials, timeout=60)
+        if response.status_code == 401:
+            response = self.session.post(f'{self.api}/auth/register', timeout=60,
+                                         json={**credentials, 'name': self.email.split('@')[0], 'age': 30})
+        response.raise_for_status()
+        body = response.json()
+        self.session.headers['Authorization'] = f'Bearer {body["access_token"]}'
+        self.age = body['user'].get('age') or 30
+
+    def workout(self):
+        args = self.args
+        workout_type = self.rnd.choices(list(WORKOUT_TYPES), WORKOUT_TYPE_WEIGHTS)[0]
+        start_body = {'workout_type': workout_type, 'workout_profile_name': workout_type}
+
+        response = self.call('start', 'POST', '/workouts/start', json=start_body)
+        if response is not None and response.status_code == 400 and 'workout' in response.json():
+            # Left active by an earlier run - finish it and start over
+            self.session.post(f'{self.api}/workouts/{response.json()["workout"]["id"]}/end', timeout=args.timeout)
+            response = self.call('start', 'POST', '/workouts/start', json=start_body)
+        if response is None or response.status_code != 201:
+            return
+        workout_id = response.json()['workout']['id']
+
+        max_hr = 220 - self.age
+        resting_hr = self.rnd.randint(55, 75)
+        next_song = 0
+        started = time.perf_counter()
+        for seconds, bpm in heart_rate_curve(self.rnd, args.minutes, resting_hr, max_hr, workout_type):
+            due = started + seconds / args.speed
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.results.record_lag(-wait)
+
+            now = datetime.utcnow().isoformat()
+            if seconds >= next_song:
+                spotify_id, title, artist = self.rnd.choice(self.songs)
+                self.call('song', 'POST', f'/workouts/{workout_id}/song',
+                          json={'spotify_id': spotify_id, 'title': title, 'artist': artist, 'start_time': now})
+                next_song += SONG_SECONDS
+            self.call('heartrate', 'POST', f'/workouts/{workout_id}/heartrate', json={'bpm': bpm, 'timestamp': now})
+
+        self.call('end', 'POST', f'/workouts/{workout_id}/end')
+        self.call('analyze', 'POST', f'/workouts/{workout_id}/analyze')
+        self.results.record_workout()
+
+    def run(self, delay):
+        time.sleep(delay)
+        for _ in range(self.args.workouts):
+            self.workout()
+
+
+def load_songs(athlete, count):
+    """(spotify_id, title, artist) from the server's catalog, or made-up ids"""
+    response = athlete.session.get(f'{athlete.api}/workouts/songs/library', params={'limit': count}, timeout=60)
+    songs = []
+    if response.ok:
+        for zone in response.json()['library'].values():
+            songs += [(song['spotify_id'], song['title'], song['artist'])
+                      for song in zone['songs'] if song['spotify_id']]
+    # Made-up ids get created on first play, so a few plays race to insert the same song
+    return songs or [(f'loadgen{i}', f'Load Song {i}', 'Loadgen') for i in range(FALLBACK_SONGS)]
+
+
+def report(results, elapsed, before, after):
+    summary = {'seconds': round(elapsed, 1), 'workouts': results.workouts, 'endpoints': {}}
+    total = sum(len(latencies) for latencies in results.latency.values())
+    total_errors = 0
+
+    print(f'\n{results.workouts} workouts, {total} requests in {elapsed:.0f}s = {total / elapsed:.1f} req/s\n')
+    print(f'{"endpoint":10} {"requests":>8} {"req/s":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+          f'{"max ms":>8} {"errors":>7}  {"db ms/req":>9}')
+    for endpoint, view in ENDPOINTS.items():
+        latencies = results.latency.get(endpoint, [])
+        if not latencies:
+            continue
+        outcomes = results.outcomes[endpoint]
+        errors = sum(count for outcome, count in outcomes.items()
+                     if not isinstance(outcome, int) or outcome >= 400)
+        total_errors += errors
+
+        # Server-side SQL time per request over this run
+        db_ms = None
+        if before and after and after['requests'][view] > before['requests'][view]:
+            db_ms = (after['db_seconds'].get(view, 0) - before['db_seconds'].get(view, 0)) * 1000 / \
+                (after['requests'][view] - before['requests'][view])
+
+        row = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+            'errors': errors,
+            'outcomes': {str(outcome): count for outcome, count in outcomes.items()},
+            'db_ms_per_request': round(db_ms, 2) if db_ms is not None else None
+        }
+        summary['endpoints'][endpoint] = row
+        print(f'{endpoint:10} {row["requests"]:>8} {row["rps"]:>7.1f} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+              f'{row["p99_ms"]:>8.1f} {row["max_ms"]:>8.1f} {errors:>7}  '
+              f'{db_ms if db_ms is not None else float("nan"):>9.2f}')
+        failed = {outcome: count for outcome, count in outcomes.items() if outcome not in (200, 201)}
+        if failed:
+            print(f'{"":10} {failed}')
+
+    summary['error_rate'] = round(total_errors / total, 4) if total else 0.0
+    summary['lag_p95_s'] = round(percentile(results.lag, 95), 3)
+    summary['lag_max_s'] = round(max(results.lag, default=0.0), 3)
+    print(f'\nError rate {summary["error_rate"] * 100:.2f}%')
+    print(f'Readings behind schedule: {len(results.lag)}, p95 {summary["lag_p95_s"]:.2f}s, '
+          f'max {summary["lag_max_s"]:.2f}s')
+
+    if before and after:
+        summary['db_lock_errors'] = after['lock_errors'] - before['lock_errors']
+        print(f'Database lock errors: {summary["db_lock_errors"]}')
+    else:
+        summary['db_lock_errors'] = None
+        print('Database lock errors: n/a (/metrics not reachable)')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://localhost:5000', help='Server to load (default: %(default)s)')
+    parser.add_argument('--athletes', type=int, default=50)
+    parser.add_argument('--first-user', type=int, default=1, help='Athletes are user<first-user>.. onwards')
+    parser.add_argument('--minutes', type=float, default=30, help='Workout length (simulated minutes)')
+    parser.add_argument('--speed', type=float, default=1.0, help='Time compression factor')
+    parser.add_argument('--workouts', type=int, default=1, help='Workouts per athlete, back to back')
+    parser.add_argument('--ramp', type=float, default=30, help='Spread athlete start times over this many seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', metavar='PATH', help='Also write the summary as JSON')
+    args = parser.parse_args()
+
+    results = Results()
+    athletes = [Athlete(args.first_user + i, args, results, None) for i in range(args.athletes)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(Athlete.login, athletes))
+    print(f'{len(athletes)} athletes logged in ({time.perf_counter() - started:.0f}s)')
+
+    songs = load_songs(athletes[0], 20)
+    for athlete in athletes:
+        athlete.songs = songs
+    print(f'{len(songs)} songs, {args.minutes:g} min workouts at {args.speed:g}x, '
+          f'~{args.athletes * args.speed:.0f} readings/s at full load')
+
+    before = scrape_metrics(athletes[0].session, args.url)
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=athlete.run, args=(args.ramp * i / max(1, args.athletes),), daemon=True)
+        for i, athlete in enumerate(athletes)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    after = scrape_metrics(athletes[0].session, args.url)
+
+    summary = report(results, elapsed, before, after)
+    if args.json:
+        summary['args'] = vars(args)
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -20,15 +20,63 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable Flask-SQLAlchemy event system (saves memory)
 
+    # Read replicas for read-only endpoints (app/utils/db_routing.py), comma separated
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+    # Heart rate samples hash-partitioned by user over these databases (app/utils/hr_shards.py)
+    HR_SHARD_URLS = [url.strip() for url in os.environ.get('HR_SHARD_URLS', '').split(',') if url.strip()]
+
+    SQLALCHEMY_BINDS = {
+        **{f'replica{i}': url for i, url in enumerate(DATABASE_REPLICA_URLS)},
+        **{f'hr_shard{i}': url for i, url in enumerate(HR_SHARD_URLS)}
+    }
+
+    # SQLite production mode (app/utils/sqlite_mode.py) - ignored for PostgreSQL and :memory:
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', 'True') == 'True'  # WAL journal, pragmas, pool sizing, checkpoints
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL can't corrupt in WAL mode
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))  # Wait this long for the write lock
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))  # Page cache per connection
+    SQLITE_MMAP_SIZE_MB = int(os.environ.get('SQLITE_MMAP_SIZE_MB', 256))
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))  # Connections kept open per process
+    SQLITE_MAX_OVERFLOW = int(os.environ.get('SQLITE_MAX_OVERFLOW', 8))  # Extra connections under bursts
+    SQLITE_POOL_TIMEOUT = float(os.environ.get('SQLITE_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    SQLITE_WAL_AUTOCHECKPOINT = int(os.environ.get('SQLITE_WAL_AUTOCHECKPOINT', 10000))  # Pages - safety net only
+    SQLITE_CHECKPOINT_INTERVAL = float(os.environ.get('SQLITE_CHECKPOINT_INTERVAL', 30))  # Seconds, 0 = off
+    SQLITE_WAL_TRUNCATE_MB = int(os.environ.get('SQLITE_WAL_TRUNCATE_MB', 64))  # Truncate the WAL past this size
+
     # JWT (JSON Web Token) config for authentication
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)  # Access tokens last 24 hours
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # Refresh tokens last 30 days
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # Seconds a JWT user stays cached
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))  # Max cached users per process
+
+    # Password hashing (bcrypt runs on its own small thread pool)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))  # Cost factor - old hashes are upgraded on login
+    BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', 2))  # Hashes running at once per process
+    BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 32))  # Queued + running before we reject
+    BCRYPT_QUEUE_TIMEOUT = float(os.environ.get('BCRYPT_QUEUE_TIMEOUT', 5))  # Seconds to wait for a queue slot
+
+    # Responses with more rows than this in one array are streamed in chunks
+    JSON_STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 5000))
+
+    # Heart rate retention: raw samples older than this are rolled up and archived
+    HR_RAW_RETENTION_DAYS = int(os.environ.get('HR_RAW_RETENTION_DAYS', 180))
+    HR_ARCHIVE_DIR = os.environ.get('HR_ARCHIVE_DIR')  # Default: <instance folder>/hr_archive
+
+    # Per-view SQL budgets (app/utils/query_budget.py): 'off', 'warn' (log) or 'raise' (tests/CI)
+    QUERY_BUDGET_CHECKS = os.environ.get('QUERY_BUDGET_CHECKS', 'off')
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))  # Same statement this often = N+1
 
     # Spotify API credentials
     SPOTIFY_CLIENT_ID = os.environ.get('SPOTIFY_CLIENT_ID')
     SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET')
     SPOTIFY_REDIRECT_URI = os.environ.get('SPOTIFY_REDIRECT_URI') or 'http://localhost:5000/api/spotify/callback'
+    SPOTIFY_HTTP_TIMEOUT = float(os.environ.get('SPOTIFY_HTTP_TIMEOUT', 10))  # Seconds per Spotify call
+    SPOTIFY_MAX_CONNECTIONS = int(os.environ.get('SPOTIFY_MAX_CONNECTIONS', 1000))  # Open to Spotify per process
+
+    # Serving with asgi.py: sync views run in this many threads, async ones on the event loop
+    ASGI_SYNC_THREADS = int(os.environ.get('ASGI_SYNC_THREADS', 32))
 
     # Apple Music API credentials (for future)
     APPLE_MUSIC_KEY_ID = os.environ.get('APPLE_MUSIC_KEY_ID')
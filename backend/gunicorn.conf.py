@@ -0,0 +1,22 @@
+"""
+Gunicorn Settings - read automatically when gunicorn is started from backend/
+
+Threaded workers (gthread): a request waiting on the bcrypt pool
+(app/utils/passwords.py) or the database holds one thread, not the whole
+worker. With gunicorn's default sync workers every login pins a worker for
+the full hash, so a login spike starves HR ingest no matter how the bcrypt
+pool is sized.
+
+Usage (from backend/):
+    gunicorn 'app:create_app()'
+    GUNICORN_WORKERS=4 GUNICORN_THREADS=16 gunicorn 'app:create_app()'
+Command line flags (-w, -b, ...) still override these.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))  # Processes
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))  # Requests in progress per process
@@ -9,6 +9,12 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
+    # Dev server convenience: make sure tables and presets exist.
+    # Production runs `flask init-db` once per deploy instead.
+    from app.commands import init_db
+    with app.app_context():
+        init_db()
+
     # Run the development server
     # Debug mode is set in config.py
     app.run(
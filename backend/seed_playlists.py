@@ -4,6 +4,7 @@ Generates dummy songs with BPM stats for various workout types
 """
 
 from app import create_app, db
+from app.commands import init_db
 from app.models.song import Song
 from datetime import datetime
 import random
@@ -102,6 +103,8 @@ def seed_playlists():
     Create test songs in database
     """
     with app.app_context():
+        init_db()
+
         print("🎵 Starting playlist seed...")
         print("=" * 60)
 
@@ -73,6 +73,10 @@ export const workoutService = {
       start_time: startTime,
     }),
 
+  // Best next song for the live heart rate and the workout's target zone
+  getNextSong: (workoutId) =>
+    api.get(`/workouts/${workoutId}/next-song`),
+
   endWorkout: (workoutId) =>
     api.post(`/workouts/${workoutId}/end`),
 
@@ -91,8 +95,20 @@ export const workoutService = {
   getTopSongs: (type = 'hype', limit = 20) =>
     api.get('/workouts/top-songs', { params: { type, limit } }),
 
+  // Unplayed hype songs that athletes with similar taste respond to
+  getRecommendations: (limit = 20) =>
+    api.get('/workouts/recommendations', { params: { limit } }),
+
   getSongLibrary: (zone = null, limit = null) =>
     api.get('/workouts/songs/library', { params: { zone, limit } }),
+
+  // Heart rate summary across workouts (avg/max HR, time in zone)
+  getDashboard: (days = 30) =>
+    api.get('/workouts/stats/dashboard', { params: { days } }),
+
+  // Per day/week/month heart rate summaries, oldest first
+  getTrends: (period = 'week', count = 12) =>
+    api.get('/workouts/stats/trends', { params: { period, count } }),
 };
 
 // Spotify endpoints
@@ -173,6 +189,10 @@ export const profileService = {
   // Delete custom profile
   deleteProfile: (profileId) =>
     api.delete(`/profiles/${profileId}`),
+
+  // Generate a warmup -> peak -> cooldown playlist (curve is optional)
+  generatePlaylist: (profileId, durationMinutes, curve = null) =>
+    api.post(`/profiles/${profileId}/playlist`, { duration_minutes: durationMinutes, curve }),
 };
 
 export default api;